@@ -7,6 +7,59 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'instance', 'site.db') # Movido para a pasta instance
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(basedir, 'instance', 'uploads')
+    # Tamanho máximo de um pedido, em bytes (formulários e JSON). As rotas que
+    # recebem ficheiros têm limites próprios: documentos dos contratos e
+    # importação de CSV (as partes dos uploads retomáveis usam UPLOAD_CHUNK_SIZE)
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 2 * 1024 * 1024)
+    DOCUMENT_MAX_CONTENT_LENGTH = int(os.environ.get('DOCUMENT_MAX_CONTENT_LENGTH') or 32 * 1024 * 1024)
+    IMPORT_MAX_CONTENT_LENGTH = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH') or 1024 * 1024 * 1024)
+    # Uploads em partes (retomáveis): tamanho de cada parte, tamanho máximo do
+    # documento e validade (segundos) de uma sessão de upload
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE') or 8 * 1024 * 1024)
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE') or 512 * 1024 * 1024)
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 24 * 3600)
+    # Tarefas em segundo plano (sgpe.jobs): pasta dos ficheiros gerados, espera
+    # base entre tentativas (duplica a cada falha) e tempo máximo de execução
+    JOB_OUTPUT_FOLDER = os.path.join(basedir, 'instance', 'jobs')
+    JOB_RETRY_BACKOFF = int(os.environ.get('JOB_RETRY_BACKOFF') or 30)
+    JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT') or 3600)
+    # Envio dos documentos pelo proxy: None (pelo Flask), 'x-accel' (nginx) ou 'x-sendfile'
+    DOCUMENT_SENDFILE = os.environ.get('DOCUMENT_SENDFILE') or None
+    # Localização interna do nginx que aponta para UPLOAD_FOLDER (modo 'x-accel')
+    DOCUMENT_ACCEL_PREFIX = os.environ.get('DOCUMENT_ACCEL_PREFIX') or '/protected-uploads'
+    # Número de proxies à frente da aplicação cujos X-Forwarded-For / X-Forwarded-Proto
+    # são de confiança (werkzeug ProxyFix); 0 = ligação direta, os cabeçalhos são ignorados.
+    # Atrás do nginx use 1: sem isso, request.remote_addr é o do proxy e todos os
+    # clientes partilham o mesmo balde da limitação de pedidos
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR') or 0)
+    PROXY_FIX_X_PROTO = int(os.environ.get('PROXY_FIX_X_PROTO') or 0)
+    # 'keyset' (cursores, custo constante por página) ou 'offset' (números de página)
+    PAGINATION_MODE = os.environ.get('PAGINATION_MODE') or 'keyset'
+    # Total mostrado nas listagens em modo keyset: 'exact', 'approx' ou 'none'
+    PAGINATION_TOTAL = os.environ.get('PAGINATION_TOTAL') or 'approx'
+    # Backend de pesquisa: 'auto' (FTS5 se disponível), 'fts5' ou 'memory'
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
+    # Lança erro quando uma vista carrega uma relação fora do seu plano (sgpe.loaders)
+    RAISE_ON_LAZY_LOAD = False
+    # Tempo (segundos) que os browsers podem guardar as listas de distritos e postos
+    LOCATIONS_CACHE_MAX_AGE = int(os.environ.get('LOCATIONS_CACHE_MAX_AGE') or 86400)
+    # Tempo máximo (segundos) que as tabelas de referência ficam em cache em cada processo
+    REFDATA_CACHE_TTL = int(os.environ.get('REFDATA_CACHE_TTL') or 300)
+    # Cache (LRU) dos utilizadores autenticados: número de entradas e validade em segundos
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 300)
+    # Custo do bcrypt para novos hashes (os antigos são atualizados no login)
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12)
+    # Pool de verificação de senhas: threads, pedidos em espera e tempo máximo de espera (s)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 4)
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE') or 32)
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)
+    # Limitação de pedidos (sgpe.ratelimit): 'memory' ou 'sqlite:///caminho' (partilhado entre processos)
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', '1') != '0'
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE') or 'memory'
+    RATELIMIT_MAX_BUCKETS = int(os.environ.get('RATELIMIT_MAX_BUCKETS') or 10000)
+    # PRAGMAs aplicados a cada nova ligação SQLite (ver sgpe.database); vazio = predefinições do SQLite
+    SQLITE_PRAGMAS = {}
 
     @staticmethod
     def init_app(app):
@@ -22,10 +75,32 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
     SERVER_NAME = 'localhost.localdomain'
     WTF_CSRF_ENABLED = False
+    RAISE_ON_LAZY_LOAD = True
+    BCRYPT_LOG_ROUNDS = 4
+    RATELIMIT_ENABLED = False
 
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'data.sqlite')
+    # WAL: os leitores não bloqueiam o escritor nem são bloqueados por ele;
+    # synchronous=NORMAL é seguro em WAL (pode perder a última transação numa
+    # falha de energia, nunca corrompe a base de dados).
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000),  # ms à espera do bloqueio de escrita
+        'foreign_keys': 'ON',
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KB') or 65536),  # negativo = KiB por ligação
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),
+        'temp_store': 'MEMORY',
+    }
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 20),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT') or 30),
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 3600),
+    }
 
 config = {
     'development': DevelopmentConfig,
@@ -2,6 +2,7 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import config
 
 db = SQLAlchemy()
@@ -12,22 +13,54 @@ login_manager.login_message_category = 'info'
 login_manager.login_message = 'Por favor, faça o login para aceder a esta página.'
 
 
-def create_app(config_name):
+def create_app(config_name, **settings):
     app = Flask(__name__, template_folder='../templates', static_folder='../static')
     app.config.from_object(config[config_name])
+    app.config['CONFIG_NAME'] = config_name
+    # Valores que substituem os da configuração (ex: outra base de dados)
+    app.config.update(settings)
     config[config_name].init_app(app)
 
+    # Endereço e esquema do cliente a partir dos cabeçalhos do proxy (ver PROXY_FIX_X_FOR)
+    if app.config['PROXY_FIX_X_FOR'] or app.config['PROXY_FIX_X_PROTO']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                                x_proto=app.config['PROXY_FIX_X_PROTO'])
+
     db.init_app(app)
+    from sgpe.database import init_database
+    init_database(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
 
-    from sgpe.models import User
+    # O utilizador autenticado é um snapshot em cache (ver sgpe.identity)
+    from sgpe.identity import init_identity, load_user
+    init_identity(app)
+    login_manager.user_loader(load_user)
+
+    from sgpe.passwords import init_passwords
+    init_passwords(app)
+
+    from sgpe.ratelimit import init_ratelimit
+    init_ratelimit(app)
+
+    # Regista os eventos que mantêm os contadores do dashboard
+    import sgpe.stats  # noqa: F401
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    from sgpe.search import init_search
+    init_search(app)
+
+    # Cache das tabelas de referência usadas nos formulários
+    from sgpe.refdata import init_refdata
+    init_refdata(app)
+
+    # Estatísticas por localização, em cache por versão dos dados
+    from sgpe.location_stats import init_location_stats
+    init_location_stats(app)
 
     from sgpe.main.routes import main
     app.register_blueprint(main)
 
+    from sgpe.commands import register_commands
+    register_commands(app)
+
     return app
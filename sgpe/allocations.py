@@ -0,0 +1,98 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert
+from sgpe import db
+from sgpe.models import ContractItem, Allocation, Project
+
+
+class AllocationError(ValueError):
+    """Lote de alocações rejeitado. ``errors`` contém dicionários {'row', 'message'}."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(error['message'] for error in errors))
+        self.errors = errors
+
+
+def _integer(value):
+    """Converte um valor JSON para int sem truncar (2.7 e True são rejeitados)."""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+
+def _parse_rows(rows):
+    """Valida o formato de cada linha e converte para (item_id, project_id, quantidade)."""
+    parsed, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            item_id, project_id, quantity = (_integer(row[key]) for key in ('item_id', 'project_id', 'quantity'))
+        except (KeyError, TypeError, ValueError):
+            errors.append({'row': index, 'message': 'Linha inválida: são necessários item_id, project_id e quantity inteiros.'})
+            continue
+        if quantity <= 0:
+            errors.append({'row': index, 'message': 'A quantidade deve ser maior que zero.'})
+            continue
+        parsed.append((index, item_id, project_id, quantity))
+    return parsed, errors
+
+
+def allocate(rows):
+    """Aloca em lote quantidades de itens de contrato a projetos, de forma atómica.
+
+    ``rows`` é uma lista de dicionários com item_id, project_id e quantity.
+    Ou todas as linhas são gravadas, ou nenhuma (AllocationError).
+
+    Para evitar a corrida "ler disponível e depois inserir", a transação começa
+    com um UPDATE sem efeito nas linhas dos itens do lote: no SQLite isso obtém o
+    bloqueio de escrita da base de dados e nos outros motores bloqueia as linhas.
+    A disponibilidade é então lida numa única query agregada e as alocações
+    inseridas com um único INSERT em lote, sem que outra transação possa alocar
+    os mesmos itens entretanto.
+    """
+    parsed, errors = _parse_rows(rows)
+    if errors:
+        raise AllocationError(errors)
+    if not parsed:
+        return 0
+
+    item_ids = sorted({item_id for _, item_id, _, _ in parsed})
+    project_ids = {project_id for _, _, project_id, _ in parsed}
+    items = ContractItem.__table__
+
+    try:
+        db.session.execute(
+            items.update().where(items.c.id.in_(item_ids)).values(quantity=items.c.quantity)
+        )
+        availability = ContractItem.availability_for(item_ids)
+        known_projects = {row[0] for row in db.session.execute(
+            db.select(Project.id).where(Project.id.in_(project_ids))
+        )}
+
+        requested = defaultdict(int)
+        for index, item_id, project_id, quantity in parsed:
+            if item_id not in availability:
+                errors.append({'row': index, 'message': f'Item {item_id} não existe.'})
+            elif project_id not in known_projects:
+                errors.append({'row': index, 'message': f'Projeto {project_id} não existe.'})
+            else:
+                requested[item_id] += quantity
+
+        for item_id, quantity in requested.items():
+            available = availability[item_id][1]
+            if quantity > available:
+                rows_for_item = [index for index, i, _, _ in parsed if i == item_id]
+                errors.append({'row': rows_for_item[-1],
+                               'message': f'Item {item_id}: pedidas {quantity} unidades, disponíveis {available}.'})
+        if errors:
+            raise AllocationError(sorted(errors, key=lambda error: error['row']))
+
+        now = datetime.utcnow()
+        db.session.execute(insert(Allocation), [
+            {'item_id': item_id, 'project_id': project_id, 'quantity': quantity, 'allocation_date': now}
+            for _, item_id, project_id, quantity in parsed
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(parsed)
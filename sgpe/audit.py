@@ -0,0 +1,229 @@
+import itertools
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app, url_for
+from sqlalchemy import event
+from sgpe import db
+
+# Auditoria dos planos de execução: cria uma base de dados temporária com uma
+# linha de cada modelo, visita todas as rotas GET do blueprint 'main' com um
+# administrador autenticado e corre EXPLAIN QUERY PLAN em cada query emitida.
+# Um "SCAN <tabela>" sem índice (ou um índice automático) numa tabela da
+# aplicação é reportado: com poucas linhas não se nota, mas em produção é uma
+# leitura da tabela inteira.
+#
+# Numa página (LIMIT, sem ordenação temporária) o SCAN por um índice percorre
+# a tabela pela ordem pedida e pára ao encher a página; só é aceite se a query
+# não filtrar essa tabela. Com filtro, a página pode ter de atravessar a
+# tabela inteira até encontrar linhas suficientes, e é reportada como
+# percurso ordenado com filtro.
+
+# Leituras completas intencionais: (endpoint ou '*', tabela) -> motivo
+ALLOWED_SCANS = {
+    ('*', 'dashboard_stat'): 'snapshot do dashboard, lido por inteiro',
+    ('*', 'ref_data_version'): 'versões das tabelas de referência, lidas por inteiro',
+    ('*', 'supplier'): 'tabela de referência em cache (sgpe.refdata)',
+    ('*', 'contract_type'): 'tabela de referência em cache (sgpe.refdata)',
+    ('*', 'project_type'): 'tabela de referência em cache (sgpe.refdata)',
+    ('main.spend_report', 'spend_rollup'): 'cubo de despesa, uma linha por fornecedor, tipo e ano',
+    ('main.location_stats', 'project'): 'agregação por localização, em cache por versão dos dados',
+    ('main.location_stats', 'contract_projects'): 'agregação por localização, em cache por versão dos dados',
+    ('main.export', 'project'): 'exportação de todos os projetos',
+    ('main.export', 'contract'): 'exportação de todos os contratos',
+    ('main.export', 'contract_projects'): 'exportação de todos os contratos',
+}
+
+# Rotas GET que não são visitadas (terminar a sessão invalidaria as visitas seguintes)
+SKIPPED_ENDPOINTS = {'main.logout'}
+
+# Parâmetros extra de cada visita, para exercitar também os filtros de pesquisa
+SAMPLE_QUERY_STRINGS = ({}, {'search': 'Ponte', 'q': 'Ponte'})
+# Variantes próprias de algumas rotas; um valor None é preenchido com o id de exemplo
+ENDPOINT_QUERY_STRINGS = {
+    'main.contract_validity': (
+        {'view': 'expiring', 'days': 30},
+        {'view': 'overlaps', 'start': '2024-01-01', 'end': '2024-03-31'},
+        {'view': 'overlaps', 'project_id': None},
+    ),
+}
+
+AUDIT_EMAIL = 'audit@example.com'
+AUDIT_PASSWORD = 'audit'
+
+SCAN_RE = re.compile(r'^SCAN (\w+)')
+# Índice temporário construído pelo SQLite em cada execução (também lê a tabela inteira)
+AUTOMATIC_INDEX_RE = re.compile(r'^SEARCH (\w+) USING AUTOMATIC')
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+# Cláusulas WHERE (da query principal e das subqueries), até à ordenação ou ao fim
+WHERE_RE = re.compile(r'\bWHERE\b(.*?)(?=\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)', re.S)
+FULL_SCAN = 'leitura completa'
+FILTERED_ORDERED_SCAN = 'percurso ordenado com filtro'
+AUDITED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+class Finding:
+    """Uma leitura completa (ou percurso ordenado com filtro) de tabela num plano de execução."""
+
+    def __init__(self, table, detail, statement, reason=FULL_SCAN):
+        self.table = table
+        self.detail = detail
+        self.statement = statement
+        self.reason = reason
+        self.endpoints = set()
+
+
+def _seed():
+    """Cria uma linha de cada modelo e retorna os valores dos argumentos das rotas."""
+    from sgpe.models import (User, ProjectType, Project, Supplier, ContractType, Contract,
+                             ContractItem, Allocation, UploadSession, Job)
+    from sgpe.locations import LOCATIONS_VERSION
+    admin = User(username='audit', email=AUDIT_EMAIL, password=AUDIT_PASSWORD, is_admin=True)
+    project_type = ProjectType(name='Estradas')
+    supplier = Supplier(name='Fornecedor', email='fornecedor@example.com')
+    contract_type = ContractType(name='Obras')
+    project = Project(name='Ponte', project_type=project_type, author=admin,
+                      location_province='Maputo', location_district='Boane',
+                      location_admin_post='Boane')
+    contract = Contract(contract_number='C-1', contract_type_info=contract_type,
+                        supplier_info=supplier, contract_value=1000,
+                        start_date=datetime(2024, 1, 1), end_date=datetime(2024, 12, 31),
+                        document_filename='documento.pdf', projects=[project])
+    db.session.add_all([admin, project, contract])
+    db.session.flush()
+    item = ContractItem(name='Cimento', quantity=10, unit='kg', unit_price=5, contract_id=contract.id)
+    db.session.add(item)
+    db.session.flush()
+    db.session.add_all([
+        Allocation(item_id=item.id, project_id=project.id, quantity=1),
+        UploadSession(id='0' * 32, user_id=admin.id, filename='documento.pdf', size=1),
+        Job(name='export', user_id=admin.id),
+    ])
+    db.session.commit()
+    return {
+        'project_id': [project.id],
+        'contract_id': [contract.id],
+        'supplier_id': [supplier.id],
+        'type_id': [contract_type.id],
+        'project_type_id': [project_type.id],
+        'job_id': [Job.query.first().id],
+        'upload_id': ['0' * 32],
+        'filename': ['documento.pdf'],
+        'province': ['Maputo'],
+        'district': ['Boane'],
+        'version': [LOCATIONS_VERSION],
+    }
+
+
+def _urls(app, values):
+    """Gera (endpoint, url) para cada rota GET do blueprint 'main'."""
+    for rule in app.url_map.iter_rules():
+        if not rule.endpoint.startswith('main.') or 'GET' not in rule.methods:
+            continue
+        if rule.endpoint in SKIPPED_ENDPOINTS:
+            continue
+        choices = {}
+        for name in rule.arguments:
+            converter = rule._converters.get(name)
+            items = getattr(converter, 'items', None)
+            choices[name] = sorted(items) if items else values.get(name)
+        if any(choice is None for choice in choices.values()):
+            continue
+        names = list(choices)
+        for combination in itertools.product(*(choices[name] for name in names)):
+            for query_string in SAMPLE_QUERY_STRINGS + ENDPOINT_QUERY_STRINGS.get(rule.endpoint, ()):
+                query_string = {name: values[name][0] if value is None else value
+                                for name, value in query_string.items()}
+                with app.test_request_context():
+                    url = url_for(rule.endpoint, **dict(zip(names, combination)), **query_string)
+                yield rule.endpoint, url
+
+
+def _explain(connection, statement, parameters):
+    return [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+def _filters_table(statement, table):
+    """True se alguma cláusula WHERE do statement usa colunas de ``table``."""
+    column = re.compile(rf'\b{re.escape(table)}\.')
+    return any(column.search(clause) for clause in WHERE_RE.findall(statement))
+
+
+def _is_allowed(endpoint, table, allowed):
+    return (endpoint, table) in allowed or ('*', table) in allowed or table in allowed
+
+
+def audit_queries(allow=()):
+    """Visita as rotas numa base de dados temporária e retorna (páginas visitadas, lista de Finding).
+
+    ``allow`` acrescenta nomes de tabelas cujas leituras completas são aceites.
+    """
+    from sgpe import create_app
+    allowed = dict(ALLOWED_SCANS)
+    allowed.update((table, 'permitido na linha de comandos') for table in allow)
+
+    workdir = tempfile.mkdtemp(prefix='sgpe-audit-')
+    app = create_app(current_app.config['CONFIG_NAME'],
+                     SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(workdir, 'audit.db'),
+                     SQLALCHEMY_ENGINE_OPTIONS={}, UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+                     JOB_OUTPUT_FOLDER=os.path.join(workdir, 'jobs'), TESTING=True,
+                     WTF_CSRF_ENABLED=False, RATELIMIT_ENABLED=False, BCRYPT_LOG_ROUNDS=4)
+    findings = OrderedDict()
+    visited = 0
+    try:
+        with app.app_context():
+            db.create_all()
+            values = _seed()
+            tables = set(db.metadata.tables)
+            engine = db.engine
+            captured = []
+
+            def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                if not executemany and statement.lstrip().upper().startswith(AUDITED_STATEMENTS):
+                    captured.append((statement, parameters))
+
+            client = app.test_client()
+            response = client.post('/login', data={'email': AUDIT_EMAIL, 'password': AUDIT_PASSWORD})
+            if response.status_code != 302:
+                raise RuntimeError('Não foi possível autenticar o utilizador da auditoria.')
+            # Aquece os caches (estatísticas, índice de pesquisa): as reconstruções
+            # completas só acontecem uma vez e não fazem parte do plano das rotas
+            client.get('/?search=Ponte')
+            for endpoint, url in _urls(app, values):
+                captured.clear()
+                event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+                try:
+                    client.get(url)
+                finally:
+                    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+                visited += 1
+                with engine.connect() as connection:
+                    for statement, parameters in captured:
+                        plan = _explain(connection, statement, parameters)
+                        # Percorrer a tabela pela ordem pedida e parar no LIMIT é o
+                        # plano normal de uma página sem filtro; sem LIMIT ou com
+                        # ordenação temporária, o SQLite lê todas as linhas
+                        paginated = ' LIMIT ' in statement and not any(TEMP_SORT in detail for detail in plan)
+                        for detail in plan:
+                            match = AUTOMATIC_INDEX_RE.match(detail) or SCAN_RE.match(detail)
+                            if not match or match.group(1) not in tables:
+                                continue
+                            table = match.group(1)
+                            reason = FULL_SCAN
+                            if detail.startswith('SCAN') and paginated:
+                                if not _filters_table(statement, table):
+                                    continue
+                                reason = FILTERED_ORDERED_SCAN
+                            if _is_allowed(endpoint, table, allowed):
+                                continue
+                            finding = findings.setdefault((statement, detail),
+                                                          Finding(table, detail, statement, reason))
+                            finding.endpoints.add(endpoint)
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return visited, list(findings.values())
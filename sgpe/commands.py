@@ -0,0 +1,145 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Reconstrói do zero os contadores pré-calculados do dashboard."""
+    from sgpe.stats import rebuild_dashboard_stats, get_dashboard_stats
+    rebuild_dashboard_stats()
+    stats = get_dashboard_stats()
+    click.echo(f"Estatísticas reconstruídas: {stats['total_projects']} projetos, "
+               f"{stats['total_contracts']} contratos.")
+
+
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search_command():
+    """Reconstrói o índice de pesquisa de projetos, contratos e fornecedores."""
+    from sgpe.search import rebuild_search_index, get_backend
+    rebuild_search_index()
+    click.echo(f"Índice de pesquisa reconstruído (backend: {get_backend().name}).")
+
+
+@click.command('import-csv')
+@click.argument('kind', type=click.Choice(['projects', 'suppliers', 'contracts']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'user_email', help='Email do autor dos projetos importados (por omissão, o primeiro administrador).')
+@with_appcontext
+def import_csv_command(kind, path, user_email):
+    """Importa projetos, fornecedores ou contratos a partir de um ficheiro CSV."""
+    from sgpe.importer import import_csv
+    from sgpe.models import User, email_key
+    query = User.query.filter_by(email_key=email_key(user_email)) if user_email else User.query.filter_by(is_admin=True)
+    user = query.order_by(User.id).first()
+    if kind == 'projects' and user is None:
+        raise click.UsageError('Nenhum utilizador encontrado para ser o autor dos projetos.')
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        report = import_csv(kind, stream, user_id=user.id if user else None)
+    for line, message in report.errors:
+        click.echo(f'Linha {line}: {message}', err=True)
+    if report.truncated:
+        click.echo(f'... e mais {report.error_count - len(report.errors)} erros.', err=True)
+    if report.file_error:
+        click.echo(report.file_error, err=True)
+    click.echo(f'{report.created} registos importados, {report.error_count} linhas com erros.')
+
+
+@click.command('bench-passwords')
+@click.option('--costs', default='10,11,12', show_default=True, help='Custos do bcrypt a medir, separados por vírgulas.')
+@click.option('--seconds', default=2.0, show_default=True, help='Duração da medição de cada custo.')
+@click.option('--concurrency', type=int, help='Logins em simultâneo (por omissão, PASSWORD_HASH_WORKERS).')
+@with_appcontext
+def bench_passwords_command(costs, seconds, concurrency):
+    """Mede quantos logins por segundo o pool de bcrypt suporta em cada custo."""
+    from flask import current_app
+    from sgpe.passwords import benchmark
+    try:
+        costs = [int(cost) for cost in costs.split(',')]
+    except ValueError:
+        raise click.BadParameter('use números inteiros separados por vírgulas.', param_hint='--costs') from None
+    click.echo(f"Pool: {current_app.config['PASSWORD_HASH_WORKERS']} threads; "
+               f"custo atual: {current_app.config['BCRYPT_LOG_ROUNDS']}")
+    click.echo(f"{'custo':>5}  {'logins/s':>10}  {'latência (ms)':>14}")
+    for cost, rate, latency in benchmark(costs, seconds, concurrency):
+        click.echo(f'{cost:>5}  {rate:>10.1f}  {latency:>14.1f}')
+
+
+@click.command('run-jobs')
+@click.option('--workers', default=2, show_default=True, help='Número de processos que executam tarefas.')
+@click.option('--poll', default=1.0, show_default=True, help='Intervalo (segundos) entre verificações da fila.')
+@click.option('--once', is_flag=True, help='Termina quando não houver tarefas prontas.')
+@click.option('--inline', is_flag=True, help='Executa as tarefas neste processo, sem pool.')
+@with_appcontext
+def run_jobs_command(workers, poll, once, inline):
+    """Executa as tarefas em segundo plano guardadas na tabela job."""
+    from sgpe.jobs import run_worker
+    run_worker(workers=workers, poll=poll, once=once, inline=inline, log=click.echo)
+
+
+@click.command('enqueue-job')
+@click.argument('name')
+@click.option('--arg', 'args', multiple=True, help='Argumento da tarefa no formato chave=valor (repetível).')
+@with_appcontext
+def enqueue_job_command(name, args):
+    """Agenda uma tarefa (ex: rebuild-stats, rebuild-search, export --arg kind=contracts)."""
+    from sgpe.jobs import enqueue, TASKS
+    if name not in TASKS:
+        raise click.BadParameter(f"use uma de: {', '.join(sorted(TASKS))}.", param_hint='NAME')
+    try:
+        kwargs = dict(arg.split('=', 1) for arg in args)
+    except ValueError:
+        raise click.BadParameter('use o formato chave=valor.', param_hint='--arg') from None
+    job = enqueue(name, **kwargs)
+    click.echo(f'Tarefa {job.id} ({name}) agendada.')
+
+
+@click.command('db-report')
+@with_appcontext
+def db_report_command():
+    """Mostra a configuração efetiva da base de dados (pool e PRAGMAs do SQLite)."""
+    from sgpe.database import report_lines
+    for line in report_lines():
+        click.echo(line)
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Cria as tabelas, colunas e índices em falta numa base de dados existente."""
+    from sgpe.schema import upgrade_schema, SchemaUpgradeError
+    try:
+        changes = upgrade_schema()
+    except SchemaUpgradeError as e:
+        raise click.ClickException(str(e)) from None
+    for change in changes:
+        click.echo(f'Atualizado: {change}')
+    click.echo(f'{len(changes)} alterações ao esquema.' if changes else 'O esquema já está atualizado.')
+
+
+@click.command('audit-queries')
+@click.option('--allow', multiple=True, help='Tabela cujas leituras completas são aceites (pode repetir).')
+@with_appcontext
+def audit_queries_command(allow):
+    """Corre EXPLAIN QUERY PLAN nas queries de todas as rotas e reporta leituras completas."""
+    from sgpe.audit import audit_queries
+    visited, findings = audit_queries(allow)
+    for finding in findings:
+        click.echo(f'{finding.detail} ({finding.reason}) em {", ".join(sorted(finding.endpoints))}')
+        click.echo(f'    {" ".join(finding.statement.split())}')
+    click.echo(f'{visited} páginas visitadas, {len(findings)} leituras completas de tabelas.')
+    if findings:
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(rebuild_search_command)
+    app.cli.add_command(import_csv_command)
+    app.cli.add_command(bench_passwords_command)
+    app.cli.add_command(run_jobs_command)
+    app.cli.add_command(enqueue_job_command)
+    app.cli.add_command(db_report_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(audit_queries_command)
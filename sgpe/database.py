@@ -0,0 +1,73 @@
+from sqlalchemy import event
+from sgpe import db
+
+# Perfil da base de dados SQLite.
+#
+# Os PRAGMAs de SQLITE_PRAGMAS são aplicados a cada nova ligação do pool (a
+# maioria é por ligação; journal_mode=WAL fica gravado no ficheiro). A ordem
+# importa: busy_timeout é aplicado primeiro, para que a mudança de journal_mode
+# espere por um bloqueio em vez de falhar com "database is locked".
+
+FIRST_PRAGMAS = ('busy_timeout',)
+
+
+def _ordered(pragmas):
+    first = [(name, pragmas[name]) for name in FIRST_PRAGMAS if name in pragmas]
+    return first + [(name, value) for name, value in pragmas.items() if name not in FIRST_PRAGMAS]
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in _ordered(pragmas):
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def init_database(app):
+    """Regista os PRAGMAs da configuração no engine e escreve o relatório no log."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    if not app.testing:
+        with app.app_context():
+            for line in report_lines():
+                app.logger.info(line)
+
+
+def database_report():
+    """Valores efetivos dos PRAGMAs e configuração do pool (para diagnóstico)."""
+    engine = db.engine
+    report = {'url': engine.url.render_as_string(hide_password=True), 'dialect': engine.dialect.name,
+              'pool': type(engine.pool).__name__, 'pragmas': {}}
+    for option in ('size', 'overflow', 'timeout'):
+        method = getattr(engine.pool, option, None)
+        if callable(method):
+            report[f'pool_{option}'] = method()
+    report['pool_pre_ping'] = getattr(engine.pool, '_pre_ping', None)
+    if engine.dialect.name == 'sqlite':
+        names = ['journal_mode', 'synchronous', 'busy_timeout', 'foreign_keys', 'cache_size',
+                 'mmap_size', 'temp_store']
+        with engine.connect() as connection:
+            for name in names:
+                report['pragmas'][name] = connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+    return report
+
+
+def report_lines():
+    report = database_report()
+    lines = [f"Base de dados: {report['url']} ({report['dialect']}, pool {report['pool']})"]
+    pool = {key: value for key, value in report.items() if key.startswith('pool_')}
+    if pool:
+        lines.append('Pool: ' + ', '.join(f'{key[5:]}={value}' for key, value in pool.items()))
+    if report['pragmas']:
+        lines.append('PRAGMAs: ' + ', '.join(f'{name}={value}' for name, value in report['pragmas'].items()))
+    return lines
@@ -0,0 +1,151 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from flask import abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+from sgpe import db
+from sgpe.models import Contract, UploadSession
+
+# Armazenamento dos documentos dos contratos, endereçado pelo conteúdo.
+#
+# Cada ficheiro é gravado em UPLOAD_FOLDER/ab/cd/<sha256><extensão>, onde ab e
+# cd são os primeiros caracteres do hash; o mesmo documento enviado duas vezes
+# ocupa um único ficheiro. A chave relativa é guardada em
+# Contract.document_filename (ou, até ser associada a um contrato, em
+# UploadSession.document_key) e o número de linhas com essa chave é a contagem
+# de referências: release() só apaga o ficheiro quando já ninguém o usa.
+# Os nomes aleatórios antigos (na raiz de UPLOAD_FOLDER) continuam válidos.
+
+CHUNK_SIZE = 64 * 1024
+
+# Chave endereçada pelo conteúdo: o nome do ficheiro é o próprio SHA-256
+_CONTENT_KEY_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[a-z0-9]+)?$')
+
+# Um documento endereçado pelo conteúdo nunca muda: o browser pode guardá-lo
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def upload_dir():
+    return os.path.join(current_app.root_path, '..', current_app.config['UPLOAD_FOLDER'])
+
+
+def path_for(key):
+    return os.path.join(upload_dir(), key)
+
+
+def _key(digest, filename):
+    _, ext = os.path.splitext(filename or '')
+    return f'{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}'
+
+
+def store(file_storage):
+    """Grava o upload em blocos de CHUNK_SIZE, calculando o SHA-256 em simultâneo.
+
+    Retorna a chave do documento (a guardar em Contract.document_filename).
+    """
+    root = upload_dir()
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=root, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            while chunk := file_storage.stream.read(CHUNK_SIZE):
+                digest.update(chunk)
+                temp.write(chunk)
+        return _move_into_store(temp_path, digest.hexdigest(), file_storage.filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def store_file(temp_path, filename):
+    """Move para o armazenamento um ficheiro já completo em disco (ex: upload em partes).
+
+    O ficheiro deve estar no mesmo sistema de ficheiros que UPLOAD_FOLDER.
+    """
+    digest = hashlib.sha256()
+    with open(temp_path, 'rb') as source:
+        while chunk := source.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return _move_into_store(temp_path, digest.hexdigest(), filename)
+
+
+def _move_into_store(temp_path, digest, filename):
+    key = _key(digest, filename)
+    final_path = path_for(key)
+    if os.path.exists(final_path):
+        os.remove(temp_path)  # Já existe: deduplicado
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(temp_path, final_path)
+    return key
+
+
+def reference_count(key):
+    """Contratos e uploads finalizados (ainda não associados) que usam o documento."""
+    contracts = db.select(db.func.count()).select_from(Contract).where(Contract.document_filename == key)
+    pending = db.select(db.func.count()).select_from(UploadSession).where(UploadSession.document_key == key)
+    return db.session.execute(db.select(contracts.scalar_subquery() + pending.scalar_subquery())).scalar()
+
+
+def release(key):
+    """Apaga o ficheiro se nada o referenciar. Chamar depois do commit.
+
+    Retorna True se o ficheiro foi apagado.
+    """
+    if not key or reference_count(key):
+        return False
+    path = path_for(key)
+    if not os.path.exists(path):
+        return False
+    os.remove(path)
+    return True
+
+
+def content_hash(key):
+    """SHA-256 do documento se a chave for endereçada pelo conteúdo, senão None."""
+    match = _CONTENT_KEY_RE.match(key)
+    return match.group(1) if match else None
+
+
+def serve(key):
+    """Resposta HTTP para o documento ``key`` (depois da verificação de permissões).
+
+    Responde com ETag forte (o SHA-256, para documentos endereçados pelo
+    conteúdo), 304 para If-None-Match, 206 para pedidos Range e, com
+    DOCUMENT_SENDFILE = 'x-accel' ou 'x-sendfile', delega o envio do ficheiro
+    no proxy (nginx / Apache, lighttpd), libertando o worker de imediato.
+    """
+    path = safe_join(upload_dir(), key)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    digest = content_hash(key)
+    mode = current_app.config.get('DOCUMENT_SENDFILE')
+
+    if mode in ('x-accel', 'x-sendfile'):
+        mimetype = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        response = current_app.response_class(mimetype=mimetype)
+        if mode == 'x-accel':
+            response.headers['X-Accel-Redirect'] = current_app.config['DOCUMENT_ACCEL_PREFIX'].rstrip('/') + '/' + key
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        if digest:
+            response.set_etag(digest)
+    else:
+        response = send_from_directory(upload_dir(), key, etag=digest or True, conditional=True)
+        # Anunciado também nas respostas completas, para os leitores de PDF pedirem partes
+        response.accept_ranges = 'bytes'
+
+    response.cache_control.private = True
+    if digest:
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    if mode in ('x-accel', 'x-sendfile'):
+        # O proxy trata os pedidos Range; aqui só respondemos 304
+        response = response.make_conditional(request)
+    return response
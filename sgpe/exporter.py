@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from sgpe import loaders
+from sgpe.models import Contract, Project
+from sgpe.search import search_filter
+
+# Número de linhas lidas da base de dados de cada vez (yield_per)
+BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+CONTRACT_FIELDS = ['id', 'contract_number', 'contract_type', 'supplier', 'contract_value',
+                   'start_date', 'end_date', 'project_ids', 'project_names']
+PROJECT_FIELDS = ['id', 'name', 'description', 'project_type', 'province', 'district',
+                  'admin_post', 'date_posted']
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def contract_rows(search_query=''):
+    """Gera um dicionário por contrato, lendo da base de dados em blocos de BATCH_SIZE."""
+    query = Contract.query.options(*loaders.contract_list())
+    if search_query:
+        query = query.filter(search_filter('contract', Contract.id, search_query))
+    for contract in query.order_by(Contract.id).yield_per(BATCH_SIZE):
+        yield {
+            'id': contract.id,
+            'contract_number': contract.contract_number,
+            'contract_type': contract.contract_type_info.name,
+            'supplier': contract.supplier_info.name,
+            'contract_value': contract.contract_value,
+            'start_date': _date(contract.start_date),
+            'end_date': _date(contract.end_date),
+            'project_ids': [project.id for project in contract.projects],
+            'project_names': [project.name for project in contract.projects],
+        }
+
+
+def project_rows(search_query=''):
+    """Gera um dicionário por projeto, lendo da base de dados em blocos de BATCH_SIZE."""
+    query = Project.query.options(*loaders.project_list())
+    if search_query:
+        query = query.filter(search_filter('project', Project.id, search_query))
+    for project in query.order_by(Project.id).yield_per(BATCH_SIZE):
+        yield {
+            'id': project.id,
+            'name': project.name,
+            'description': project.description,
+            'project_type': project.project_type.name if project.project_type else None,
+            'province': project.location_province,
+            'district': project.location_district,
+            'admin_post': project.location_admin_post,
+            'date_posted': _date(project.date_posted),
+        }
+
+
+def stream_csv(fields, rows):
+    """Converte as linhas em CSV, uma linha de texto de cada vez (listas separadas por ';')."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    writer.writerow(fields)
+    yield flush()
+    for row in rows:
+        writer.writerow([';'.join(map(str, v)) if isinstance(v, list) else v for v in (row[f] for f in fields)])
+        yield flush()
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_export(kind, fmt, search_query=''):
+    """Retorna um gerador com o conteúdo da exportação no formato pedido."""
+    if kind == 'contracts':
+        fields, rows = CONTRACT_FIELDS, contract_rows(search_query)
+    else:
+        fields, rows = PROJECT_FIELDS, project_rows(search_query)
+    if fmt == 'jsonl':
+        return stream_jsonl(rows)
+    return stream_csv(fields, rows)
@@ -1,26 +1,104 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, FloatField, IntegerField, SelectField, SelectMultipleField, RadioField, TextAreaField
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import Field, HiddenField, StringField, PasswordField, SubmitField, BooleanField, FloatField, IntegerField, SelectField, SelectMultipleField, RadioField, TextAreaField
 from wtforms.fields import DateField
-from wtforms.widgets import ListWidget, CheckboxInput
+from wtforms.fields.choices import SelectFieldBase
+from wtforms.widgets import Select
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError, Optional
-from wtforms_sqlalchemy.fields import QuerySelectField, QuerySelectMultipleField
-from sgpe import db # Adicionado para usar db.func
-from sgpe.models import User, Project, Supplier, ContractType, ProjectType
+from sgpe.models import User, Project, Supplier, ContractType, ProjectType, name_key, email_key
 from sgpe.locations import get_provinces, get_districts, get_admin_posts
+from flask_login import current_user
+from sgpe import refdata, uploads
 
 
-def supplier_query():
-    return Supplier.query
+DOCUMENT_EXTENSIONS = ['pdf', 'png', 'jpg', 'jpeg']
 
-def project_query():
-    return Project.query
 
-def contract_type_query():
-    return ContractType.query
+class RefDataSelectField(SelectFieldBase):
+    """Seleção de um registo de uma tabela de referência (ver sgpe.refdata).
+
+    As escolhas e a validação usam a cache de referência, sem queries ao ORM.
+    ``data`` é um RefItem(id, name) ou, quando atribuído pela vista, o próprio
+    objeto do modelo; em ambos os casos tem o atributo ``id``.
+    """
+
+    widget = Select()
+
+    def __init__(self, label=None, validators=None, kind=None, **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.kind = kind
+
+    def process_formdata(self, valuelist):
+        self.data = None
+        if valuelist and valuelist[0]:
+            try:
+                self.data = refdata.get_item(self.kind, int(valuelist[0]))
+            except ValueError:
+                pass
+
+    def iter_choices(self):
+        selected = getattr(self.data, 'id', None)
+        for item in refdata.get_items(self.kind):
+            yield item.id, item.name, item.id == selected, {}
+
+    def pre_validate(self, form):
+        if self.data is None:
+            raise ValidationError(self.gettext('Not a valid choice.'))
+
+
+class ModelIdsField(Field):
+    """Seleção múltipla de registos de ``model`` identificados pelo id.
+
+    Ao contrário do QuerySelectMultipleField, não carrega a tabela inteira: o
+    formulário só mostra os registos selecionados (os restantes são pesquisados
+    pelo browser num endpoint paginado) e a validação carrega apenas os ids
+    submetidos, com uma única query ``IN``.
+    """
+
+    widget = Select(multiple=True)
+
+    def __init__(self, label=None, validators=None, model=None, get_label='name', **kwargs):
+        super().__init__(label, validators, **kwargs)
+        self.model = model
+        self.get_label = get_label
+        self._ids = None  # ids submetidos ainda por carregar
+        self._submitted = 0
+        self._data = []
+
+    def _get_data(self):
+        if self._ids is not None:
+            objects = {obj.id: obj for obj in self.model.query.filter(self.model.id.in_(self._ids))}
+            self._data = [objects[id_] for id_ in self._ids if id_ in objects]
+            self._ids = None
+        return self._data
+
+    def _set_data(self, data):
+        self._ids = None
+        self._data = list(data or [])
+        self._submitted = len(self._data)
+
+    data = property(_get_data, _set_data)
+
+    def process_formdata(self, valuelist):
+        try:
+            # dict.fromkeys remove ids repetidos mantendo a ordem
+            self._ids = list(dict.fromkeys(int(value) for value in valuelist if value))
+        except ValueError:
+            self._set_data([])
+            raise ValueError('Seleção inválida.') from None
+        self._submitted = len(self._ids)
+
+    def pre_validate(self, form):
+        if len(self.data) != self._submitted:
+            raise ValidationError('Um ou mais registos selecionados não existem.')
+
+    def has_groups(self):
+        return False
+
+    def iter_choices(self):
+        for obj in self.data:
+            yield obj.id, getattr(obj, self.get_label), True, {}
 
-def project_type_query():
-    return ProjectType.query
 
 class RegistrationForm(FlaskForm):
     username = StringField('Nome de Utilizador', validators=[DataRequired(), Length(min=2, max=20)])
@@ -35,7 +113,7 @@ class RegistrationForm(FlaskForm):
             raise ValidationError('Esse nome de utilizador já existe. Por favor, escolha um diferente.')
 
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
+        user = User.query.filter_by(email_key=email_key(email.data)).first()
         if user:
             raise ValidationError('Esse email já existe. Por favor, escolha um diferente.')
 
@@ -47,11 +125,7 @@ class LoginForm(FlaskForm):
 
 class ProjectForm(FlaskForm):
     name = StringField('Nome do Projeto', validators=[DataRequired(), Length(min=2, max=100)])
-    project_type_id = QuerySelectField('Tipo de Projeto', 
-                                     query_factory=project_type_query, 
-                                     get_label='name', 
-                                     allow_blank=False,
-                                     validators=[DataRequired()])
+    project_type_id = RefDataSelectField('Tipo de Projeto', kind='project_type', validators=[DataRequired()])
     location_province = SelectField('Província', choices=[], validators=[DataRequired()])
     location_district = SelectField('Distrito', choices=[], validators=[DataRequired()])
     location_admin_post = SelectField('Posto Administrativo', choices=[], validators=[DataRequired()])
@@ -69,8 +143,8 @@ class SupplierForm(FlaskForm):
         self.obj_instance = kwargs.get('obj')
 
     def validate_name(self, name):
-        # Pesquisa case-insensitive
-        supplier = Supplier.query.filter(db.func.lower(Supplier.name) == db.func.lower(name.data)).first()
+        # Pesquisa pela chave normalizada (índice único): ignora maiúsculas, acentos e espaços
+        supplier = Supplier.query.filter_by(name_key=name_key(name.data)).first()
         if supplier:
             # Se estivermos a atualizar e o fornecedor encontrado for o mesmo que estamos a editar, está OK.
             if self.obj_instance and self.obj_instance.id == supplier.id:
@@ -80,15 +154,21 @@ class SupplierForm(FlaskForm):
 
 class ContractForm(FlaskForm):
     contract_number = StringField('Número do Contrato', validators=[DataRequired()])
-    contract_type = QuerySelectField('Tipo de Contrato', query_factory=contract_type_query, get_label='name', allow_blank=False, validators=[DataRequired()])
-    supplier = QuerySelectField('Fornecedor/Empreiteiro', query_factory=supplier_query, get_label='name', allow_blank=False, validators=[DataRequired()])
-    projects = QuerySelectMultipleField('Projetos Associados', query_factory=project_query, get_label='name', widget=ListWidget(prefix_label=False), option_widget=CheckboxInput())
+    contract_type = RefDataSelectField('Tipo de Contrato', kind='contract_type', validators=[DataRequired()])
+    supplier = RefDataSelectField('Fornecedor/Empreiteiro', kind='supplier', validators=[DataRequired()])
+    projects = ModelIdsField('Projetos Associados', model=Project, get_label='name')
     contract_value = FloatField('Valor do Contrato (MZN)', validators=[DataRequired()])
     start_date = DateField('Data de Início', format='%Y-%m-%d', validators=[Optional()])
     end_date = DateField('Data de Fim', format='%Y-%m-%d', validators=[Optional()])
-    document = FileField('Documento do Contrato (PDF, Imagem)', validators=[FileAllowed(['pdf', 'png', 'jpg', 'jpeg'], 'Apenas ficheiros PDF e imagens são permitidos!'), Optional()])
+    document = FileField('Documento do Contrato (PDF, Imagem)', validators=[FileAllowed(DOCUMENT_EXTENSIONS, 'Apenas ficheiros PDF e imagens são permitidos!'), Optional()])
+    # Documentos grandes são enviados antes, em partes (sgpe.uploads); fica aqui o id do upload
+    upload_id = HiddenField()
     submit = SubmitField('Salvar Contrato')
 
+    def validate_upload_id(self, upload_id):
+        if upload_id.data and not uploads.is_ready(upload_id.data, current_user.id):
+            raise ValidationError('O envio do documento não foi concluído. Por favor, tente novamente.')
+
 class ContractTypeForm(FlaskForm):
     name = StringField('Nome do Tipo de Contrato', validators=[DataRequired(), Length(max=100)])
     description = TextAreaField('Descrição', validators=[Optional()])
@@ -99,8 +179,8 @@ class ContractTypeForm(FlaskForm):
         self.obj_instance = kwargs.get('obj')
 
     def validate_name(self, name):
-        # Pesquisa case-insensitive
-        contract_type = ContractType.query.filter(db.func.lower(ContractType.name) == db.func.lower(name.data)).first()
+        # Pesquisa pela chave normalizada (índice único): ignora maiúsculas, acentos e espaços
+        contract_type = ContractType.query.filter_by(name_key=name_key(name.data)).first()
         if contract_type:
             # Se estivermos a atualizar e o tipo encontrado for o mesmo que estamos a editar, está OK.
             if self.obj_instance and self.obj_instance.id == contract_type.id:
@@ -118,11 +198,16 @@ class ProjectTypeForm(FlaskForm):
         self.obj_instance = kwargs.get('obj')
 
     def validate_name(self, name):
-        # Pesquisa case-insensitive
-        project_type = ProjectType.query.filter(db.func.lower(ProjectType.name) == db.func.lower(name.data)).first()
+        # Pesquisa pela chave normalizada (índice único): ignora maiúsculas, acentos e espaços
+        project_type = ProjectType.query.filter_by(name_key=name_key(name.data)).first()
         if project_type:
             # Se estivermos a atualizar e o tipo encontrado for o mesmo que estamos a editar, está OK.
             if self.obj_instance and self.obj_instance.id == project_type.id:
                 return
             # Caso contrário, é um nome duplicado.
             raise ValidationError('Este nome de tipo de projeto já existe. Por favor, escolha um diferente.')
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Tipo de Dados', choices=[('projects', 'Projetos'), ('suppliers', 'Fornecedores'), ('contracts', 'Contratos')], validators=[DataRequired()])
+    file = FileField('Ficheiro CSV', validators=[FileRequired(), FileAllowed(['csv'], 'Apenas ficheiros CSV são permitidos!')])
+    submit = SubmitField('Importar')
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from sgpe import db
+from sgpe.models import User
+
+# Identidade do utilizador autenticado.
+#
+# O Flask-Login chama load_user em cada pedido autenticado. Em vez de carregar
+# um User completo do ORM, guardamos num LRU limitado (USER_CACHE_SIZE entradas,
+# USER_CACHE_TTL segundos) um snapshot imutável com o que as vistas e templates
+# usam (id, username, is_admin). O User completo só é carregado se uma vista o
+# pedir (UserSnapshot.user). As escritas num User feitas por este processo
+# removem a entrada do LRU depois do commit (antes dele, outro pedido voltaria
+# a guardar a linha antiga); as feitas por outros processos são vistas, no
+# máximo, ao fim de USER_CACHE_TTL segundos.
+
+
+class UserSnapshot(UserMixin):
+    """Vista só de leitura de um User, usada como ``current_user``."""
+
+    __slots__ = ('id', 'username', 'is_admin')
+
+    def __init__(self, id, username, is_admin):
+        object.__setattr__(self, 'id', id)
+        object.__setattr__(self, 'username', username)
+        object.__setattr__(self, 'is_admin', is_admin)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserSnapshot é imutável')
+
+    @property
+    def user(self):
+        """O User completo do ORM, carregado (uma vez por pedido) só quando necessário."""
+        if '_identity_user' not in g:
+            g._identity_user = db.session.get(User, self.id)
+        return g._identity_user
+
+    def __repr__(self):
+        return f"UserSnapshot({self.id}, '{self.username}')"
+
+
+class SnapshotCache:
+    """LRU limitado com TTL, partilhado pelas threads do processo."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # id -> (snapshot, instante de carregamento)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, snapshot):
+        with self._lock:
+            self._entries[snapshot.id] = (snapshot, time.monotonic())
+            self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def init_identity(app):
+    app.extensions['sgpe_identity'] = SnapshotCache(app.config['USER_CACHE_SIZE'],
+                                                    app.config['USER_CACHE_TTL'])
+
+
+def _cache():
+    return current_app.extensions['sgpe_identity']
+
+
+def load_user(user_id):
+    """user_loader do Flask-Login: retorna um UserSnapshot ou None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    snapshot = _cache().get(user_id)
+    if snapshot is None:
+        row = db.session.execute(
+            db.select(User.id, User.username, User.is_admin).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(row.id, row.username, bool(row.is_admin))
+        _cache().put(snapshot)
+    return snapshot
+
+
+# Ids dos utilizadores alterados na transação, em Session.info, até ao commit
+_DIRTY_KEY = 'sgpe_identity_dirty'
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_committed(session):
+    user_ids = session.info.pop(_DIRTY_KEY, ())
+    if user_ids and has_app_context():
+        for user_id in user_ids:
+            _cache().discard(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    # As alterações foram desfeitas: os snapshots em cache continuam válidos
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,316 @@
+import csv
+import math
+from abc import ABC, abstractmethod
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import insert
+from sgpe import db
+from sgpe.models import Project, Supplier, Contract, ContractType, ProjectType, contract_projects, name_key
+from sgpe.locations import LOCATION_INDEX
+from sgpe.search import index_documents
+from sgpe.stats import rebuild_dashboard_stats
+from sgpe import refdata
+from sgpe.location_stats import DATA_VERSION as LOCATION_STATS_VERSION
+
+# As linhas são lidas do ficheiro, validadas e gravadas em blocos: a memória
+# usada depende do tamanho do bloco, não do tamanho do ficheiro.
+CHUNK_SIZE = 500
+# Número máximo de erros guardados no relatório (os restantes são apenas contados)
+MAX_REPORTED_ERRORS = 1000
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+# Maior inteiro aceite pelo SQLite (ids de projetos)
+MAX_ID = 2 ** 63 - 1
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+class ImportReport:
+    """Resultado de uma importação: linhas criadas e erros por linha."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.created = 0
+        self.error_count = 0
+        self.errors = []  # (linha, mensagem)
+        self.file_error = None  # ficheiro ilegível: a importação parou nesse ponto
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def truncated(self):
+        return self.error_count > len(self.errors)
+
+
+def read_rows(stream):
+    """Gera (número da linha, linha) a partir de um ficheiro CSV com cabeçalho."""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {key.strip().lower(): (value or '').strip()
+                                for key, value in row.items() if key}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def name_map(model):
+    """Mapa chave normalizada do nome -> id, carregado numa só query."""
+    return {key: id_ for id_, key in db.session.execute(db.select(model.id, model.name_key))}
+
+
+def _required(row, field, max_length=None):
+    value = row.get(field, '')
+    if not value:
+        raise ImportRowError(f"O campo '{field}' é obrigatório.")
+    if max_length and len(value) > max_length:
+        raise ImportRowError(f"O campo '{field}' excede {max_length} caracteres.")
+    return value
+
+
+def _lookup(mapping, row, field, label):
+    value = _required(row, field)
+    try:
+        return mapping[name_key(value)]
+    except KeyError:
+        raise ImportRowError(f"{label} '{value}' não existe.") from None
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ImportRowError(f"Data inválida: '{value}'.")
+
+
+class _Importer(ABC):
+    """Base dos importadores: validar linha a linha, verificar e inserir por bloco."""
+
+    kind = None
+    table = None
+
+    def __init__(self, report):
+        self.report = report
+
+    @abstractmethod
+    def validate(self, row):
+        """Valores a inserir para uma linha do CSV; levanta ImportRowError se for inválida."""
+
+    def check_chunk(self, rows):
+        """Verificações que exigem a base de dados, feitas uma vez por bloco."""
+        return rows
+
+    def after_insert(self, rows, ids):
+        pass
+
+    def insert(self, rows):
+        result = db.session.execute(
+            insert(self.table).returning(self.table.c.id, sort_by_parameter_order=True),
+            [values for _, values in rows]
+        )
+        return result.scalars().all()
+
+    def run(self, stream):
+        for chunk in chunked(read_rows(stream), CHUNK_SIZE):
+            valid = []
+            for line, row in chunk:
+                try:
+                    valid.append((line, self.validate(row)))
+                except ImportRowError as e:
+                    self.report.add_error(line, str(e))
+            valid = self.check_chunk(valid)
+            if not valid:
+                continue
+            ids = self.insert(valid)
+            self.after_insert(valid, ids)
+            index_documents(self.kind, ids)
+            db.session.commit()
+            self.report.created += len(ids)
+        return self.report
+
+
+class ProjectImporter(_Importer):
+    """Colunas: name, description, project_type, province, district, admin_post."""
+
+    kind = 'project'
+    table = Project.__table__
+
+    def __init__(self, report, user_id):
+        super().__init__(report)
+        self.user_id = user_id
+        self.project_types = name_map(ProjectType)
+
+    def validate(self, row):
+        province = _required(row, 'province')
+        district = _required(row, 'district')
+        admin_post = _required(row, 'admin_post')
+        if not LOCATION_INDEX.is_valid(province):
+            raise ImportRowError(f"Província '{province}' não existe.")
+        if not LOCATION_INDEX.is_valid(province, district):
+            raise ImportRowError(f"Distrito '{district}' não pertence a {province}.")
+        if not LOCATION_INDEX.is_valid(province, district, admin_post):
+            raise ImportRowError(f"Posto administrativo '{admin_post}' não pertence a {district}.")
+        return {
+            'name': _required(row, 'name', 100),
+            'description': row.get('description') or None,
+            'project_type_id': _lookup(self.project_types, row, 'project_type', 'Tipo de projeto'),
+            'location_province': province,
+            'location_district': district,
+            'location_admin_post': admin_post,
+            'user_id': self.user_id,
+        }
+
+
+class SupplierImporter(_Importer):
+    """Colunas: name, contact_person, email, phone."""
+
+    kind = 'supplier'
+    table = Supplier.__table__
+
+    def __init__(self, report):
+        super().__init__(report)
+        self.emails = {email.casefold() for (email,) in db.session.execute(
+            db.select(Supplier.email).where(Supplier.email.is_not(None))
+        )}
+
+    def validate(self, row):
+        name = _required(row, 'name', 100)
+        email = row.get('email') or None
+        if email:
+            if '@' not in email:
+                raise ImportRowError(f"Email inválido: '{email}'.")
+            if email.casefold() in self.emails:
+                raise ImportRowError(f"O email '{email}' já está em uso.")
+            self.emails.add(email.casefold())
+        return {'name': name, 'name_key': name_key(name), 'contact_person': row.get('contact_person') or None,
+                'email': email, 'phone': row.get('phone') or None}
+
+    def check_chunk(self, rows):
+        # Os nomes já existentes são procurados pelo índice único de name_key, um bloco de cada vez
+        keys = {values['name_key'] for _, values in rows}
+        existing = set(db.session.execute(
+            db.select(Supplier.name_key).where(Supplier.name_key.in_(keys))
+        ).scalars())
+        valid = []
+        for line, values in rows:
+            if values['name_key'] in existing:
+                self.report.add_error(line, f"O fornecedor '{values['name']}' já existe.")
+            else:
+                existing.add(values['name_key'])
+                valid.append((line, values))
+        return valid
+
+
+class ContractImporter(_Importer):
+    """Colunas: contract_number, contract_type, supplier, contract_value, start_date,
+    end_date, projects (ids de projetos separados por ';')."""
+
+    kind = 'contract'
+    table = Contract.__table__
+
+    def __init__(self, report):
+        super().__init__(report)
+        self.contract_types = name_map(ContractType)
+        self.suppliers = name_map(Supplier)
+
+    def validate(self, row):
+        raw_value = _required(row, 'contract_value')
+        try:
+            value = float(raw_value)
+        except ValueError:
+            value = None
+        # nan, inf e valores como 1e400 (inf) não são montantes
+        if value is None or not math.isfinite(value) or value < 0:
+            raise ImportRowError(f"Valor inválido: '{raw_value}'.")
+        try:
+            project_ids = {int(p) for p in row.get('projects', '').split(';') if p.strip()}
+        except ValueError:
+            project_ids = None
+        if project_ids is None or any(not 0 < project_id <= MAX_ID for project_id in project_ids):
+            raise ImportRowError("A coluna 'projects' deve conter ids separados por ';'.")
+        values = {
+            'contract_number': _required(row, 'contract_number', 50),
+            'contract_type_id': _lookup(self.contract_types, row, 'contract_type', 'Tipo de contrato'),
+            'supplier_id': _lookup(self.suppliers, row, 'supplier', 'Fornecedor'),
+            'contract_value': value,
+            'start_date': _parse_date(row.get('start_date')),
+            'end_date': _parse_date(row.get('end_date')),
+        }
+        return values, project_ids
+
+    def check_chunk(self, rows):
+        numbers = {values['contract_number'] for _, (values, _) in rows}
+        existing = set(db.session.execute(
+            db.select(Contract.contract_number).where(Contract.contract_number.in_(numbers))
+        ).scalars())
+        project_ids = set().union(*(ids for _, (_, ids) in rows))
+        known_projects = set(db.session.execute(
+            db.select(Project.id).where(Project.id.in_(project_ids))
+        ).scalars()) if project_ids else set()
+
+        valid, seen = [], set()
+        for line, (values, ids) in rows:
+            number = values['contract_number']
+            if number in existing or number in seen:
+                self.report.add_error(line, f"O contrato '{number}' já existe.")
+            elif ids - known_projects:
+                missing = ', '.join(str(i) for i in sorted(ids - known_projects))
+                self.report.add_error(line, f"Projetos inexistentes: {missing}.")
+            else:
+                seen.add(number)
+                valid.append((line, (values, ids)))
+        return valid
+
+    def insert(self, rows):
+        return super().insert([(line, values) for line, (values, _) in rows])
+
+    def after_insert(self, rows, ids):
+        links = [{'contract_id': contract_id, 'project_id': project_id}
+                 for (_, (_, project_ids)), contract_id in zip(rows, ids)
+                 for project_id in project_ids]
+        if links:
+            db.session.execute(insert(contract_projects), links)
+
+
+IMPORT_KINDS = ('projects', 'suppliers', 'contracts')
+
+
+def import_csv(kind, stream, user_id=None):
+    """Importa um ficheiro CSV (stream de texto) e retorna um ImportReport.
+
+    Cada bloco válido é gravado com INSERTs em lote (executemany) e confirmado;
+    as linhas com erros são ignoradas e listadas no relatório.
+    """
+    report = ImportReport(kind)
+    if kind == 'projects':
+        importer = ProjectImporter(report, user_id)
+    elif kind == 'suppliers':
+        importer = SupplierImporter(report)
+    elif kind == 'contracts':
+        importer = ContractImporter(report)
+    else:
+        raise ValueError(f'Tipo de importação desconhecido: {kind}')
+    try:
+        importer.run(stream)
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Os blocos anteriores já foram gravados; o bloco em leitura é descartado
+        db.session.rollback()
+        report.file_error = f'Ficheiro inválido (esperado CSV em UTF-8): {e}'
+    # Os INSERTs em lote não disparam os eventos do ORM que mantêm os contadores
+    if report.created and kind in ('projects', 'contracts'):
+        rebuild_dashboard_stats()
+        refdata.invalidate(LOCATION_STATS_VERSION)
+    elif report.created and kind == 'suppliers':
+        refdata.invalidate('supplier')
+    return report
@@ -0,0 +1,236 @@
+import json
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from flask import current_app
+from sgpe import db
+from sgpe.models import Job
+
+# Tarefas em segundo plano, sem broker externo.
+#
+# As vistas chamam enqueue(), que grava uma linha na tabela job e retorna de
+# imediato. O comando 'flask run-jobs' reclama as tarefas prontas (UPDATE
+# condicional, seguro com vários workers) e executa-as num pool de processos,
+# cada um com a sua própria aplicação e ligação à base de dados. Uma tarefa que
+# falhe volta à fila com espera exponencial (JOB_RETRY_BACKOFF * 2^n) até
+# esgotar max_attempts; uma tarefa 'running' há mais de JOB_TIMEOUT segundos
+# (worker morto) é devolvida à fila.
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+TASKS = {}
+
+
+def task(name):
+    """Regista uma função como tarefa: fn(context, **args) -> resultado (JSON)."""
+    def decorator(fn):
+        TASKS[name] = fn
+        return fn
+    return decorator
+
+
+class JobContext:
+    """Passado às tarefas para reportar progresso e gerar ficheiros."""
+
+    def __init__(self, job):
+        self.job_id = job.id
+
+    def progress(self, fraction=None, message=None):
+        """Grava o progresso (0 a 1, ou None para o manter) e uma mensagem."""
+        values = {'message': message}
+        if fraction is not None:
+            values['progress'] = max(0.0, min(1.0, fraction))
+        db.session.execute(db.update(Job).where(Job.id == self.job_id).values(**values))
+        db.session.commit()
+
+    def output_path(self, filename):
+        folder = current_app.config['JOB_OUTPUT_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f'{self.job_id}-{filename}')
+
+
+def enqueue(name, user_id=None, max_attempts=3, **args):
+    """Cria uma tarefa e retorna o Job (já gravado)."""
+    if name not in TASKS:
+        raise ValueError(f'Tarefa desconhecida: {name}')
+    job = Job(name=name, args=json.dumps(args), user_id=user_id, max_attempts=max_attempts)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def to_dict(job):
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error if job.status == FAILED else None,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def claim(worker):
+    """Reclama a próxima tarefa pronta. Retorna o id, ou None se não houver."""
+    while True:
+        now = datetime.utcnow()
+        job_id = db.session.execute(
+            db.select(Job.id).where(Job.status == QUEUED, Job.run_after <= now)
+            .order_by(Job.run_after, Job.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        # Só um worker consegue mudar o estado de 'queued' para 'running'
+        result = db.session.execute(
+            db.update(Job).where(Job.id == job_id, Job.status == QUEUED)
+            .values(status=RUNNING, worker=worker, started_at=now, attempts=Job.attempts + 1)
+        )
+        db.session.commit()
+        if result.rowcount:
+            return job_id
+
+
+def _retry_or_fail(job, error):
+    job.error = error
+    job.worker = None
+    if job.attempts < job.max_attempts:
+        job.status = QUEUED
+        delay = current_app.config['JOB_RETRY_BACKOFF'] * 2 ** (job.attempts - 1)
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+    else:
+        job.status = FAILED
+        job.finished_at = datetime.utcnow()
+
+
+def execute(job_id):
+    """Executa uma tarefa já reclamada e grava o resultado. Retorna o estado final."""
+    job = db.session.get(Job, job_id)
+    fn = TASKS.get(job.name)
+    try:
+        if fn is None:
+            raise LookupError(f'Tarefa desconhecida: {job.name}')
+        result = fn(JobContext(job), **json.loads(job.args))
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        _retry_or_fail(job, f'{type(e).__name__}: {e}')
+    else:
+        job.status = DONE
+        job.progress = 1.0
+        job.result = json.dumps(result)
+        job.error = None
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job.status
+
+
+def requeue_stale():
+    """Devolve à fila (ou dá como falhadas) as tarefas de workers que morreram."""
+    limit = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_TIMEOUT'])
+    stale = Job.query.filter(Job.status == RUNNING, Job.started_at < limit).all()
+    for job in stale:
+        _retry_or_fail(job, 'Tempo máximo de execução excedido.')
+    db.session.commit()
+    return len(stale)
+
+
+# ----- Worker -----
+
+_worker_app = None
+
+
+def _init_process(config_name):
+    global _worker_app
+    from sgpe import create_app
+    _worker_app = create_app(config_name)
+
+
+def _execute_in_process(job_id):
+    with _worker_app.app_context():
+        try:
+            return execute(job_id)
+        finally:
+            db.session.remove()
+
+
+def run_worker(workers=2, poll=1.0, once=False, inline=False, log=print):
+    """Ciclo principal do worker (ver comando 'flask run-jobs').
+
+    ``once``: termina quando não houver tarefas prontas. ``inline``: executa as
+    tarefas neste processo, sem pool (útil para testes e diagnóstico).
+    """
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    requeue_stale()
+    if inline:
+        while True:
+            job_id = claim(worker)
+            if job_id is None:
+                if once:
+                    return
+                time.sleep(poll)
+                continue
+            log(f'Tarefa {job_id}: {execute(job_id)}')
+
+    context = multiprocessing.get_context('spawn')
+    running = {}
+    last_stale_check = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_process,
+                             initargs=(current_app.config['CONFIG_NAME'],)) as pool:
+        while True:
+            while len(running) < workers and (job_id := claim(worker)) is not None:
+                running[pool.submit(_execute_in_process, job_id)] = job_id
+            if not running:
+                if once:
+                    return
+                time.sleep(poll)
+            else:
+                done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        log(f'Tarefa {job_id}: {future.result()}')
+                    except Exception as e:  # O processo morreu: a tarefa volta à fila pelo timeout
+                        log(f'Tarefa {job_id}: erro no worker ({e})')
+            if time.monotonic() - last_stale_check > 60:
+                requeue_stale()
+                last_stale_check = time.monotonic()
+
+
+# ----- Tarefas -----
+
+@task('rebuild-stats')
+def rebuild_stats_task(context):
+    from sgpe.stats import rebuild_dashboard_stats
+    rebuild_dashboard_stats()
+    return {}
+
+
+@task('rebuild-search')
+def rebuild_search_task(context):
+    from sgpe.search import rebuild_search_index
+    rebuild_search_index()
+    return {}
+
+
+@task('export')
+def export_task(context, kind, fmt='csv', search_query=''):
+    """Exportação de contratos ou projetos para um ficheiro (ver sgpe.exporter)."""
+    from sgpe.exporter import stream_export
+    filename = f'{kind}.{fmt}'
+    path = context.output_path(filename)
+    lines = 0
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        for chunk in stream_export(kind, fmt, search_query):
+            output.write(chunk)
+            lines += 1
+            if lines % 1000 == 0:
+                context.progress(message=f'{lines} linhas exportadas')
+    return {'filename': os.path.basename(path), 'lines': lines}
@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload, defaultload, raiseload
+from sgpe import db
+from sgpe.models import Project, Contract
+
+# Planos de carregamento de cada vista: as relações usadas pelos templates são
+# carregadas antecipadamente, para que o número de queries de uma página não
+# dependa do número de linhas mostradas. Relações muitos-para-um usam
+# joinedload (mesma query); coleções usam selectinload (uma query por coleção).
+#
+# Com RAISE_ON_LAZY_LOAD ativo (por omissão nos testes), qualquer relação que
+# não faça parte do plano lança um erro em vez de disparar uma query extra.
+
+
+def _plan(options, nested=()):
+    options = list(options)
+    if current_app.config.get('RAISE_ON_LAZY_LOAD'):
+        options.append(raiseload('*'))
+        options.extend(defaultload(path).raiseload('*') for path in nested)
+    return options
+
+
+def project_list():
+    """Dashboard: lista de projetos com o tipo de projeto."""
+    return _plan([joinedload(Project.project_type)])
+
+
+def project_detail():
+    """Página do projeto: contratos com fornecedor e tipo de contrato."""
+    contracts = selectinload(Project.contracts)
+    return _plan([
+        joinedload(Project.project_type),
+        contracts.joinedload(Contract.contract_type_info),
+        contracts.joinedload(Contract.supplier_info),
+    ], nested=[Project.contracts])
+
+
+def contract_list():
+    """Lista de contratos com tipo, fornecedor e projetos associados."""
+    return _plan([
+        joinedload(Contract.contract_type_info),
+        joinedload(Contract.supplier_info),
+        selectinload(Contract.projects),
+    ], nested=[Contract.projects])
+
+
+def plain_list():
+    """Listagens que só usam colunas da própria tabela (fornecedores, tipos, pesquisa)."""
+    return _plan([])
+
+
+@contextmanager
+def count_queries():
+    """Conta as queries SQL executadas dentro do bloco.
+
+    Uso: ``with count_queries() as queries: ...`` e depois ``len(queries)``.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
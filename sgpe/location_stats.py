@@ -0,0 +1,125 @@
+import threading
+from flask import current_app
+from sqlalchemy import event, func
+from sgpe import db
+from sgpe.locations import LOCATIONS
+from sgpe.models import Project, Contract, contract_projects
+from sgpe import refdata
+
+# Estatísticas por localização (província -> distrito -> posto administrativo):
+# número de projetos e valor dos contratos ligados, em todos os níveis.
+#
+# A árvore é calculada de uma vez a partir de duas queries agrupadas ao nível
+# do posto administrativo (os níveis acima são somados em Python) e guardada
+# em cache em cada processo, associada a uma versão de dados. Os eventos de
+# Project e Contract incrementam a versão (ver sgpe.refdata), pelo que abrir
+# uma província ou um distrito não volta a agregar as tabelas.
+#
+# Um contrato ligado a vários projetos do mesmo nó conta uma só vez nesse nó.
+
+DATA_VERSION = 'location_stats'
+
+
+class LocationStats:
+    """Nó da árvore: totais do nó e filhos (pela ordem de sgpe.locations)."""
+
+    __slots__ = ('name', 'projects', 'contracts', 'contract_value', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.projects = 0
+        self.contracts = 0
+        self.contract_value = 0.0
+        self.children = {}
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = LocationStats(name)
+        return node
+
+    def to_dict(self, depth=1):
+        """Totais do nó e, até ``depth`` níveis abaixo, dos seus filhos."""
+        data = {'name': self.name, 'projects': self.projects, 'contracts': self.contracts,
+                'contract_value': self.contract_value}
+        if depth and self.children:
+            data['children'] = [child.to_dict(depth - 1) for child in self.children.values()]
+        return data
+
+
+def init_location_stats(app):
+    app.extensions['sgpe_location_stats'] = {'version': None, 'tree': None, 'lock': threading.Lock()}
+
+
+def _build_tree():
+    root = LocationStats(None)
+    # Todas as localizações conhecidas aparecem, mesmo sem projetos
+    for province, districts in LOCATIONS.items():
+        province_node = root.child(province)
+        for district, admin_posts in districts.items():
+            district_node = province_node.child(district)
+            for admin_post in admin_posts:
+                district_node.child(admin_post)
+
+    location = (Project.location_province, Project.location_district, Project.location_admin_post)
+    project_counts = db.session.execute(
+        db.select(*location, func.count(Project.id)).group_by(*location)
+    )
+    linked_contracts = db.session.execute(
+        db.select(*location, Contract.id, Contract.contract_value).distinct()
+        .join(contract_projects, contract_projects.c.project_id == Project.id)
+        .join(Contract, Contract.id == contract_projects.c.contract_id)
+    )
+
+    for province, district, admin_post, count in project_counts:
+        for node in _path(root, province, district, admin_post):
+            node.projects += count
+
+    # Conjuntos de contratos por nó, para não somar duas vezes o mesmo contrato
+    seen = {}
+    for province, district, admin_post, contract_id, value in linked_contracts:
+        for node in _path(root, province, district, admin_post):
+            contracts = seen.setdefault(id(node), set())
+            if contract_id not in contracts:
+                contracts.add(contract_id)
+                node.contracts += 1
+                node.contract_value += value or 0
+    return root
+
+
+def _path(root, province, district, admin_post):
+    province_node = root.child(province)
+    district_node = province_node.child(district)
+    return root, province_node, district_node, district_node.child(admin_post)
+
+
+def get_location_stats():
+    """Retorna (versão, árvore de LocationStats), recalculada só quando os dados mudam."""
+    version = refdata.get_version(DATA_VERSION)
+    cache = current_app.extensions['sgpe_location_stats']
+    with cache['lock']:
+        if cache['tree'] is None or cache['version'] != version:
+            cache['tree'] = _build_tree()
+            cache['version'] = version
+        return version, cache['tree']
+
+
+def find_node(tree, *names):
+    """Nó no caminho indicado (ex: 'Gaza', 'Bilene'), ou None se não existir."""
+    node = tree
+    for name in names:
+        node = node.children.get(name)
+        if node is None:
+            return None
+    return node
+
+
+def _changed(mapper, connection, target):
+    refdata.bump_version(connection, DATA_VERSION)
+
+
+# Qualquer escrita em projetos ou contratos (incluindo as ligações entre eles,
+# que marcam o contrato como alterado) invalida a árvore
+for _model in (Project, Contract):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _changed)
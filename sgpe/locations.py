@@ -1,3 +1,8 @@
+import hashlib
+import json
+import sys
+from collections import namedtuple
+
 LOCATIONS = {
     'Maputo Cidade': {
         'KaMpfumo': ['KaMpfumo'],
@@ -186,3 +191,130 @@ def get_admin_posts(province, district):
     if province in LOCATIONS and district in LOCATIONS[province]:
         return LOCATIONS[province][district]
     return []
+
+
+# ----- Índice compacto de localizações -----
+
+PROVINCE_PLACEHOLDER = ('', 'Selecione a Província')
+DISTRICT_PLACEHOLDER = ('', 'Selecione o Distrito')
+ADMIN_POST_PLACEHOLDER = ('', 'Selecione o Posto Administrativo')
+
+
+class LocationIndex:
+    """Índice imutável da hierarquia província -> distrito -> posto administrativo.
+
+    Cada nível recebe códigos inteiros sequenciais e os nomes são internados,
+    pelo que o índice pode crescer até ao gazetteer nacional completo. As listas
+    de escolhas dos formulários são calculadas uma única vez e as verificações
+    de validade são pesquisas em conjuntos, em tempo constante.
+    """
+
+    def __init__(self, locations):
+        self.provinces = []  # código -> nome
+        self.districts = []  # código -> (nome, código da província)
+        self.admin_posts = []  # código -> (nome, código do distrito)
+        self._province_codes = {}
+        self._district_codes = {}  # (província, distrito) -> código
+        self._admin_post_codes = {}  # (província, distrito, posto) -> código
+        self._admin_posts_by_name = {}  # nome -> códigos (há nomes repetidos)
+        self._district_choices = {}
+        self._admin_post_choices = {}
+
+        for province, districts in locations.items():
+            province = sys.intern(province)
+            province_code = len(self.provinces)
+            self.provinces.append(province)
+            self._province_codes[province] = province_code
+            for district, admin_posts in districts.items():
+                district = sys.intern(district)
+                district_code = len(self.districts)
+                self.districts.append((district, province_code))
+                self._district_codes[(province, district)] = district_code
+                for admin_post in admin_posts:
+                    admin_post = sys.intern(admin_post)
+                    admin_post_code = len(self.admin_posts)
+                    self.admin_posts.append((admin_post, district_code))
+                    self._admin_post_codes[(province, district, admin_post)] = admin_post_code
+                    self._admin_posts_by_name.setdefault(admin_post, []).append(admin_post_code)
+                self._admin_post_choices[(province, district)] = (ADMIN_POST_PLACEHOLDER,) + tuple(
+                    (admin_post, admin_post) for admin_post in admin_posts)
+            self._district_choices[province] = (DISTRICT_PLACEHOLDER,) + tuple(
+                (district, district) for district in districts)
+
+        self.province_choices = (PROVINCE_PLACEHOLDER,) + tuple((p, p) for p in self.provinces)
+        self._admin_posts_by_name = {name: tuple(codes) for name, codes in self._admin_posts_by_name.items()}
+
+    # Escolhas para os SelectFields (tuplos pré-calculados, incluindo o placeholder)
+
+    def district_choices(self, province):
+        return self._district_choices.get(province, (DISTRICT_PLACEHOLDER,))
+
+    def admin_post_choices(self, province, district):
+        return self._admin_post_choices.get((province, district), (ADMIN_POST_PLACEHOLDER,))
+
+    # Validação
+
+    def is_valid(self, province, district=None, admin_post=None):
+        """Verifica se a localização (parcial ou completa) existe."""
+        if admin_post is not None:
+            return (province, district, admin_post) in self._admin_post_codes
+        if district is not None:
+            return (province, district) in self._district_codes
+        return province in self._province_codes
+
+    # Códigos
+
+    def province_code(self, province):
+        return self._province_codes.get(province)
+
+    def district_code(self, province, district):
+        return self._district_codes.get((province, district))
+
+    def admin_post_code(self, province, district, admin_post):
+        return self._admin_post_codes.get((province, district, admin_post))
+
+    # Pesquisa inversa
+
+    def district_path(self, district_code):
+        """Código de distrito -> (província, distrito)."""
+        district, province_code = self.districts[district_code]
+        return self.provinces[province_code], district
+
+    def admin_post_path(self, admin_post_code):
+        """Código de posto administrativo -> (província, distrito, posto)."""
+        admin_post, district_code = self.admin_posts[admin_post_code]
+        return self.district_path(district_code) + (admin_post,)
+
+    def find_admin_post(self, admin_post):
+        """Nome de posto administrativo -> lista de (província, distrito, posto).
+
+        O mesmo nome pode existir em mais do que um distrito (ex: 'Save').
+        """
+        return [self.admin_post_path(code) for code in self._admin_posts_by_name.get(admin_post, ())]
+
+
+LOCATION_INDEX = LocationIndex(LOCATIONS)
+
+
+# ----- Respostas JSON pré-compiladas -----
+# O gazetteer é fixo em cada versão da aplicação: as respostas da API são geradas
+# uma única vez na importação, com um ETag forte derivado do conteúdo.
+
+CachedJSON = namedtuple('CachedJSON', ['data', 'etag'])
+
+
+def _cached_json(value):
+    data = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return CachedJSON(data, hashlib.sha256(data).hexdigest()[:32])
+
+
+LOCATIONS_TREE_JSON = _cached_json(LOCATIONS)
+# Versão do gazetteer, usada no URL da árvore completa (muda quando LOCATIONS muda)
+LOCATIONS_VERSION = LOCATIONS_TREE_JSON.etag[:12]
+EMPTY_JSON = _cached_json([])
+DISTRICTS_JSON = {province: _cached_json(list(districts)) for province, districts in LOCATIONS.items()}
+ADMIN_POSTS_JSON = {
+    (province, district): _cached_json(admin_posts)
+    for province, districts in LOCATIONS.items()
+    for district, admin_posts in districts.items()
+}
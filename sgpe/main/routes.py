@@ -1,53 +1,103 @@
-import os
-import secrets
-from flask import Blueprint, render_template, url_for, flash, redirect, request, jsonify, abort, current_app, send_from_directory
+import io
+from datetime import date
+from functools import wraps
+from urllib.parse import quote
+from flask import Blueprint, render_template, url_for, flash, redirect, request, jsonify, abort, current_app, send_from_directory, Response, stream_with_context
 from flask_login import login_user, current_user, logout_user, login_required
 from sgpe import db, bcrypt
-from sgpe.models import User, Project, Contract, Supplier, ContractType, ProjectType
-from sqlalchemy import func
-from sgpe.forms import RegistrationForm, LoginForm, ProjectForm, ContractForm, SupplierForm, ContractTypeForm, ProjectTypeForm
-from sgpe.locations import LOCATIONS
+from sgpe.models import User, Project, Contract, Supplier, ContractType, ProjectType, Job, email_key
+from sgpe.forms import DOCUMENT_EXTENSIONS, RegistrationForm, LoginForm, ProjectForm, ContractForm, SupplierForm, ContractTypeForm, ProjectTypeForm, ImportForm
+from sgpe.locations import LOCATION_INDEX, LOCATIONS_VERSION, LOCATIONS_TREE_JSON, DISTRICTS_JSON, ADMIN_POSTS_JSON, EMPTY_JSON
+from sgpe.stats import get_dashboard_stats, get_spend_rollup, SPEND_DIMENSIONS, UNDATED_YEAR
+from sgpe.location_stats import get_location_stats, find_node
+from sgpe.pagination import paginate, KeysetPagination
+from sgpe import loaders, documents, uploads, jobs, refdata, validity
+from sgpe.allocations import allocate, AllocationError
+from sgpe.importer import import_csv
+from sgpe.exporter import stream_export, EXPORT_FORMATS
+from sgpe.search import search as run_search, search_filter
+from sgpe.passwords import authenticate, PasswordPoolBusy
+from sgpe.ratelimit import rate_limit
+from sqlalchemy.orm import load_only
 from werkzeug.utils import secure_filename
 
 main = Blueprint('main', __name__)
 
+# Chaves de ordenação das listagens (coluna, descendente); o id desempata
+PROJECT_KEYS = [(Project.date_posted, True), (Project.id, True)]
+CONTRACT_KEYS = [(Contract.start_date, True), (Contract.id, True)]
+EXPIRY_KEYS = [(Contract.end_date, False), (Contract.id, False)]
+SUPPLIER_KEYS = [(Supplier.name, False), (Supplier.id, False)]
+PROJECT_TYPE_KEYS = [(ProjectType.name, False), (ProjectType.id, False)]
+CONTRACT_TYPE_KEYS = [(ContractType.name, False), (ContractType.id, False)]
+PROJECT_NAME_KEYS = [(Project.name, False), (Project.id, False)]
+
+UPLOAD_CLAIMED_MESSAGE = 'O documento enviado já não está disponível. Por favor, envie-o novamente.'
+
+def max_content_length(config_key):
+    """Substitui, nesta rota, o limite MAX_CONTENT_LENGTH pelo valor de ``config_key``."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # O corpo só é lido pela vista, depois deste limite estar definido
+            request.max_content_length = current_app.config[config_key]
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
 @main.route('/')
 @main.route('/home')
 def home():
-    # Dados para o dashboard
-    total_projects = Project.query.count()
-    total_contracts = Contract.query.count()
-    total_contract_value = db.session.query(func.sum(Contract.contract_value)).scalar() or 0
-
-    # Dados para o gráfico de projetos por província
-    projects_by_province = db.session.query(Project.location_province, func.count(Project.id)).group_by(Project.location_province).all()
-    province_labels = [row[0] for row in projects_by_province]
-    province_data = [row[1] for row in projects_by_province]
+    # Dados para o dashboard, lidos do snapshot mantido pelos eventos dos modelos
+    stats = get_dashboard_stats()
 
     # Lógica de pesquisa e paginação para a lista de projetos
-    page = request.args.get('page', 1, type=int)
     search_query = request.args.get('search', '')
-    query = Project.query
+    query = Project.query.options(*loaders.project_list())
 
     if search_query:
-        query = query.filter(Project.name.ilike(f'%{search_query}%'))
+        query = query.filter(search_filter('project', Project.id, search_query))
 
-    projects = query.order_by(Project.date_posted.desc()).paginate(page=page, per_page=5)
+    projects = paginate(query, PROJECT_KEYS, per_page=5, filtered=bool(search_query))
 
     return render_template(
         'dashboard.html',
         title='Dashboard',
         projects=projects,
         search_query=search_query,
-        total_projects=total_projects,
-        total_contracts=total_contracts,
-        total_contract_value=total_contract_value,
-        province_labels=province_labels,
-        province_data=province_data
+        **stats
     )
 
 
+@main.route('/search')
+def search():
+    """Pesquisa única, ordenada por relevância, em projetos, contratos e fornecedores."""
+    search_query = request.args.get('q', '')
+    # Contratos e fornecedores só são visíveis para utilizadores autenticados
+    kinds = ['project', 'contract', 'supplier'] if current_user.is_authenticated else ['project']
+    kind = request.args.get('kind')
+    if kind in kinds:
+        kinds = [kind]
+
+    hits = run_search(search_query, kinds=kinds, limit=50) if search_query else []
+
+    # Carrega os objetos de cada tipo com uma única query e mantém a ordem de relevância
+    models = {'project': Project, 'contract': Contract, 'supplier': Supplier}
+    objects = {}
+    for hit_kind in {hit[0] for hit in hits}:
+        ids = [ref_id for k, ref_id, _ in hits if k == hit_kind]
+        model = models[hit_kind]
+        query = model.query.options(*loaders.plain_list()).filter(model.id.in_(ids))
+        objects.update({(hit_kind, obj.id): obj for obj in query})
+    results = [(k, objects[(k, ref_id)]) for k, ref_id, _ in hits if (k, ref_id) in objects]
+
+    return render_template('search.html', title='Pesquisa', results=results,
+                           search_query=search_query, kind=kind)
+
+
 @main.route('/register', methods=['GET', 'POST'])
+@rate_limit('5/hour', burst=5, methods=('POST',))
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.home'))
@@ -64,13 +114,19 @@ def register():
 
 
 @main.route('/login', methods=['GET', 'POST'])
+@rate_limit('10/minute', burst=10, methods=('POST',))
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.home'))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        if user and user.verify_password(form.password.data):
+        user = User.query.filter_by(email_key=email_key(form.email.data)).first()
+        try:
+            authenticated = authenticate(user, form.password.data)
+        except PasswordPoolBusy:
+            flash('O servidor está ocupado. Por favor, tente novamente dentro de momentos.', 'warning')
+            return render_template('login.html', title='Login', form=form), 503
+        if authenticated:
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('main.home'))
@@ -86,6 +142,13 @@ def logout():
     return redirect(url_for('main.home'))
 
 
+def _set_location_choices(form, province=None, district=None):
+    """Define as escolhas dos campos de localização a partir do índice pré-calculado."""
+    form.location_province.choices = LOCATION_INDEX.province_choices
+    form.location_district.choices = LOCATION_INDEX.district_choices(province)
+    form.location_admin_post.choices = LOCATION_INDEX.admin_post_choices(province, district)
+
+
 @main.route('/project/new', methods=['GET', 'POST'])
 @login_required
 def new_project():
@@ -94,27 +157,12 @@ def new_project():
         return redirect(url_for('main.home'))
     form = ProjectForm()
 
-    # Popula as províncias em todas as requisições
-    form.location_province.choices = [('', 'Selecione a Província')] + [(p, p) for p in LOCATIONS.keys()]
-
-    # Se a requisição for POST (submissão do formulário), tentamos popular os campos
-    # de distrito e posto administrativo baseados nos dados enviados.
-    # Isto é crucial para repopular os campos em caso de falha de validação.
+    # Na submissão, as escolhas de distrito e posto administrativo dependem dos
+    # dados enviados (necessário para validar e para repopular em caso de erro).
     if request.method == 'POST':
-        province = request.form.get('location_province')
-        district = request.form.get('location_district')
-
-        form.location_district.choices = [('', 'Selecione o Distrito')]
-        if province and province in LOCATIONS:
-            form.location_district.choices.extend([(d, d) for d in LOCATIONS[province].keys()])
-
-        form.location_admin_post.choices = [('', 'Selecione o Posto Administrativo')]
-        if province and district and district in LOCATIONS.get(province, {}):
-            form.location_admin_post.choices.extend([(p, p) for p in LOCATIONS[province][district]])
+        _set_location_choices(form, request.form.get('location_province'), request.form.get('location_district'))
     else:
-        # Para uma requisição GET, apenas definimos as escolhas vazias com placeholders.
-        form.location_district.choices = [('', 'Selecione o Distrito')]
-        form.location_admin_post.choices = [('', 'Selecione o Posto Administrativo')]
+        _set_location_choices(form)
 
     if form.validate_on_submit():
         project = Project(
@@ -123,7 +171,7 @@ def new_project():
             location_province=form.location_province.data,
             location_district=form.location_district.data,
             location_admin_post=form.location_admin_post.data,
-            author=current_user
+            user_id=current_user.id
         )
         db.session.add(project)
         db.session.commit()
@@ -135,7 +183,7 @@ def new_project():
 
 @main.route('/project/<int:project_id>')
 def project(project_id):
-    project = Project.query.get_or_404(project_id)
+    project = Project.query.options(*loaders.project_detail()).filter_by(id=project_id).first_or_404()
     return render_template('project.html', title=project.name, project=project)
 
 
@@ -150,23 +198,9 @@ def update_project(project_id):
     form = ProjectForm()
     form.submit.label.text = 'Atualizar Projeto'
 
-    # Popula as províncias em todas as requisições
-    form.location_province.choices = [('', 'Selecione a Província')] + [(p, p) for p in LOCATIONS.keys()]
-
     # Lógica para repopular os dropdowns em caso de erro de validação no POST
     if request.method == 'POST':
-        province = request.form.get('location_province')
-        district = request.form.get('location_district')
-        
-        districts_choices = [('', 'Selecione o Distrito')]
-        if province in LOCATIONS:
-            districts_choices.extend([(d, d) for d in LOCATIONS[province].keys()])
-        form.location_district.choices = districts_choices
-
-        admin_posts_choices = [('', 'Selecione o Posto Administrativo')]
-        if province and district and district in LOCATIONS.get(province, {}):
-            admin_posts_choices.extend([(p, p) for p in LOCATIONS[province][district]])
-        form.location_admin_post.choices = admin_posts_choices
+        _set_location_choices(form, request.form.get('location_province'), request.form.get('location_district'))
 
     if form.validate_on_submit():
         project.name = form.name.data
@@ -184,16 +218,7 @@ def update_project(project_id):
         # Popula as escolhas dos dropdowns dinâmicos
         province = project.location_province
         district = project.location_district
-
-        districts_choices = [('', 'Selecione o Distrito')]
-        if province in LOCATIONS:
-            districts_choices.extend([(d, d) for d in LOCATIONS[province].keys()])
-        form.location_district.choices = districts_choices
-
-        admin_posts_choices = [('', 'Selecione o Posto Administrativo')]
-        if province and district and district in LOCATIONS.get(province, {}):
-            admin_posts_choices.extend([(p, p) for p in LOCATIONS[province][district]])
-        form.location_admin_post.choices = admin_posts_choices
+        _set_location_choices(form, province, district)
 
         # Define os valores selecionados para todos os campos
         form.name.data = project.name
@@ -210,7 +235,7 @@ def update_project(project_id):
 @login_required
 def delete_project(project_id):
     project = Project.query.get_or_404(project_id)
-    if project.author != current_user:
+    if project.user_id != current_user.id:
         abort(403)
     db.session.delete(project)
     db.session.commit()
@@ -223,8 +248,7 @@ def delete_project(project_id):
 def project_types():
     if not current_user.is_admin:
         abort(403)
-    page = request.args.get('page', 1, type=int)
-    project_types = ProjectType.query.order_by(ProjectType.name.asc()).paginate(page=page, per_page=10)
+    project_types = paginate(ProjectType.query.options(*loaders.plain_list()), PROJECT_TYPE_KEYS, per_page=10)
     return render_template('project_types.html', project_types=project_types, title='Tipos de Projeto')
 
 @main.route("/project_types/new", methods=['GET', 'POST'])
@@ -278,14 +302,13 @@ def delete_project_type(project_type_id):
 @main.route('/suppliers')
 @login_required
 def suppliers():
-    page = request.args.get('page', 1, type=int)
     search_query = request.args.get('search', '')
-    query = Supplier.query
+    query = Supplier.query.options(*loaders.plain_list())
 
     if search_query:
-        query = query.filter(Supplier.name.ilike(f'%{search_query}%'))
+        query = query.filter(search_filter('supplier', Supplier.id, search_query))
 
-    suppliers = query.order_by(Supplier.name).paginate(page=page, per_page=10)
+    suppliers = paginate(query, SUPPLIER_KEYS, per_page=10, filtered=bool(search_query))
     return render_template('suppliers.html', title='Fornecedores', suppliers=suppliers, search_query=search_query)
 
 @main.route('/supplier/add', methods=['GET', 'POST'])
@@ -327,6 +350,9 @@ def delete_supplier(supplier_id):
     if not current_user.is_admin:
         flash('Não tem permissão para executar esta ação.', 'danger')
         return redirect(url_for('main.suppliers'))
+    if supplier.contracts:
+        flash('Não é possível apagar este fornecedor, pois existem contratos associados a ele.', 'danger')
+        return redirect(url_for('main.suppliers'))
     db.session.delete(supplier)
     db.session.commit()
     flash('Fornecedor apagado com sucesso!', 'success')
@@ -338,8 +364,7 @@ def delete_supplier(supplier_id):
 @login_required
 def contract_types():
     """Exibe uma lista de todos os tipos de contrato."""
-    page = request.args.get('page', 1, type=int)
-    contract_types = ContractType.query.order_by(ContractType.name).paginate(page=page, per_page=10)
+    contract_types = paginate(ContractType.query.options(*loaders.plain_list()), CONTRACT_TYPE_KEYS, per_page=10)
     return render_template('contract_types.html', title='Tipos de Contrato', contract_types=contract_types)
 
 @main.route('/contract_type/new', methods=['GET', 'POST'])
@@ -396,23 +421,61 @@ def delete_contract_type(type_id):
 @login_required
 def contracts():
     """Exibe uma lista de todos os contratos."""
-    page = request.args.get('page', 1, type=int)
     search_query = request.args.get('search', '')
-    query = Contract.query
+    query = Contract.query.options(*loaders.contract_list())
 
     if search_query:
-        # Pesquisa por número do contrato ou nome do fornecedor
-        query = query.join(Supplier).filter(
-            (Contract.contract_number.ilike(f'%{search_query}%')) |
-            (Supplier.name.ilike(f'%{search_query}%'))
-        )
+        # Pesquisa por número do contrato, fornecedor ou tipo de contrato (índice de pesquisa)
+        query = query.filter(search_filter('contract', Contract.id, search_query))
 
-    contracts = query.order_by(Contract.start_date.desc()).paginate(page=page, per_page=10)
+    contracts = paginate(query, CONTRACT_KEYS, per_page=10, filtered=bool(search_query))
     return render_template('contracts.html', title='Contratos', contracts=contracts, search_query=search_query)
 
 
+@main.route('/contracts/validity')
+@login_required
+def contract_validity():
+    """Contratos em vigor numa data, a terminar em breve ou com vigências sobrepostas.
+
+    Parâmetros: ?view=active&date=AAAA-MM-DD, ?view=expiring&days=30, ou
+    ?view=overlaps com project_id (pares de contratos do projeto) ou start/end.
+    """
+    view = request.args.get('view', 'active')
+    day = request.args.get('date', type=date.fromisoformat) or date.today()
+    days = min(max(request.args.get('days', 30, type=int), 0), 3650)
+    start = request.args.get('start', type=date.fromisoformat)
+    end = request.args.get('end', type=date.fromisoformat)
+    project_id = request.args.get('project_id', type=int)
+    args = {'view': view}
+    contracts, pairs, project = None, None, None
+
+    if view == 'expiring':
+        args['days'] = days
+        query = Contract.query.options(*loaders.contract_list()).filter(validity.expiring_within(days))
+        contracts = paginate(query, EXPIRY_KEYS, per_page=10, filtered=True)
+    elif view == 'overlaps' and project_id:
+        project = Project.query.get_or_404(project_id)
+        args['project_id'] = project_id
+        pairs = validity.project_overlaps(project_id)
+    elif view == 'overlaps':
+        start, end = start or day, end or start or day
+        args.update(start=start.isoformat(), end=end.isoformat())
+        query = Contract.query.options(*loaders.contract_list()).filter(validity.overlapping(start, end))
+        contracts = paginate(query, EXPIRY_KEYS, per_page=10, filtered=True)
+    else:
+        view = args['view'] = 'active'
+        args['date'] = day.isoformat()
+        query = Contract.query.options(*loaders.contract_list()).filter(validity.active_on(day))
+        contracts = paginate(query, EXPIRY_KEYS, per_page=10, filtered=True)
+
+    return render_template('contract_validity.html', title='Vigência dos Contratos', view=view, day=day,
+                           days=days, start=start, end=end, project=project, contracts=contracts,
+                           pairs=pairs, args=args, today=date.today())
+
+
 @main.route('/contract/add', methods=['GET', 'POST'])
 @login_required
+@max_content_length('DOCUMENT_MAX_CONTENT_LENGTH')
 def add_contract():
     if not current_user.is_admin:
         flash('Não tem permissão para aceder a esta página.', 'danger')
@@ -420,8 +483,16 @@ def add_contract():
     form = ContractForm()
     if form.validate_on_submit():
         document_filename = None
-        if form.document.data:
-            document_filename = save_document(form.document.data)
+        if form.upload_id.data:
+            document_filename = uploads.claim(form.upload_id.data, current_user.id)
+            if document_filename is None:
+                # Já associado por outro pedido (ex: formulário submetido duas vezes)
+                flash(UPLOAD_CLAIMED_MESSAGE, 'danger')
+                form.upload_id.data = ''
+                return render_template('add_contract.html', title='Adicionar Contrato', form=form,
+                                       legend='Novo Contrato')
+        elif form.document.data:
+            document_filename = documents.store(form.document.data)
 
         contract = Contract(
             contract_number=form.contract_number.data,
@@ -445,6 +516,7 @@ def add_contract():
 
 @main.route('/contract/<int:contract_id>/update', methods=['GET', 'POST'])
 @login_required
+@max_content_length('DOCUMENT_MAX_CONTENT_LENGTH')
 def update_contract(contract_id):
     contract = Contract.query.get_or_404(contract_id)
     if not current_user.is_admin:
@@ -453,13 +525,20 @@ def update_contract(contract_id):
     form = ContractForm(obj=contract)
     
     if form.validate_on_submit():
-        if form.document.data:
-            # Apaga o documento antigo se um novo for enviado
-            if contract.document_filename:
-                old_document_path = os.path.join(current_app.root_path, '..', current_app.config['UPLOAD_FOLDER'], contract.document_filename)
-                if os.path.exists(old_document_path):
-                    os.remove(old_document_path)
-            contract.document_filename = save_document(form.document.data)
+        old_document = None
+        if form.upload_id.data:
+            document_filename = uploads.claim(form.upload_id.data, current_user.id)
+            if document_filename is None:
+                # Mantém o documento atual (ex: formulário submetido duas vezes)
+                flash(UPLOAD_CLAIMED_MESSAGE, 'danger')
+                form.upload_id.data = ''
+                return render_template('add_contract.html', title='Atualizar Contrato', form=form,
+                                       legend='Atualizar Contrato')
+            old_document = contract.document_filename
+            contract.document_filename = document_filename
+        elif form.document.data:
+            old_document = contract.document_filename
+            contract.document_filename = documents.store(form.document.data)
 
         contract.contract_number = form.contract_number.data
         contract.contract_type_id = form.contract_type.data.id
@@ -472,6 +551,8 @@ def update_contract(contract_id):
         contract.projects = form.projects.data
 
         db.session.commit()
+        # O documento antigo só é apagado se nenhum outro contrato o usar
+        documents.release(old_document)
         flash('Contrato atualizado com sucesso!', 'success')
         return redirect(url_for('main.contracts'))
     
@@ -496,51 +577,307 @@ def delete_contract(contract_id):
         flash('Não tem permissão para executar esta ação.', 'danger')
         return redirect(url_for('main.contracts'))
     
-    # Apaga o documento associado, se existir
-    if contract.document_filename:
-        document_path = os.path.join(current_app.root_path, '..', current_app.config['UPLOAD_FOLDER'], contract.document_filename)
-        if os.path.exists(document_path):
-            os.remove(document_path)
-
+    document = contract.document_filename
     db.session.delete(contract)
     db.session.commit()
+    # Apaga o documento associado, se mais nenhum contrato o usar
+    documents.release(document)
     flash('Contrato apagado com sucesso!', 'success')
     return redirect(url_for('main.contracts'))
 
 
-def save_document(form_document):
-    """Salva o documento de contrato no sistema de ficheiros."""
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_document.filename)
-    document_fn = random_hex + f_ext
-    document_path = os.path.join(current_app.root_path, '..', current_app.config['UPLOAD_FOLDER'], document_fn)
-    
-    # Garante que o diretório de upload existe
-    os.makedirs(os.path.dirname(document_path), exist_ok=True)
-    
-    form_document.save(document_path)
-    
-    return document_fn
-
-@main.route('/uploads/<filename>')
+@main.route('/uploads/<path:filename>')
 @login_required
 def download_document(filename):
-    """Serve os ficheiros de upload para download."""
-    upload_dir = os.path.join(current_app.root_path, '..', current_app.config['UPLOAD_FOLDER'])
-    return send_from_directory(upload_dir, filename)
+    """Serve os documentos dos contratos (ETag, 304, Range e, opcionalmente, X-Accel-Redirect)."""
+    return documents.serve(filename)
+
+
+@main.route('/import', methods=['GET', 'POST'])
+@login_required
+@max_content_length('IMPORT_MAX_CONTENT_LENGTH')
+def import_data():
+    """Importação em massa de projetos, fornecedores ou contratos a partir de CSV."""
+    if not current_user.is_admin:
+        flash('Não tem permissão para aceder a esta página.', 'danger')
+        return redirect(url_for('main.home'))
+    form = ImportForm()
+    report = None
+    if form.validate_on_submit():
+        # Lê o upload como texto, em streaming, sem o carregar todo para memória
+        stream = io.TextIOWrapper(form.file.data.stream, encoding='utf-8-sig', newline='')
+        report = import_csv(form.kind.data, stream, user_id=current_user.id)
+        if report.file_error:
+            flash(f'{report.file_error} {report.created} registos importados antes do erro.', 'danger')
+        else:
+            flash(f'{report.created} registos importados, {report.error_count} linhas com erros.',
+                  'success' if not report.error_count else 'warning')
+    return render_template('import.html', title='Importar Dados', form=form, report=report)
+
+
+@main.route('/export/<any(contracts, projects):kind>')
+@login_required
+def export_data(kind):
+    """Exporta contratos ou projetos em CSV ou JSONL, em streaming, com os filtros das listagens."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    search_query = request.args.get('search', '')
+    response = Response(stream_with_context(stream_export(kind, fmt, search_query)),
+                        mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    return response
+
+
+@main.route('/export/<any(contracts, projects):kind>/background', methods=['POST'])
+@login_required
+def export_data_background(kind):
+    """Agenda a exportação como tarefa em segundo plano e responde de imediato (202)."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    job = jobs.enqueue('export', user_id=current_user.id, kind=kind, fmt=fmt,
+                       search_query=request.args.get('search', ''))
+    status_url = url_for('main.job_status', job_id=job.id)
+    response = jsonify(dict(jobs.to_dict(job), status_url=status_url))
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
+def _get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        abort(404)
+    return job
+
+
+@main.route('/api/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Estado e progresso de uma tarefa em segundo plano."""
+    job = _get_job(job_id)
+    data = jobs.to_dict(job)
+    if job.status == jobs.DONE and data['result'] and data['result'].get('filename'):
+        data['download_url'] = url_for('main.job_download', job_id=job.id)
+    return jsonify(data)
+
+
+@main.route('/jobs/<int:job_id>/download')
+@login_required
+def job_download(job_id):
+    """Descarrega o ficheiro gerado por uma tarefa concluída (ex: exportação)."""
+    job = _get_job(job_id)
+    result = jobs.to_dict(job)['result'] or {}
+    if job.status != jobs.DONE or not result.get('filename'):
+        abort(404)
+    return send_from_directory(current_app.config['JOB_OUTPUT_FOLDER'], result['filename'], as_attachment=True)
+
+
+@main.route('/api/allocations', methods=['POST'])
+@login_required
+@rate_limit('30/minute', key='user')
+def bulk_allocate():
+    """Aloca em lote itens de contrato a projetos.
+
+    Corpo JSON: {"allocations": [{"item_id": 1, "project_id": 2, "quantity": 10}, ...]}
+    """
+    if not current_user.is_admin:
+        abort(403)
+    payload = request.get_json(silent=True)
+    rows = payload.get('allocations') if isinstance(payload, dict) else None
+    if not isinstance(rows, list):
+        return jsonify({'errors': [{'row': None, 'message': 'O corpo deve conter uma lista "allocations".'}]}), 400
+    try:
+        created = allocate(rows)
+    except AllocationError as e:
+        return jsonify({'errors': e.errors}), 400
+    return jsonify({'created': created}), 201
+
+
+@main.route('/api/projects')
+@login_required
+@rate_limit('120/minute', burst=30, key='user')
+def project_lookup():
+    """Pesquisa de projetos por prefixo do nome, paginada por cursor (autocomplete).
+
+    Parâmetros: ?q=prefixo&cursor=...&limit=20. Resposta:
+    {"results": [{"id": 1, "name": "..."}], "next_cursor": "..." ou null}
+    """
+    prefix = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    query = Project.query.options(load_only(Project.id, Project.name), *loaders.plain_list())
+    if prefix:
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if db.engine.dialect.name == 'sqlite':
+            # O LIKE do SQLite já ignora maiúsculas (como lower(), só em ASCII); sem
+            # lower() na coluna, o prefixo é procurado em ix_project_name_nocase_id
+            query = query.filter(Project.name.like(escaped + '%', escape='\\'))
+        else:
+            query = query.filter(Project.name.ilike(escaped + '%', escape='\\'))
+    page = KeysetPagination(query, PROJECT_NAME_KEYS, request.args.get('cursor'), limit)
+    return jsonify({
+        'results': [{'id': project.id, 'name': project.name} for project in page.items],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@main.route('/api/reports/spend')
+@login_required
+@rate_limit('60/minute', burst=20, key='user')
+def spend_report():
+    """Despesa por fornecedor, tipo de contrato e ano de início, lida do cubo pré-calculado.
+
+    Parâmetros: ?group_by=supplier,contract_type,year (dimensões a manter; as
+    restantes são somadas) e filtros opcionais supplier_id, contract_type_id e
+    year (0 = sem data). Resposta: {"group_by": [...], "rows": [...], "total": {...}}
+    """
+    group_by = [name for name in request.args.get('group_by', 'supplier,contract_type,year').split(',') if name]
+    unknown = [name for name in group_by if name not in SPEND_DIMENSIONS]
+    if unknown or len(set(group_by)) != len(group_by):
+        return jsonify({'error': f"group_by inválido; dimensões possíveis: {', '.join(SPEND_DIMENSIONS)}."}), 400
+    filters = {}
+    for name in ('supplier_id', 'contract_type_id', 'year'):
+        if request.args.get(name):
+            filters[name] = request.args.get(name, type=int)
+            if filters[name] is None:
+                return jsonify({'error': f'{name} deve ser um número inteiro.'}), 400
+
+    rows = get_spend_rollup(group_by, **filters)
+    for row in rows:
+        # Nomes lidos da cache das tabelas de referência, sem JOIN aos contratos
+        if 'supplier' in row:
+            item = refdata.get_item('supplier', row['supplier'])
+            row['supplier'] = {'id': row['supplier'], 'name': item.name if item else None}
+        if 'contract_type' in row:
+            item = refdata.get_item('contract_type', row['contract_type'])
+            row['contract_type'] = {'id': row['contract_type'], 'name': item.name if item else None}
+        if row.get('year') == UNDATED_YEAR:
+            row['year'] = None
+    return jsonify({
+        'group_by': group_by,
+        'rows': rows,
+        'total': {'count': sum(row['count'] for row in rows), 'total': sum(row['total'] for row in rows)},
+    })
+
+
+@main.route('/api/stats/locations')
+@main.route('/api/stats/locations/<province>')
+@main.route('/api/stats/locations/<province>/<district>')
+@login_required
+@rate_limit('120/minute', burst=30, key='user')
+def location_stats(province=None, district=None):
+    """Projetos e valor dos contratos ligados num nível da hierarquia de localizações.
+
+    Sem argumentos devolve o total e as províncias; com a província, os seus
+    distritos; com o distrito, os postos administrativos. Os lugares sem
+    projetos aparecem com zero.
+    """
+    version, tree = get_location_stats()
+    path = [name for name in (province, district) if name is not None]
+    node = find_node(tree, *path)
+    if node is None:
+        return jsonify({'error': 'Localização não encontrada.'}), 404
+    response = jsonify(dict(node.to_dict(), path=path, version=version))
+    # A versão dos dados identifica a resposta: 304 enquanto nada mudar
+    response.set_etag(f'{version}:{quote("/".join(path))}')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _upload_response(view):
+    """Restringe a administradores e converte UploadError em respostas JSON."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        try:
+            return view(*args, **kwargs)
+        except uploads.UploadError as e:
+            return jsonify({'error': str(e)}), e.status
+    return wrapped
+
+
+@main.route('/api/uploads', methods=['POST'])
+@login_required
+@_upload_response
+def create_upload():
+    """Inicia um upload em partes. Corpo JSON: {"filename": "contrato.pdf", "size": 123456}"""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise uploads.UploadError('O corpo deve ser um objeto JSON.')
+    upload = uploads.create(current_user.id, payload.get('filename'), payload.get('size'), DOCUMENT_EXTENSIONS)
+    return jsonify(uploads.status(upload)), 201
+
+
+@main.route('/api/uploads/<upload_id>')
+@login_required
+@_upload_response
+def upload_status(upload_id):
+    """Estado do upload: bytes recebidos e próxima parte a enviar (para retomar)."""
+    return jsonify(uploads.status(uploads.get_session(upload_id, current_user.id)))
+
+
+@main.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+@max_content_length('UPLOAD_CHUNK_SIZE')
+@_upload_response
+def upload_chunk(upload_id, index):
+    """Recebe a parte ``index`` no corpo do pedido (application/octet-stream)."""
+    upload = uploads.get_session(upload_id, current_user.id)
+    if request.content_length is None:
+        return jsonify({'error': 'É necessário o cabeçalho Content-Length.'}), 411
+    upload = uploads.write_chunk(upload, index, request.stream, request.content_length)
+    return jsonify(uploads.status(upload))
+
+
+@main.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+@_upload_response
+def finalize_upload(upload_id):
+    upload = uploads.finalize(uploads.get_session(upload_id, current_user.id))
+    return jsonify(uploads.status(upload))
+
+
+def _cached_json_response(payload, max_age):
+    """Resposta JSON pré-compilada com ETag forte; responde 304 se o cliente já a tiver."""
+    response = current_app.response_class(payload.data, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
 
 
 @main.route('/api/districts/<province>')
+@rate_limit('120/minute', burst=60)
 def get_districts(province):
-    if province not in LOCATIONS:
-        return jsonify([])
-    districts = list(LOCATIONS[province].keys())
-    return jsonify(districts)
+    payload = DISTRICTS_JSON.get(province, EMPTY_JSON)
+    return _cached_json_response(payload, current_app.config['LOCATIONS_CACHE_MAX_AGE'])
 
 
 @main.route('/api/admin_posts/<province>/<district>')
+@rate_limit('120/minute', burst=60)
 def get_admin_posts(province, district):
-    if province not in LOCATIONS or district not in LOCATIONS[province]:
-        return jsonify([])
-    admin_posts = LOCATIONS[province][district]
-    return jsonify(admin_posts)
+    payload = ADMIN_POSTS_JSON.get((province, district), EMPTY_JSON)
+    return _cached_json_response(payload, current_app.config['LOCATIONS_CACHE_MAX_AGE'])
+
+
+@main.route('/api/locations/<version>')
+@rate_limit('60/minute', burst=20)
+def get_locations_tree(version):
+    """Árvore completa província -> distrito -> postos administrativos.
+
+    O URL inclui a versão do gazetteer, por isso a resposta pode ficar em cache
+    indefinidamente; pedidos com uma versão antiga são redirecionados.
+    """
+    if version != LOCATIONS_VERSION:
+        return redirect(url_for('main.get_locations_tree', version=LOCATIONS_VERSION))
+    response = _cached_json_response(LOCATIONS_TREE_JSON, 365 * 24 * 3600)
+    response.cache_control.immutable = True
+    return response
+
+
+@main.context_processor
+def inject_locations_version():
+    return {'locations_version': LOCATIONS_VERSION}
@@ -1,19 +1,52 @@
+import unicodedata
 from datetime import datetime
-from sgpe import db, login_manager, bcrypt
+from sgpe import db, bcrypt
 from flask_login import UserMixin
+from sqlalchemy import func, inspect
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import undefer, validates
+
+
+def name_key(value):
+    """Chave de unicidade de um nome: sem maiúsculas, acentos nem espaços repetidos.
+
+    Ex: '  Água  e Saneamento ' -> 'agua e saneamento'.
+    """
+    decomposed = unicodedata.normalize('NFKD', (value or '').casefold())
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def email_key(value):
+    """Chave de unicidade de um email: sem espaços à volta e sem maiúsculas."""
+    return (value or '').strip().casefold()
+
+
+def key_column(source, normalize, length):
+    """Coluna com a chave normalizada de ``source``, com índice único.
+
+    A chave é calculada no INSERT (também nos INSERTs em lote do Core) e, pelo
+    ORM, sempre que ``source`` muda (ver os @validates dos modelos). O 'info' é
+    usado por sgpe.schema para preencher a coluna em bases de dados antigas.
+    """
+    return db.Column(db.String(length), nullable=False, unique=True, index=True,
+                     default=lambda context: normalize(context.get_current_parameters()[source]),
+                     info={'source': source, 'normalize': normalize})
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(20), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
+    email_key = key_column('email', email_key, 120)
     password_hash = db.Column(db.String(128))
     is_admin = db.Column(db.Boolean, nullable=False, default=False)
     projects = db.relationship('Project', backref='author', lazy=True)
 
+    @validates('email')
+    def _set_email_key(self, key, value):
+        self.email_key = email_key(value)
+        return value
+
     @property
     def password(self):
         raise AttributeError('password is not a readable attribute')
@@ -31,28 +64,36 @@ class User(db.Model, UserMixin):
 class ProjectType(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
+    name_key = key_column('name', name_key, 100)
     description = db.Column(db.Text, nullable=True)
     projects = db.relationship('Project', backref='project_type', lazy=True)
 
+    @validates('name')
+    def _set_name_key(self, key, value):
+        self.name_key = name_key(value)
+        return value
+
     def __repr__(self):
         return f"ProjectType('{self.name}')"
 
 # Tabela de associação para a relação muitos-para-muitos entre Contrato and Projeto
 contract_projects = db.Table('contract_projects',
     db.Column('contract_id', db.Integer, db.ForeignKey('contract.id'), primary_key=True),
-    db.Column('project_id', db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    db.Column('project_id', db.Integer, db.ForeignKey('project.id'), primary_key=True),
+    # A chave primária (contract_id, project_id) já serve as pesquisas por contrato
+    db.Index('ix_contract_projects_project_id', 'project_id')
 )
 
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    project_type_id = db.Column(db.Integer, db.ForeignKey('project_type.id'), nullable=False)
+    project_type_id = db.Column(db.Integer, db.ForeignKey('project_type.id'), nullable=False, index=True)
     location_province = db.Column(db.String(50), nullable=False)
     location_district = db.Column(db.String(50), nullable=False)
     location_admin_post = db.Column(db.String(50), nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     # Relação com Contratos
     contracts = db.relationship(
         'Contract',
@@ -60,44 +101,71 @@ class Project(db.Model):
         back_populates='projects'
     )
 
+    __table_args__ = (
+        db.Index('ix_project_date_posted_id', 'date_posted', 'id'),  # Ordenação do dashboard
+        db.Index('ix_project_name_id', 'name', 'id'),  # Autocomplete sem prefixo, ordenado pelo nome
+        # Pesquisa por prefixo sem distinguir maiúsculas: o LIKE do SQLite usa este índice
+        db.Index('ix_project_name_nocase_id', db.text('name COLLATE NOCASE'), 'id'),
+        db.Index('ix_project_location', 'location_province', 'location_district', 'location_admin_post'),
+    )
+
     def __repr__(self):
         return f"Project('{self.name}', '{self.location_province}')"
 
 class Supplier(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
+    name_key = key_column('name', name_key, 100)
     contact_person = db.Column(db.String(100), nullable=True)
     email = db.Column(db.String(120), unique=True, nullable=True)
     phone = db.Column(db.String(20), nullable=True)
     contracts = db.relationship('Contract', backref='supplier_info', lazy=True)
 
+    @validates('name')
+    def _set_name_key(self, key, value):
+        self.name_key = name_key(value)
+        return value
+
     def __repr__(self):
         return f"Supplier('{self.name}')"
 
 class ContractType(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
+    name_key = key_column('name', name_key, 100)
     description = db.Column(db.Text, nullable=True) 
     contracts = db.relationship('Contract', backref='contract_type_info', lazy=True)
 
+    @validates('name')
+    def _set_name_key(self, key, value):
+        self.name_key = name_key(value)
+        return value
+
     def __repr__(self):
         return f"ContractType('{self.name}')"
 
 class Contract(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     contract_number = db.Column(db.String(50), unique=True, nullable=False)
-    contract_type_id = db.Column(db.Integer, db.ForeignKey('contract_type.id'), nullable=False)
+    contract_type_id = db.Column(db.Integer, db.ForeignKey('contract_type.id'), nullable=False, index=True)
     contract_value = db.Column(db.Float, nullable=False)
     start_date = db.Column(db.DateTime, nullable=True)
     end_date = db.Column(db.DateTime, nullable=True)
-    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=False)
-    document_filename = db.Column(db.String(200), nullable=True) # Campo para o nome do ficheiro
+    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=False, index=True)
+    document_filename = db.Column(db.String(200), nullable=True, index=True) # Chave do documento (ver sgpe.documents)
     # Relação com Projetos
     projects = db.relationship(
         'Project',
         secondary=contract_projects,
         back_populates='contracts'
     )
+    # Itens (e as suas alocações) são apagados com o contrato
+    items = db.relationship('ContractItem', backref='contract', lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.Index('ix_contract_start_date_id', 'start_date', 'id'),  # Ordenação da lista de contratos
+        db.Index('ix_contract_end_date_start_date', 'end_date', 'start_date'),  # Vigência (ver sgpe.validity)
+    )
 
     def __repr__(self):
         return f"Contract('{self.contract_number}', '{self.contract_type_info.name}', '{self.supplier_info.name}', '{self.contract_value}')"
@@ -109,21 +177,54 @@ class ContractItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     unit = db.Column(db.String(50), nullable=False)  # Ex: 'unidades', 'metros', 'kg'
     unit_price = db.Column(db.Float, nullable=False)
-    contract_id = db.Column(db.Integer, db.ForeignKey('contract.id'), nullable=False)
+    contract_id = db.Column(db.Integer, db.ForeignKey('contract.id'), nullable=False, index=True)
     allocations = db.relationship('Allocation', backref='item', lazy=True, cascade="all, delete-orphan")
 
     @property
     def total_price(self):
         return self.quantity * self.unit_price
 
-    @property
+    @hybrid_property
     def allocated_quantity(self):
+        # Se o total já veio da base de dados (ver with_availability) e a coleção não foi
+        # carregada, evita carregar todas as alocações; caso contrário soma em Python,
+        # o que inclui alocações ainda não gravadas.
+        state = inspect(self)
+        if 'allocations' in state.unloaded and 'allocated_total' not in state.unloaded:
+            return self.allocated_total
         return sum(allocation.quantity for allocation in self.allocations)
 
-    @property
+    @allocated_quantity.expression
+    def allocated_quantity(cls):
+        return _allocated_sum()
+
+    @hybrid_property
     def available_quantity(self):
         return self.quantity - self.allocated_quantity
 
+    @available_quantity.expression
+    def available_quantity(cls):
+        return cls.quantity - _allocated_sum()
+
+    @classmethod
+    def with_availability(cls):
+        """Opção de query que carrega o total alocado na mesma query dos itens."""
+        return undefer(cls.allocated_total)
+
+    @classmethod
+    def availability_for(cls, item_ids):
+        """Retorna {item_id: (alocado, disponível)} para os itens pedidos, numa só query."""
+        allocated = (db.select(Allocation.item_id, func.sum(Allocation.quantity).label('allocated'))
+                     .where(Allocation.item_id.in_(item_ids))
+                     .group_by(Allocation.item_id)
+                     .subquery())
+        rows = db.session.execute(
+            db.select(cls.id, cls.quantity, func.coalesce(allocated.c.allocated, 0))
+            .outerjoin(allocated, allocated.c.item_id == cls.id)
+            .where(cls.id.in_(item_ids))
+        )
+        return {item_id: (total, quantity - total) for item_id, quantity, total in rows}
+
     def __repr__(self):
         return f"ContractItem('{self.name}', Qty: {self.quantity})"
 
@@ -131,10 +232,88 @@ class Allocation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     quantity = db.Column(db.Integer, nullable=False)
     allocation_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    item_id = db.Column(db.Integer, db.ForeignKey('contract_item.id'), nullable=False)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('contract_item.id'), nullable=False, index=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, index=True)
 
     project = db.relationship('Project', backref='allocations')
 
     def __repr__(self):
         return f"Allocation(Item ID: {self.item_id} to Project ID: {self.project_id}, Qty: {self.quantity})"
+
+def _allocated_sum():
+    """Soma das quantidades alocadas a um item, como subquery correlacionada."""
+    return (db.select(func.coalesce(func.sum(Allocation.quantity), 0))
+            .where(Allocation.item_id == ContractItem.id)
+            .correlate_except(Allocation)
+            .scalar_subquery())
+
+# Total alocado calculado pela base de dados; diferido, só é carregado com ContractItem.with_availability()
+ContractItem.allocated_total = db.column_property(_allocated_sum(), deferred=True)
+
+class DashboardStat(db.Model):
+    """Contadores pré-calculados do dashboard (ver sgpe.stats)."""
+    key = db.Column(db.String(120), primary_key=True)  # Ex: 'projects', 'contracts', 'province:Gaza'
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"DashboardStat('{self.key}', {self.count}, {self.total})"
+
+class SpendRollup(db.Model):
+    """Cubo de despesa: contratos e valor por fornecedor, tipo de contrato e ano de início (ver sgpe.stats)."""
+    __tablename__ = 'spend_rollup'
+    supplier_id = db.Column(db.Integer, primary_key=True)
+    contract_type_id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)  # 0 = contrato sem data de início
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"SpendRollup({self.supplier_id}, {self.contract_type_id}, {self.year}, {self.count}, {self.total})"
+
+class UploadSession(db.Model):
+    """Upload de um documento em partes, retomável (ver sgpe.uploads)."""
+    id = db.Column(db.String(32), primary_key=True)  # Token aleatório
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(200), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)
+    document_key = db.Column(db.String(200), nullable=True, index=True)  # Preenchido ao finalizar
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"UploadSession('{self.id}', '{self.filename}', {self.received}/{self.size})"
+
+class Job(db.Model):
+    """Tarefa em segundo plano, executada pelo comando 'flask run-jobs' (ver sgpe.jobs)."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)  # Nome da tarefa registada
+    args = db.Column(db.Text, nullable=False, default='{}')  # Argumentos em JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    progress = db.Column(db.Float, nullable=False, default=0)
+    message = db.Column(db.String(200), nullable=True)
+    result = db.Column(db.Text, nullable=True)  # Resultado em JSON
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),  # Próxima tarefa pronta
+    )
+
+    def __repr__(self):
+        return f"Job({self.id}, '{self.name}', '{self.status}')"
+
+class RefDataVersion(db.Model):
+    """Versão de cada tabela de referência, incrementada a cada escrita (ver sgpe.refdata)."""
+    name = db.Column(db.String(50), primary_key=True)  # Ex: 'supplier', 'contract_type'
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"RefDataVersion('{self.name}', {self.version})"
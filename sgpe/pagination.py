@@ -0,0 +1,149 @@
+import base64
+import json
+from datetime import date, datetime
+from flask import current_app, request
+from sqlalchemy import and_, or_, false, func
+from sgpe import db
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError('valor de cursor inválido')
+    return value
+
+
+def encode_cursor(values, direction):
+    """Gera um token opaco (base64 url-safe) com os valores das chaves de ordenação."""
+    payload = json.dumps({'v': [_encode_value(v) for v in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Descodifica um token de cursor. Retorna (valores, direção) ou None se inválido."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = [_decode_value(v) for v in payload['v']]
+        direction = payload['d']
+    except (ValueError, TypeError, KeyError):
+        return None
+    if len(values) != size or direction not in ('next', 'prev'):
+        return None
+    return values, direction
+
+
+def _order_clause(column, descending):
+    # NULL é tratado como o menor valor (comportamento por omissão do SQLite)
+    if descending:
+        return column.desc().nulls_last()
+    return column.asc().nulls_first()
+
+
+def _after(column, descending, value):
+    """Condição 'vem depois de value' para uma coluna, com NULL como menor valor."""
+    if descending:
+        if value is None:
+            return false()
+        return or_(column < value, column.is_(None))
+    if value is None:
+        return column.is_not(None)
+    return column > value
+
+
+def _equals(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def _keyset_filter(keys, values):
+    """Comparação lexicográfica (k1, k2, ...) > (v1, v2, ...) respeitando a direção de cada chave."""
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        prefix = [_equals(keys[j][0], values[j]) for j in range(i)]
+        clauses.append(and_(*prefix, _after(column, descending, values[i])))
+    return or_(*clauses)
+
+
+class KeysetPagination:
+    """Paginação por cursor (keyset): cada página custa o mesmo que a primeira.
+
+    ``keys`` é uma lista de pares (coluna, descendente) que define a ordenação;
+    a última chave deve ser única (normalmente o id) para desempatar.
+    """
+
+    def __init__(self, query, keys, cursor=None, per_page=10, total=None, approximate=False):
+        self.keys = keys
+        self.per_page = per_page
+        self.total = total
+        self.approximate = approximate
+
+        decoded = decode_cursor(cursor, len(keys)) if cursor else None
+        direction = decoded[1] if decoded else 'next'
+        # Para recuar, invertemos a ordenação e revertemos o resultado no fim
+        effective = [(column, descending != (direction == 'prev')) for column, descending in keys]
+
+        query = query.order_by(None).order_by(*[_order_clause(c, d) for c, d in effective])
+        if decoded:
+            query = query.filter(_keyset_filter(effective, decoded[0]))
+        rows = query.limit(per_page + 1).all()
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if direction == 'prev':
+            rows.reverse()
+            self.has_prev, self.has_next = has_more, True
+        else:
+            self.has_prev, self.has_next = decoded is not None, has_more
+        self.items = rows
+
+    def _values(self, item):
+        return [getattr(item, column.key) for column, _ in self.keys]
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(self._values(self.items[-1]), 'next')
+
+    @property
+    def prev_cursor(self):
+        if not self.has_prev or not self.items:
+            return None
+        return encode_cursor(self._values(self.items[0]), 'prev')
+
+
+def _total(query, keys, filtered):
+    """Calcula o total segundo PAGINATION_TOTAL (ou ?total=): 'exact', 'approx' ou 'none'."""
+    mode = request.args.get('total') or current_app.config.get('PAGINATION_TOTAL', 'approx')
+    if mode == 'exact':
+        return query.order_by(None).count(), False
+    if mode == 'approx' and not filtered:
+        # max(id) usa o índice da chave primária; sobrestima se houver registos apagados
+        id_column = keys[-1][0]
+        return db.session.query(func.max(id_column)).scalar() or 0, True
+    return None, False
+
+
+def paginate(query, keys, per_page, filtered=False):
+    """Pagina a query com o modo configurado em PAGINATION_MODE.
+
+    Em modo 'keyset' usa o parâmetro ?cursor=; um pedido com ?page= explícito
+    continua a usar a paginação por OFFSET do Flask-SQLAlchemy.
+    """
+    if current_app.config.get('PAGINATION_MODE') == 'keyset' and 'page' not in request.args:
+        total, approximate = _total(query, keys, filtered)
+        return KeysetPagination(query, keys, request.args.get('cursor'), per_page,
+                                total=total, approximate=approximate)
+    page = request.args.get('page', 1, type=int)
+    return query.order_by(*[_order_clause(c, d) for c, d in keys]).paginate(page=page, per_page=per_page)
@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sgpe import db, bcrypt
+
+# Verificação de senhas fora das threads do servidor.
+#
+# O bcrypt é propositadamente lento e liberta o GIL enquanto calcula o hash.
+# Todas as verificações passam por um pool com PASSWORD_HASH_WORKERS threads; no
+# máximo PASSWORD_HASH_QUEUE pedidos ficam em espera e, se a fila estiver cheia
+# durante PASSWORD_HASH_TIMEOUT segundos, o login é recusado (PasswordPoolBusy)
+# em vez de acumular threads bloqueadas. O custo alvo é BCRYPT_LOG_ROUNDS; um
+# hash com outro custo é recalculado no primeiro login bem sucedido.
+
+
+class PasswordPoolBusy(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, workers, queue, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sgpe-bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordPoolBusy('Demasiados pedidos de autenticação em simultâneo.')
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def check(self, password_hash, password):
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+    def generate(self, password, rounds):
+        return self._run(bcrypt.generate_password_hash, password, rounds).decode('utf-8')
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def init_passwords(app):
+    app.extensions['sgpe_passwords'] = PasswordHasher(app.config['PASSWORD_HASH_WORKERS'],
+                                                      app.config['PASSWORD_HASH_QUEUE'],
+                                                      app.config['PASSWORD_HASH_TIMEOUT'])
+
+
+def get_hasher():
+    return current_app.extensions['sgpe_passwords']
+
+
+def hash_cost(password_hash):
+    """Custo (log2 das rondas) de um hash bcrypt, ex: '$2b$12$...' -> 12."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def authenticate(user, password):
+    """Verifica a senha de ``user`` no pool e atualiza o hash se o custo mudou.
+
+    Retorna True se a senha estiver correta. Pode lançar PasswordPoolBusy.
+    """
+    if user is None or not user.password_hash:
+        return False
+    hasher = get_hasher()
+    if not hasher.check(user.password_hash, password):
+        return False
+    rounds = current_app.config['BCRYPT_LOG_ROUNDS']
+    if hash_cost(user.password_hash) != rounds:
+        user.password_hash = hasher.generate(password, rounds)
+        db.session.commit()
+    return True
+
+
+def benchmark(costs, seconds=2.0, concurrency=None):
+    """Mede logins (verificações) por segundo para cada custo, através do pool.
+
+    Retorna uma lista de (custo, logins por segundo, latência média em ms).
+    """
+    hasher = get_hasher()
+    concurrency = concurrency or current_app.config['PASSWORD_HASH_WORKERS']
+    results = []
+    for cost in costs:
+        password_hash = hasher.generate('benchmark', cost)
+        count, latency = 0, 0.0
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker():
+            nonlocal count, latency
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                hasher.check(password_hash, 'benchmark')
+                with lock:
+                    count += 1
+                    latency += time.perf_counter() - started
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        results.append((cost, count / elapsed, 1000 * latency / count if count else 0.0))
+    return results
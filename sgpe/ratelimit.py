@@ -0,0 +1,177 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+# Limitação de pedidos por cliente com "token buckets".
+#
+# Cada política (decorador rate_limit) tem um balde por cliente com capacidade
+# ``burst`` fichas, reposto continuamente ao ritmo ``rate``. Cada pedido gasta
+# uma ficha; sem fichas, a resposta é 429 com o cabeçalho Retry-After.
+#
+# Backends (RATELIMIT_STORAGE):
+#   'memory'              baldes no processo (LRU com RATELIMIT_MAX_BUCKETS entradas)
+#   'sqlite:///caminho'   ficheiro SQLite partilhado pelos vários processos
+#
+# Os clientes anónimos são identificados por request.remote_addr; atrás de um
+# proxy é preciso PROXY_FIX_X_FOR para que seja o endereço real do cliente.
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'10/minute' -> (10, 60)."""
+    count, _, period = rate.partition('/')
+    try:
+        return int(count), PERIODS[period.strip()]
+    except (ValueError, KeyError):
+        raise ValueError(f'Limite inválido: {rate!r} (ex: "10/minute")') from None
+
+
+def _refill(tokens, updated, now, capacity, per_second):
+    return min(capacity, tokens + (now - updated) * per_second)
+
+
+def _consume(tokens, per_second):
+    """Retorna (fichas restantes, segundos a esperar); espera 0 significa permitido."""
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / per_second
+
+
+class MemoryBackend:
+    """Baldes em memória; operações O(1) e no máximo ``max_buckets`` baldes.
+
+    Quando o limite é atingido, o balde usado há mais tempo é descartado (o que
+    equivale a devolvê-lo cheio a esse cliente).
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_buckets):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()  # chave -> (fichas, instante)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, per_second, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens, wait = _consume(_refill(tokens, updated, now, capacity, per_second), per_second)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBackend:
+    """Baldes num ficheiro SQLite, para que vários processos partilhem os limites.
+
+    Cada pedido é uma transação BEGIN IMMEDIATE sobre uma linha. A coluna
+    ``full_at`` indica quando o balde volta a estar cheio; a partir daí a linha
+    é equivalente a não existir e é apagada periodicamente.
+    """
+
+    name = 'sqlite'
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        connection = self._connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS ratelimit_bucket ('
+                           'key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                           'updated REAL NOT NULL, full_at REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_ratelimit_bucket_full_at ON ratelimit_bucket (full_at)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, per_second, now=None):
+        now = time.time() if now is None else now
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM ratelimit_bucket WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, capacity, per_second) if row else capacity
+            tokens, wait = _consume(tokens, per_second)
+            full_at = now + (capacity - tokens) / per_second
+            connection.execute('INSERT OR REPLACE INTO ratelimit_bucket (key, tokens, updated, full_at) '
+                               'VALUES (?, ?, ?, ?)', (key, tokens, now, full_at))
+            self._calls += 1
+            if self._calls % self.CLEANUP_EVERY == 0:
+                connection.execute('DELETE FROM ratelimit_bucket WHERE full_at <= ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+
+def init_ratelimit(app):
+    storage = app.config['RATELIMIT_STORAGE']
+    if storage.startswith('sqlite:///'):
+        backend = SQLiteBackend(storage[len('sqlite:///'):])
+    elif storage == 'memory':
+        backend = MemoryBackend(app.config['RATELIMIT_MAX_BUCKETS'])
+    else:
+        raise ValueError(f'RATELIMIT_STORAGE desconhecido: {storage}')
+    app.extensions['sgpe_ratelimit'] = backend
+
+
+def get_backend():
+    return current_app.extensions['sgpe_ratelimit']
+
+
+def _client_key(key):
+    if key == 'user' and current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{request.remote_addr}'
+
+
+def _too_many_requests(retry_after):
+    message = 'Demasiados pedidos. Tente novamente mais tarde.'
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': message, 'retry_after': retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    raise TooManyRequests(message, retry_after=retry_after)
+
+
+def rate_limit(rate, burst=None, key='ip', methods=None):
+    """Limita a vista a ``rate`` pedidos (ex: '10/minute') por cliente.
+
+    ``burst``: número de pedidos seguidos permitidos (por omissão, o do rate).
+    ``key``: 'ip', ou 'user' (o utilizador autenticado; o IP para anónimos).
+    ``methods``: métodos HTTP sujeitos ao limite (por omissão, todos).
+    """
+    count, period = parse_rate(rate)
+    capacity = burst or count
+    per_second = count / period
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if current_app.config['RATELIMIT_ENABLED'] and (methods is None or request.method in methods):
+                bucket = f'{request.endpoint}|{_client_key(key)}'
+                wait = get_backend().take(bucket, capacity, per_second)
+                if wait:
+                    return _too_many_requests(math.ceil(wait))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
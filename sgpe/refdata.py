@@ -0,0 +1,112 @@
+import time
+from collections import namedtuple
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sgpe import db
+from sgpe.models import Supplier, ContractType, ProjectType, RefDataVersion
+
+# Cache, em cada processo, das tabelas de referência usadas nos formulários.
+#
+# Cada tabela tem uma versão na tabela ref_data_version, incrementada na mesma
+# transação de qualquer escrita feita pelo ORM. Uma leitura compara a versão
+# guardada com a da base de dados (uma query por pedido, para todas as tabelas)
+# e só recarrega a tabela se mudou, ou se a entrada tiver mais de
+# REFDATA_CACHE_TTL segundos. Assim os vários processos do servidor detetam as
+# alterações feitas pelos outros.
+
+RefItem = namedtuple('RefItem', 'id name')
+
+REFERENCE_MODELS = {
+    'supplier': Supplier,
+    'contract_type': ContractType,
+    'project_type': ProjectType,
+}
+
+versions_table = RefDataVersion.__table__
+
+
+class _Entry:
+    def __init__(self, version, items):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.items = items
+        self.by_id = {item.id: item for item in items}
+
+
+def init_refdata(app):
+    app.extensions['sgpe_refdata'] = {}
+
+
+def _cache():
+    return current_app.extensions['sgpe_refdata']
+
+
+def _versions():
+    """Versões atuais de todas as tabelas, lidas uma vez por pedido."""
+    if '_refdata_versions' not in g:
+        g._refdata_versions = dict(db.session.execute(
+            db.select(versions_table.c.name, versions_table.c.version)
+        ).all())
+    return g._refdata_versions
+
+
+def _entry(name):
+    model = REFERENCE_MODELS[name]
+    version = _versions().get(name, 0)
+    entry = _cache().get(name)
+    if (entry is None or entry.version != version
+            or time.monotonic() - entry.loaded_at > current_app.config['REFDATA_CACHE_TTL']):
+        rows = db.session.execute(db.select(model.id, model.name).order_by(model.name, model.id))
+        entry = _cache()[name] = _Entry(version, tuple(RefItem(id_, item_name) for id_, item_name in rows))
+    return entry
+
+
+def get_items(name):
+    """Tuplo de RefItem(id, name) da tabela, ordenado pelo nome."""
+    return _entry(name).items
+
+
+def get_item(name, id_):
+    """RefItem com o id indicado, ou None se não existir."""
+    return _entry(name).by_id.get(id_)
+
+
+def get_version(name):
+    """Versão atual de ``name`` (0 se nunca foi alterada), lida uma vez por pedido."""
+    return _versions().get(name, 0)
+
+
+def _forget(name):
+    if has_app_context():
+        _cache().pop(name, None)
+        g.pop('_refdata_versions', None)
+
+
+def bump_version(connection, name):
+    """Incrementa a versão de uma tabela na transação de ``connection``."""
+    result = connection.execute(
+        versions_table.update()
+        .where(versions_table.c.name == name)
+        .values(version=versions_table.c.version + 1)
+    )
+    if not result.rowcount:
+        connection.execute(versions_table.insert().values(name=name, version=1))
+    _forget(name)
+
+
+def invalidate(name):
+    """Invalidação explícita, para escritas que não passam pelo ORM (ex: INSERT em lote)."""
+    bump_version(db.session.connection(), name)
+    db.session.commit()
+
+
+def _register(name, model):
+    def changed(mapper, connection, target):
+        bump_version(connection, name)
+
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, event_name, changed)
+
+
+for _name, _model in REFERENCE_MODELS.items():
+    _register(_name, _model)
@@ -0,0 +1,79 @@
+from sqlalchemy import func, inspect, select
+from sgpe import db
+
+# Atualização do esquema de bases de dados já existentes.
+#
+# db.create_all() só cria as tabelas que não existem; não acrescenta colunas
+# nem índices a tabelas antigas. upgrade_schema() compara os modelos com a base
+# de dados e cria o que falta (tabelas, colunas e índices). É idempotente: pode
+# ser executado em cada deploy com 'flask upgrade-db'.
+#
+# As colunas derivadas (ver models.key_column) são preenchidas a partir da
+# coluna de origem antes de se criarem os respetivos índices únicos.
+
+
+class SchemaUpgradeError(Exception):
+    pass
+
+
+def _add_column(connection, table, column):
+    # O SQLite não aceita ADD COLUMN com NOT NULL sem valor por omissão: a
+    # coluna é criada sem a restrição e preenchida de seguida
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+
+
+def _fill_derived(connection, table, column):
+    """Calcula a coluna derivada nas linhas em que ainda está vazia. Retorna o número de linhas."""
+    source = table.c[column.info['source']]
+    normalize = column.info['normalize']
+    rows = connection.execute(select(table.c.id, source).where(column.is_(None))).all()
+    if rows:
+        connection.execute(
+            table.update().where(table.c.id == db.bindparam('row_id')).values({column.name: db.bindparam('key')}),
+            [{'row_id': id_, 'key': normalize(value)} for id_, value in rows]
+        )
+    return len(rows)
+
+
+def _check_unique(connection, table, index):
+    columns = list(index.columns)
+    duplicates = connection.execute(
+        select(*columns).group_by(*columns).having(func.count() > 1).limit(5)
+    ).all()
+    if duplicates:
+        values = ', '.join(repr(row[0] if len(row) == 1 else tuple(row)) for row in duplicates)
+        raise SchemaUpgradeError(
+            f'Não é possível criar o índice único {index.name}: valores repetidos em '
+            f'{table.name} ({values}). Corrija os registos duplicados e repita.'
+        )
+
+
+def upgrade_schema():
+    """Cria as tabelas, colunas e índices em falta. Retorna a lista de alterações feitas."""
+    changes = []
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                table.create(connection)
+                changes.append(f'tabela {table.name}')
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    _add_column(connection, table, column)
+                    changes.append(f'coluna {column.name} em {table.name}')
+                if 'source' in column.info:
+                    filled = _fill_derived(connection, table, column)
+                    if filled:
+                        changes.append(f'{filled} valores de {column.name} em {table.name}')
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name not in existing_indexes:
+                    if index.unique:
+                        _check_unique(connection, table, index)
+                    index.create(connection)
+                    changes.append(f'índice {index.name} em {table.name}')
+    return changes
@@ -0,0 +1,438 @@
+import re
+import sqlite3
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from flask import current_app, has_app_context
+from sqlalchemy import event, text, true
+from sqlalchemy.orm import Session
+from sgpe import db
+from sgpe.models import Project, Contract, Supplier, ContractType
+
+# Cada documento indexado é identificado por um rowid que codifica o tipo e o id:
+# rowid = id * KIND_SLOTS + código do tipo. Assim, remover ou substituir um
+# documento é uma operação pela chave primária do índice.
+KIND_SLOTS = 4
+KINDS = {'project': 1, 'contract': 2, 'supplier': 3}
+KIND_NAMES = {code: kind for kind, code in KINDS.items()}
+
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts5_available():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE t USING fts5(x)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+FTS5_AVAILABLE = _fts5_available()
+
+
+def make_rowid(kind, ref_id):
+    return ref_id * KIND_SLOTS + KINDS[kind]
+
+
+def split_rowid(rowid):
+    return KIND_NAMES[rowid % KIND_SLOTS], rowid // KIND_SLOTS
+
+
+def normalize(value):
+    """Converte para minúsculas e remove acentos (ex: 'Chókwè' -> 'chokwe')."""
+    decomposed = unicodedata.normalize('NFKD', value.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(value):
+    return _WORD_RE.findall(normalize(value or ''))
+
+
+def _join(*parts):
+    return ' '.join(p for p in parts if p)
+
+
+# ----- Construção dos documentos a partir das tabelas (Core, sem ORM) -----
+
+def _project_documents(connection, ids=None):
+    t = Project.__table__
+    query = db.select(t.c.id, t.c.name, t.c.description, t.c.location_province,
+                      t.c.location_district, t.c.location_admin_post)
+    if ids is not None:
+        query = query.where(t.c.id.in_(ids))
+    for row in connection.execute(query):
+        yield (make_rowid('project', row.id), row.name,
+               _join(row.description, row.location_province, row.location_district, row.location_admin_post))
+
+
+def _contract_documents(connection, ids=None):
+    c, s, ct = Contract.__table__, Supplier.__table__, ContractType.__table__
+    query = (db.select(c.c.id, c.c.contract_number, s.c.name.label('supplier_name'),
+                       s.c.contact_person, ct.c.name.label('type_name'))
+             .select_from(c.join(s, c.c.supplier_id == s.c.id).join(ct, c.c.contract_type_id == ct.c.id)))
+    if ids is not None:
+        query = query.where(c.c.id.in_(ids))
+    for row in connection.execute(query):
+        yield (make_rowid('contract', row.id), row.contract_number,
+               _join(row.supplier_name, row.contact_person, row.type_name))
+
+
+def _supplier_documents(connection, ids=None):
+    t = Supplier.__table__
+    query = db.select(t.c.id, t.c.name, t.c.contact_person)
+    if ids is not None:
+        query = query.where(t.c.id.in_(ids))
+    for row in connection.execute(query):
+        yield make_rowid('supplier', row.id), row.name, _join(row.contact_person)
+
+
+DOCUMENT_BUILDERS = {
+    'project': _project_documents,
+    'contract': _contract_documents,
+    'supplier': _supplier_documents,
+}
+
+
+def _all_documents(connection):
+    for builder in DOCUMENT_BUILDERS.values():
+        yield from builder(connection)
+
+
+# ----- Backends -----
+
+class FTS5Backend:
+    """Índice numa tabela virtual FTS5, atualizado na mesma transação dos dados."""
+
+    name = 'fts5'
+    table = 'search_index'
+
+    def __init__(self):
+        self._exists = False
+
+    def exists(self, connection):
+        if not self._exists:
+            self._exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': self.table}
+            ).first() is not None
+        return self._exists
+
+    def ensure(self, connection):
+        """Cria e popula o índice se ainda não existir."""
+        if self.exists(connection):
+            return
+        # IF NOT EXISTS: outro processo pode tê-lo criado entretanto (a escrita abaixo substitui as linhas)
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            f"title, body, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        self._write(connection, _all_documents(connection))
+        self._exists = True
+
+    def _ensure_for_read(self):
+        # Na primeira leitura de uma base de dados sem índice, constrói-o e grava-o
+        # numa transação própria: a sessão do pedido (e o que tiver pendente) não
+        # é confirmada por uma leitura
+        if self.exists(db.session.connection()):
+            return
+        try:
+            with db.engine.begin() as connection:
+                self.ensure(connection)
+        except Exception:
+            self._exists = False
+            raise
+
+    def _write(self, connection, documents):
+        rows = [{'rowid': rowid, 'title': title, 'body': body} for rowid, title, body in documents]
+        if rows:
+            connection.execute(text(f"DELETE FROM {self.table} WHERE rowid = :rowid"), rows)
+            connection.execute(
+                text(f"INSERT INTO {self.table} (rowid, title, body) VALUES (:rowid, :title, :body)"), rows
+            )
+
+    def index(self, connection, documents):
+        # Enquanto o índice não existir não há nada a manter: será construído na primeira leitura
+        if self.exists(connection):
+            self._write(connection, documents)
+
+    def remove(self, connection, rowids):
+        if self.exists(connection):
+            connection.execute(text(f"DELETE FROM {self.table} WHERE rowid = :rowid"),
+                               [{'rowid': rowid} for rowid in rowids])
+
+    def drop(self, connection):
+        connection.execute(text(f"DROP TABLE IF EXISTS {self.table}"))
+        self._exists = False
+
+    def rebuild(self, connection):
+        self.drop(connection)
+        self.ensure(connection)
+
+    @staticmethod
+    def _match_expression(query):
+        # Cada palavra é tratada como prefixo; as aspas evitam a sintaxe de consulta do FTS5
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, query, kinds=None, limit=50):
+        match = self._match_expression(query)
+        if not match:
+            return []
+        self._ensure_for_read()
+        connection = db.session.connection()
+        sql = (f"SELECT rowid, bm25({self.table}, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score "
+               f"FROM {self.table} WHERE {self.table} MATCH :match")
+        params = {'match': match, 'limit': limit}
+        if kinds:
+            codes = ', '.join(str(KINDS[kind]) for kind in kinds)
+            sql += f" AND rowid % {KIND_SLOTS} IN ({codes})"
+        sql += " ORDER BY score LIMIT :limit"
+        # bm25 devolve valores negativos: quanto menor, mais relevante
+        return [(*split_rowid(rowid), -score) for rowid, score in connection.execute(text(sql), params)]
+
+    def filter_clause(self, kind, id_column, query):
+        match = self._match_expression(query)
+        if not match:
+            return None
+        self._ensure_for_read()
+        subquery = text(
+            f"SELECT rowid / {KIND_SLOTS} AS ref_id FROM {self.table} "
+            f"WHERE {self.table} MATCH :match AND rowid % {KIND_SLOTS} = {KINDS[kind]}"
+        ).bindparams(match=match).columns(db.column('ref_id', db.Integer))
+        return id_column.in_(subquery)
+
+
+class InvertedIndexBackend:
+    """Índice invertido em memória, usado quando o FTS5 não está disponível.
+
+    O índice é construído a partir da base de dados na primeira utilização e é
+    mantido pelos mesmos eventos que o FTS5, mas é local a cada processo. Como
+    não participa na transação, as alterações só são aplicadas depois do commit
+    da sessão e são descartadas num rollback.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ready = False
+        self._postings = defaultdict(dict)  # token -> {rowid: peso}
+        self._doc_tokens = {}  # rowid -> tokens do documento
+        self._vocabulary = []  # tokens ordenados, para pesquisa por prefixo
+
+    def ensure(self, connection):
+        with self._lock:
+            if not self._ready:
+                self._ready = True
+                self._write(_all_documents(connection))
+
+    def _add(self, rowid, title, body):
+        weights = defaultdict(float)
+        for token in tokenize(title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(body):
+            weights[token] += BODY_WEIGHT
+        for token, weight in weights.items():
+            if token not in self._postings:
+                insort(self._vocabulary, token)
+            self._postings[token][rowid] = weight
+        self._doc_tokens[rowid] = tuple(weights)
+
+    def _discard(self, rowid):
+        for token in self._doc_tokens.pop(rowid, ()):
+            postings = self._postings[token]
+            postings.pop(rowid, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+
+    def _write(self, documents):
+        for rowid, title, body in documents:
+            self._discard(rowid)
+            self._add(rowid, title, body)
+
+    def index(self, connection, documents):
+        documents = list(documents)
+
+        def apply():
+            with self._lock:
+                if self._ready:
+                    self._write(documents)
+        _after_commit(apply)
+
+    def remove(self, connection, rowids):
+        rowids = list(rowids)
+
+        def apply():
+            with self._lock:
+                for rowid in rowids:
+                    self._discard(rowid)
+        _after_commit(apply)
+
+    def drop(self, connection):
+        with self._lock:
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._vocabulary.clear()
+            self._ready = False
+
+    def rebuild(self, connection):
+        with self._lock:
+            self.drop(connection)
+            self.ensure(connection)
+
+    def _prefix_scores(self, prefix):
+        scores = defaultdict(float)
+        i = bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            for rowid, weight in self._postings[self._vocabulary[i]].items():
+                scores[rowid] += weight
+            i += 1
+        return scores
+
+    def _matches(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        if not self._ready:
+            # Lido numa ligação própria: só os dados confirmados entram no índice
+            with db.engine.connect() as connection:
+                self.ensure(connection)
+        with self._lock:
+            result = None
+            for token in tokens:
+                scores = self._prefix_scores(token)
+                if result is None:
+                    result = scores
+                else:
+                    result = {rowid: result[rowid] + score for rowid, score in scores.items() if rowid in result}
+                if not result:
+                    break
+            return result or {}
+
+    def search(self, query, kinds=None, limit=50):
+        matches = self._matches(query) or {}
+        codes = {KINDS[kind] for kind in kinds} if kinds else None
+        ranked = sorted(
+            ((score, rowid) for rowid, score in matches.items() if codes is None or rowid % KIND_SLOTS in codes),
+            key=lambda item: (-item[0], item[1])
+        )
+        return [(*split_rowid(rowid), score) for score, rowid in ranked[:limit]]
+
+    def filter_clause(self, kind, id_column, query):
+        matches = self._matches(query)
+        if matches is None:
+            return None
+        code = KINDS[kind]
+        return id_column.in_([rowid // KIND_SLOTS for rowid in matches if rowid % KIND_SLOTS == code])
+
+
+def init_search(app):
+    """Escolhe o backend de pesquisa (SEARCH_BACKEND: 'auto', 'fts5' ou 'memory')."""
+    choice = app.config.get('SEARCH_BACKEND', 'auto')
+    is_sqlite = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+    if choice == 'fts5' or (choice == 'auto' and is_sqlite and FTS5_AVAILABLE):
+        backend = FTS5Backend()
+    else:
+        backend = InvertedIndexBackend()
+    app.extensions['sgpe_search'] = backend
+
+
+def get_backend():
+    return current_app.extensions['sgpe_search']
+
+
+def search(query, kinds=None, limit=50):
+    """Pesquisa ordenada por relevância. Retorna uma lista de (tipo, id, pontuação)."""
+    return get_backend().search(query, kinds=kinds, limit=limit)
+
+
+def search_filter(kind, id_column, query):
+    """Condição SQL que restringe id_column aos documentos do tipo que correspondem à pesquisa.
+
+    Uma pesquisa sem palavras não restringe nada.
+    """
+    clause = get_backend().filter_clause(kind, id_column, query)
+    return true() if clause is None else clause
+
+
+def rebuild_search_index():
+    """Reconstrói o índice de pesquisa a partir das tabelas de origem."""
+    get_backend().rebuild(db.session.connection())
+    db.session.commit()
+
+
+def index_documents(kind, ids):
+    """Indexa os documentos indicados; usado após inserções em lote, que não disparam eventos do ORM."""
+    _reindex(db.session.connection(), kind, ids)
+
+
+# ----- Sincronização através dos eventos dos modelos -----
+
+# Alterações ao índice em memória pendentes na transação da sessão, em Session.info
+_PENDING_KEY = 'sgpe_search_pending'
+
+
+def _after_commit(apply):
+    db.session.info.setdefault(_PENDING_KEY, []).append(apply)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    for apply in session.info.pop(_PENDING_KEY, ()):
+        apply()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+@event.listens_for(db.metadata, 'after_drop')
+def _drop_search_index(target, connection, **kw):
+    # db.drop_all() não conhece a tabela virtual; apagamo-la para não ficar com dados antigos
+    if has_app_context() and 'sgpe_search' in current_app.extensions:
+        get_backend().drop(connection)
+
+
+def _reindex(connection, kind, ids):
+    get_backend().index(connection, DOCUMENT_BUILDERS[kind](connection, ids))
+
+
+def _contract_ids(connection, column, value):
+    return [row[0] for row in connection.execute(
+        db.select(Contract.__table__.c.id).where(column == value)
+    )]
+
+
+def _register(model, kind):
+    @event.listens_for(model, 'after_insert')
+    @event.listens_for(model, 'after_update')
+    def _document_changed(mapper, connection, target):
+        _reindex(connection, kind, [target.id])
+
+    @event.listens_for(model, 'after_delete')
+    def _document_deleted(mapper, connection, target):
+        get_backend().remove(connection, [make_rowid(kind, target.id)])
+
+
+_register(Project, 'project')
+_register(Contract, 'contract')
+_register(Supplier, 'supplier')
+
+
+# O texto dos contratos inclui o nome do fornecedor e do tipo de contrato
+@event.listens_for(Supplier, 'after_update')
+def _supplier_updated(mapper, connection, target):
+    ids = _contract_ids(connection, Contract.__table__.c.supplier_id, target.id)
+    if ids:
+        _reindex(connection, 'contract', ids)
+
+
+@event.listens_for(ContractType, 'after_update')
+def _contract_type_updated(mapper, connection, target):
+    ids = _contract_ids(connection, Contract.__table__.c.contract_type_id, target.id)
+    if ids:
+        _reindex(connection, 'contract', ids)
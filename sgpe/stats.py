@@ -0,0 +1,253 @@
+from sqlalchemy import event, func, inspect
+from sgpe import db
+from sgpe.models import Project, Contract, DashboardStat, SpendRollup
+
+# Chaves usadas na tabela dashboard_stat
+PROJECTS_KEY = 'projects'
+CONTRACTS_KEY = 'contracts'
+PROVINCE_PREFIX = 'province:'
+
+stats_table = DashboardStat.__table__
+spend_table = SpendRollup.__table__
+
+# Dimensões do cubo de despesa (nome usado na API -> coluna)
+SPEND_DIMENSIONS = {
+    'supplier': spend_table.c.supplier_id,
+    'contract_type': spend_table.c.contract_type_id,
+    'year': spend_table.c.year,
+}
+# Ano usado no cubo para contratos sem data de início
+UNDATED_YEAR = 0
+
+
+def _province_key(province):
+    return PROVINCE_PREFIX + province
+
+
+def _old_value(target, attr):
+    """Retorna o valor que estava na base de dados antes da alteração atual."""
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+
+def _is_built(connection):
+    return connection.execute(
+        db.select(stats_table.c.key).where(stats_table.c.key == PROJECTS_KEY)
+    ).first() is not None
+
+
+def _bump(connection, key, count_delta=0, total_delta=0):
+    """Aplica um incremento a um contador, na mesma transação do flush.
+
+    Se o snapshot ainda não foi construído (não existe a linha de projetos),
+    nada é feito: a primeira leitura irá reconstruí-lo a partir das tabelas.
+    """
+    result = connection.execute(
+        stats_table.update()
+        .where(stats_table.c.key == key)
+        .values(count=stats_table.c.count + count_delta,
+                total=stats_table.c.total + total_delta)
+    )
+    if result.rowcount:
+        return
+    if _is_built(connection):
+        connection.execute(stats_table.insert().values(key=key, count=count_delta, total=total_delta))
+
+
+@event.listens_for(spend_table, 'after_create')
+def _spend_table_created(target, connection, **kw):
+    # Numa base de dados existente (flask upgrade-db) o cubo nasce vazio: apaga
+    # o snapshot para que a próxima leitura reconstrua contadores e cubo juntos
+    if inspect(connection).has_table(stats_table.name):
+        connection.execute(stats_table.delete())
+
+
+def _spend_bucket(supplier_id, contract_type_id, start_date):
+    return supplier_id, contract_type_id, start_date.year if start_date else UNDATED_YEAR
+
+
+def _bump_spend(connection, bucket, count_delta, total_delta):
+    """Aplica um incremento a uma célula do cubo de despesa; as células vazias são removidas.
+
+    Tal como nos contadores, nada é feito enquanto o snapshot não estiver construído.
+    """
+    supplier_id, contract_type_id, year = bucket
+    cell = ((spend_table.c.supplier_id == supplier_id) & (spend_table.c.contract_type_id == contract_type_id)
+            & (spend_table.c.year == year))
+    result = connection.execute(
+        spend_table.update().where(cell)
+        .values(count=spend_table.c.count + count_delta, total=spend_table.c.total + total_delta)
+    )
+    if result.rowcount:
+        if count_delta < 0:
+            connection.execute(spend_table.delete().where(cell & (spend_table.c.count <= 0)))
+    elif count_delta > 0 and _is_built(connection):
+        connection.execute(spend_table.insert().values(
+            supplier_id=supplier_id, contract_type_id=contract_type_id, year=year,
+            count=count_delta, total=total_delta
+        ))
+
+
+def _old_spend_bucket(target):
+    return _spend_bucket(_old_value(target, 'supplier_id'), _old_value(target, 'contract_type_id'),
+                         _old_value(target, 'start_date'))
+
+
+def _new_spend_bucket(target):
+    return _spend_bucket(target.supplier_id, target.contract_type_id, target.start_date)
+
+
+# active_history garante que o valor antigo é carregado antes de ser substituído,
+# mesmo que o atributo esteja expirado (ex: após um commit).
+@event.listens_for(Project.location_province, 'set', active_history=True)
+@event.listens_for(Contract.contract_value, 'set', active_history=True)
+@event.listens_for(Contract.supplier_id, 'set', active_history=True)
+@event.listens_for(Contract.contract_type_id, 'set', active_history=True)
+@event.listens_for(Contract.start_date, 'set', active_history=True)
+def _track_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+@event.listens_for(Project, 'after_insert')
+def _project_inserted(mapper, connection, target):
+    _bump(connection, PROJECTS_KEY, 1)
+    _bump(connection, _province_key(target.location_province), 1)
+
+
+@event.listens_for(Project, 'after_update')
+def _project_updated(mapper, connection, target):
+    old_province = _old_value(target, 'location_province')
+    if old_province != target.location_province:
+        _bump(connection, _province_key(old_province), -1)
+        _bump(connection, _province_key(target.location_province), 1)
+
+
+@event.listens_for(Project, 'after_delete')
+def _project_deleted(mapper, connection, target):
+    _bump(connection, PROJECTS_KEY, -1)
+    _bump(connection, _province_key(_old_value(target, 'location_province')), -1)
+
+
+@event.listens_for(Contract, 'after_insert')
+def _contract_inserted(mapper, connection, target):
+    _bump(connection, CONTRACTS_KEY, 1, target.contract_value or 0)
+    _bump_spend(connection, _new_spend_bucket(target), 1, target.contract_value or 0)
+
+
+@event.listens_for(Contract, 'after_update')
+def _contract_updated(mapper, connection, target):
+    old_value = _old_value(target, 'contract_value') or 0
+    new_value = target.contract_value or 0
+    if old_value != new_value:
+        _bump(connection, CONTRACTS_KEY, 0, new_value - old_value)
+    # Mudança de fornecedor, tipo ou ano: o contrato passa de uma célula do cubo para outra
+    old_bucket, new_bucket = _old_spend_bucket(target), _new_spend_bucket(target)
+    if old_bucket != new_bucket:
+        _bump_spend(connection, old_bucket, -1, -old_value)
+        _bump_spend(connection, new_bucket, 1, new_value)
+    elif old_value != new_value:
+        _bump_spend(connection, new_bucket, 0, new_value - old_value)
+
+
+@event.listens_for(Contract, 'after_delete')
+def _contract_deleted(mapper, connection, target):
+    old_value = _old_value(target, 'contract_value') or 0
+    _bump(connection, CONTRACTS_KEY, -1, -old_value)
+    _bump_spend(connection, _old_spend_bucket(target), -1, -old_value)
+
+
+def rebuild_dashboard_stats():
+    """Recalcula todos os contadores do dashboard e o cubo de despesa a partir das tabelas de origem.
+
+    Necessário após operações em massa (ex: query.delete()) que não disparam
+    os eventos do ORM, ou para inicializar uma base de dados existente.
+    """
+    total_projects = db.session.query(func.count(Project.id)).scalar()
+    total_contracts, total_value = db.session.query(
+        func.count(Contract.id), func.coalesce(func.sum(Contract.contract_value), 0)
+    ).one()
+    by_province = db.session.query(
+        Project.location_province, func.count(Project.id)
+    ).group_by(Project.location_province).all()
+
+    rows = [
+        {'key': PROJECTS_KEY, 'count': total_projects, 'total': 0},
+        {'key': CONTRACTS_KEY, 'count': total_contracts, 'total': total_value},
+    ]
+    rows.extend({'key': _province_key(province), 'count': count, 'total': 0}
+                for province, count in by_province)
+
+    year = func.coalesce(func.extract('year', Contract.start_date), UNDATED_YEAR)
+    spend = db.session.execute(
+        db.select(Contract.supplier_id, Contract.contract_type_id, year,
+                  func.count(Contract.id), func.coalesce(func.sum(Contract.contract_value), 0))
+        .group_by(Contract.supplier_id, Contract.contract_type_id, year)
+    ).all()
+
+    db.session.execute(stats_table.delete())
+    db.session.execute(stats_table.insert(), rows)
+    db.session.execute(spend_table.delete())
+    if spend:
+        db.session.execute(spend_table.insert(), [
+            {'supplier_id': supplier_id, 'contract_type_id': contract_type_id, 'year': year,
+             'count': count, 'total': total}
+            for supplier_id, contract_type_id, year, count, total in spend
+        ])
+    db.session.commit()
+
+
+def _read_stats():
+    # Leitura direta da tabela (sem identity map), pois os eventos atualizam-na via Core
+    rows = db.session.execute(db.select(stats_table.c.key, stats_table.c.count, stats_table.c.total))
+    return {key: (count, total) for key, count, total in rows}
+
+
+def get_dashboard_stats():
+    """Retorna os totais do dashboard lidos do snapshot pré-calculado."""
+    stats = _read_stats()
+    if PROJECTS_KEY not in stats:
+        rebuild_dashboard_stats()
+        stats = _read_stats()
+
+    provinces = sorted(
+        (key[len(PROVINCE_PREFIX):], count)
+        for key, (count, _) in stats.items()
+        if key.startswith(PROVINCE_PREFIX) and count > 0
+    )
+    total_contracts, total_contract_value = stats.get(CONTRACTS_KEY, (0, 0))
+    return {
+        'total_projects': stats[PROJECTS_KEY][0],
+        'total_contracts': total_contracts,
+        'total_contract_value': total_contract_value,
+        'province_labels': [province for province, _ in provinces],
+        'province_data': [count for _, count in provinces],
+    }
+
+
+def get_spend_rollup(group_by=('supplier', 'contract_type', 'year'), supplier_id=None,
+                     contract_type_id=None, year=None):
+    """Agrega o cubo de despesa pelas dimensões pedidas, com filtros opcionais.
+
+    Lê apenas a tabela spend_rollup (nunca a de contratos). Retorna uma lista de
+    dicionários com as dimensões de group_by, 'count' e 'total', por ordem das dimensões.
+    """
+    if not _is_built(db.session.connection()):
+        rebuild_dashboard_stats()
+    columns = [SPEND_DIMENSIONS[name] for name in group_by]
+    query = db.select(*columns, func.sum(spend_table.c.count), func.sum(spend_table.c.total))
+    for column, value in ((spend_table.c.supplier_id, supplier_id),
+                          (spend_table.c.contract_type_id, contract_type_id),
+                          (spend_table.c.year, year)):
+        if value is not None:
+            query = query.where(column == value)
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+    rows = []
+    for row in db.session.execute(query):
+        count, total = row[-2], row[-1]
+        if not count:
+            continue
+        rows.append(dict(zip(group_by, row[:-2]), count=count, total=total))
+    return rows
@@ -0,0 +1,162 @@
+import os
+import secrets
+from datetime import datetime, timedelta
+from flask import current_app
+from sgpe import db, documents
+from sgpe.models import UploadSession
+
+# Uploads de documentos em partes, retomáveis.
+#
+# 1. create()            cria a sessão (nome e tamanho total do ficheiro)
+# 2. write_chunk()       grava a parte n (de UPLOAD_CHUNK_SIZE bytes) na posição
+#                        n * UPLOAD_CHUNK_SIZE de um ficheiro temporário,
+#                        diretamente do corpo do pedido, sem o guardar em memória
+# 3. a sessão indica quantos bytes seguidos já foram recebidos (``received``);
+#    depois de uma falha, o cliente retoma a partir da parte received // chunk
+# 4. finalize()          move o ficheiro completo para o armazenamento de
+#                        documentos (sgpe.documents) e guarda a chave na sessão
+# 5. claim()             o formulário do contrato usa a chave e apaga a sessão
+
+PARTIAL_DIR = '.partial'
+COPY_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """Pedido inválido; ``status`` é o código HTTP a devolver."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _partial_path(upload_id):
+    return os.path.join(documents.upload_dir(), PARTIAL_DIR, upload_id)
+
+
+def chunk_size():
+    return current_app.config['UPLOAD_CHUNK_SIZE']
+
+
+def get_session(upload_id, user_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id:
+        raise UploadError('Sessão de upload não encontrada.', 404)
+    return upload
+
+
+def _expire_old_sessions():
+    """Remove as sessões com mais de UPLOAD_SESSION_TTL segundos.
+
+    Retorna as chaves dos documentos finalizados mas nunca associados a um
+    contrato, a libertar depois do commit.
+    """
+    limit = datetime.utcnow() - timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    orphans = []
+    for upload in UploadSession.query.filter(UploadSession.created_at < limit):
+        if os.path.exists(_partial_path(upload.id)):
+            os.remove(_partial_path(upload.id))
+        if upload.document_key:
+            orphans.append(upload.document_key)
+        db.session.delete(upload)
+    return orphans
+
+
+def create(user_id, filename, size, extensions):
+    """Cria uma sessão de upload e o ficheiro temporário (vazio) correspondente."""
+    if not filename or not isinstance(size, int) or size <= 0:
+        raise UploadError('São necessários o nome e o tamanho (em bytes) do ficheiro.')
+    if os.path.splitext(filename)[1].lower().lstrip('.') not in extensions:
+        raise UploadError('Apenas ficheiros PDF e imagens são permitidos!')
+    if size > current_app.config['UPLOAD_MAX_SIZE']:
+        raise UploadError('O ficheiro excede o tamanho máximo permitido.', 413)
+    orphans = _expire_old_sessions()
+    upload = UploadSession(id=secrets.token_hex(16), user_id=user_id,
+                           filename=os.path.basename(filename)[:200], size=size)
+    os.makedirs(os.path.dirname(_partial_path(upload.id)), exist_ok=True)
+    open(_partial_path(upload.id), 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    for key in orphans:
+        documents.release(key)
+    return upload
+
+
+def write_chunk(upload, index, stream, length):
+    """Grava a parte ``index`` lendo ``length`` bytes de ``stream``.
+
+    Só são aceites partes já recebidas (reenvio) ou a parte seguinte; uma parte
+    mais à frente devolve 409, para o cliente retomar a partir de ``received``.
+    """
+    if upload.document_key:
+        raise UploadError('O upload já foi finalizado.', 409)
+    size = chunk_size()
+    offset = index * size
+    expected = min(size, upload.size - offset)
+    if index < 0 or expected <= 0:
+        raise UploadError('Número de parte inválido.')
+    if offset > upload.received:
+        raise UploadError('Parte fora de ordem.', 409)
+    if length != expected:
+        raise UploadError(f'A parte {index} deve ter {expected} bytes.')
+
+    written = 0
+    with open(_partial_path(upload.id), 'r+b') as partial:
+        partial.seek(offset)
+        while written < length:
+            data = stream.read(min(COPY_SIZE, length - written))
+            if not data:
+                break
+            partial.write(data)
+            written += len(data)
+    if written != length:
+        # Ligação interrompida: a parte será reenviada
+        raise UploadError('Parte incompleta.', 400)
+    upload.received = max(upload.received, offset + length)
+    db.session.commit()
+    return upload
+
+
+def finalize(upload):
+    """Move o ficheiro completo para o armazenamento de documentos."""
+    if upload.document_key:
+        return upload
+    if upload.received != upload.size:
+        raise UploadError('O upload ainda não está completo.', 409)
+    upload.document_key = documents.store_file(_partial_path(upload.id), upload.filename)
+    db.session.commit()
+    return upload
+
+
+def _finalized(upload_id, user_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user_id or not upload.document_key:
+        return None
+    return upload
+
+
+def is_ready(upload_id, user_id):
+    return _finalized(upload_id, user_id) is not None
+
+
+def claim(upload_id, user_id):
+    """Chave do documento de um upload finalizado, para associar a um contrato.
+
+    A sessão é removida na mesma transação que grava o contrato.
+    """
+    upload = _finalized(upload_id, user_id)
+    if upload is None:
+        return None
+    db.session.delete(upload)
+    return upload.document_key
+
+
+def status(upload):
+    return {
+        'id': upload.id,
+        'filename': upload.filename,
+        'size': upload.size,
+        'received': upload.received,
+        'chunk_size': chunk_size(),
+        'next_chunk': upload.received // chunk_size(),
+        'complete': upload.document_key is not None,
+    }
@@ -0,0 +1,110 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sgpe import db, loaders
+from sgpe.models import Contract, contract_projects
+
+# Consultas sobre o período de vigência dos contratos (start_date a end_date,
+# ambos inclusivos). Sem data de início, o contrato conta como iniciado desde
+# sempre; sem data de fim, como sem termo.
+#
+# Todas as condições começam por um intervalo sobre end_date, servido pelo
+# índice ix_contract_end_date_start_date (end_date, start_date): só são lidas
+# as entradas dos contratos que terminam depois da data pedida (ou sem termo),
+# e start_date é verificada no próprio índice. O custo é proporcional a esses
+# contratos, não ao histórico dos que já terminaram: pequeno para a data de
+# hoje (a predefinição da vista) e datas recentes, mas próximo da tabela
+# inteira para uma data muito antiga, em que quase todos terminam depois.
+#
+# Com a data num parâmetro, o SQLite não sabe que o intervalo é estreito e,
+# numa listagem paginada, prefere percorrer um índice pela ordem pedida,
+# filtrando os contratos já terminados até encher a página. A condição sobre
+# end_date leva por isso a indicação likelihood() (só no SQLite): o planeador
+# procura o intervalo no índice e ordena apenas os contratos encontrados.
+
+# Fração estimada dos contratos que terminam depois da data pedida
+RECENT_END_LIKELIHOOD = 0.05
+
+
+class _rare(FunctionElement):
+    """Condição satisfeita por poucas linhas (indicação para o planeador do SQLite)."""
+
+    inherit_cache = True
+
+
+@compiles(_rare)
+def _compile_rare(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(_rare, 'sqlite')
+def _compile_rare_sqlite(element, compiler, **kw):
+    return f'likelihood({compiler.process(element.clauses, **kw)}, {RECENT_END_LIKELIHOOD})'
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min)
+
+
+def _day_end(day):
+    """Primeiro instante do dia seguinte (limite exclusivo); em date.max, o último instante possível."""
+    if day >= date.max:
+        return datetime.max
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+def _ends_on_or_after(day):
+    # Duas gamas no mesmo índice (MULTI-INDEX OR): sem termo, ou fim >= dia
+    return or_(Contract.end_date.is_(None), _rare(Contract.end_date >= _day_start(day)))
+
+
+def _starts_on_or_before(day):
+    return or_(Contract.start_date.is_(None), Contract.start_date < _day_end(day))
+
+
+def active_on(day):
+    """Condição: contratos em vigor no dia ``day``."""
+    return and_(_ends_on_or_after(day), _starts_on_or_before(day))
+
+
+def overlapping(start, end):
+    """Condição: contratos cuja vigência interseta o período [start, end]."""
+    return and_(_ends_on_or_after(start), _starts_on_or_before(end))
+
+
+def expiring_within(days, today=None):
+    """Condição: contratos que terminam entre hoje e daqui a ``days`` dias (inclusive)."""
+    today = today or date.today()
+    return and_(Contract.end_date >= _day_start(today),
+                Contract.end_date < _day_end(today + timedelta(days=days)))
+
+
+def _period(contract):
+    start = contract.start_date or datetime.min
+    end = contract.end_date or datetime.max
+    return start, end
+
+
+def project_overlaps(project_id):
+    """Pares (contrato, contrato) do projeto cujas vigências se sobrepõem.
+
+    Os contratos do projeto são lidos pelo índice de contract_projects e
+    comparados por varrimento ordenado pela data de início (n log n mais o
+    número de pares encontrados).
+    """
+    contracts = db.session.execute(
+        db.select(Contract).options(*loaders.contract_list())
+        .join(contract_projects, contract_projects.c.contract_id == Contract.id)
+        .where(contract_projects.c.project_id == project_id)
+    ).scalars().all()
+    contracts.sort(key=lambda contract: (_period(contract), contract.id))
+
+    pairs, open_contracts = [], []
+    for contract in contracts:
+        start, end = _period(contract)
+        # Mantém só os contratos ainda em vigor no início deste
+        open_contracts = [other for other in open_contracts if _period(other)[1] >= start]
+        pairs.extend((other, contract) for other in open_contracts)
+        open_contracts.append(contract)
+    return pairs
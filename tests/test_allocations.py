@@ -0,0 +1,79 @@
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier, ContractItem, Allocation
+from sgpe.allocations import allocate, AllocationError
+
+class AllocationServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        project_type = ProjectType(name='Test Type')
+        db.session.add_all([user, project_type])
+        db.session.commit()
+        self.projects = [Project(name=f'P{i}', project_type_id=project_type.id, location_province='Gaza',
+                                 location_district='Bilene', location_admin_post='Macia', author=user)
+                         for i in range(3)]
+        contract = Contract(contract_number='C1', contract_type_info=ContractType(name='Obras'),
+                            supplier_info=Supplier(name='S'), contract_value=100.0)
+        db.session.add_all(self.projects + [contract])
+        db.session.flush()
+        self.item = ContractItem(name='Cimento', quantity=100, unit='sacos', unit_price=1.0, contract_id=contract.id)
+        db.session.add(self.item)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def rows(self, *quantities):
+        return [{'item_id': self.item.id, 'project_id': project.id, 'quantity': quantity}
+                for project, quantity in zip(self.projects, quantities)]
+
+    def test_allocates_batch(self):
+        self.assertEqual(allocate(self.rows(40, 30, 30)), 3)
+        self.assertEqual(Allocation.query.count(), 3)
+        self.assertEqual(ContractItem.availability_for([self.item.id])[self.item.id], (100, 0))
+
+    def test_over_allocation_rejects_whole_batch(self):
+        allocate(self.rows(50))
+        with self.assertRaises(AllocationError) as ctx:
+            allocate(self.rows(20, 20, 20))
+        self.assertIn('disponíveis 50', ctx.exception.errors[0]['message'])
+        self.assertEqual(Allocation.query.count(), 1)
+
+    def test_unknown_references_and_bad_rows(self):
+        rows = self.rows(1) + [
+            {'item_id': 999, 'project_id': self.projects[0].id, 'quantity': 1},
+            {'item_id': self.item.id, 'project_id': 999, 'quantity': 1},
+        ]
+        with self.assertRaises(AllocationError) as ctx:
+            allocate(rows)
+        self.assertEqual([error['row'] for error in ctx.exception.errors], [1, 2])
+        with self.assertRaises(AllocationError):
+            allocate([{'item_id': self.item.id, 'project_id': self.projects[0].id, 'quantity': 0}])
+        # Quantidades não inteiras são rejeitadas, não truncadas
+        for quantity in (2.7, '2.7', True, None):
+            with self.assertRaises(AllocationError):
+                allocate(self.rows(quantity))
+        self.assertEqual(Allocation.query.count(), 0)
+
+    def test_bulk_endpoint(self):
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        response = self.client.post(url_for('main.bulk_allocate'), json={'allocations': self.rows(10, 10)})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json(), {'created': 2})
+        response = self.client.post(url_for('main.bulk_allocate'), json={'allocations': self.rows(100)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.get_json()['errors']), 1)
+        # Corpos JSON que não são objetos
+        for body in ([self.rows(1)], 5, 'allocations', None):
+            response = self.client.post(url_for('main.bulk_allocate'), json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIsNone(response.get_json()['errors'][0]['row'])
+        self.assertEqual(Allocation.query.count(), 2)
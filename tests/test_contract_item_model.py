@@ -0,0 +1,62 @@
+import unittest
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier, ContractItem, Allocation
+
+class ContractItemAvailabilityTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        user = User(username='admin', email='admin@test.com', password='adminpass')
+        project_type = ProjectType(name='Test Type')
+        db.session.add_all([user, project_type])
+        db.session.commit()
+        self.project = Project(name='P', project_type_id=project_type.id, location_province='Gaza',
+                               location_district='Bilene', location_admin_post='Macia', author=user)
+        contract = Contract(contract_number='C1', contract_type_info=ContractType(name='Obras'),
+                            supplier_info=Supplier(name='S'), contract_value=100.0)
+        db.session.add_all([self.project, contract])
+        db.session.flush()
+        self.cement = ContractItem(name='Cimento', quantity=100, unit='sacos', unit_price=1.0, contract_id=contract.id)
+        self.steel = ContractItem(name='Aço', quantity=10, unit='kg', unit_price=1.0, contract_id=contract.id)
+        db.session.add_all([self.cement, self.steel])
+        db.session.flush()
+        db.session.add_all([
+            Allocation(item_id=self.cement.id, project=self.project, quantity=30),
+            Allocation(item_id=self.cement.id, project=self.project, quantity=20),
+            Allocation(item_id=self.steel.id, project=self.project, quantity=10),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_python_and_sql_agree(self):
+        self.assertEqual(self.cement.allocated_quantity, 50)
+        self.assertEqual(self.cement.available_quantity, 50)
+        rows = db.session.execute(
+            db.select(ContractItem.id, ContractItem.allocated_quantity, ContractItem.available_quantity)
+        ).all()
+        for item_id, allocated, available in rows:
+            item = db.session.get(ContractItem, item_id)
+            self.assertEqual((allocated, available), (item.allocated_quantity, item.available_quantity))
+
+    def test_filter_and_order_by_availability(self):
+        available = ContractItem.query.filter(ContractItem.available_quantity > 0).all()
+        self.assertEqual(available, [self.cement])
+        ordered = ContractItem.query.order_by(ContractItem.available_quantity.desc()).all()
+        self.assertEqual(ordered, [self.cement, self.steel])
+
+    def test_with_availability_skips_collection_load(self):
+        db.session.expire_all()
+        items = ContractItem.query.options(ContractItem.with_availability()).order_by(ContractItem.id).all()
+        self.assertEqual([item.available_quantity for item in items], [50, 0])
+        for item in items:
+            self.assertIn('allocations', db.inspect(item).unloaded)
+
+    def test_availability_for(self):
+        result = ContractItem.availability_for([self.cement.id, self.steel.id])
+        self.assertEqual(result, {self.cement.id: (50, 50), self.steel.id: (10, 0)})
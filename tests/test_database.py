@@ -0,0 +1,96 @@
+import os
+import tempfile
+import threading
+import unittest
+from config import config, TestingConfig, ProductionConfig
+from sgpe import create_app, db
+from sgpe.database import database_report
+from flask import url_for
+from sgpe.models import (User, Project, ProjectType, Supplier, ContractType, Contract, ContractItem,
+                         Allocation)
+
+class ProductionProfileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'sgpe.db')
+        config['sqlite-profile'] = type('ProfileTestConfig', (TestingConfig,), {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + path,
+            'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS,
+            'SQLALCHEMY_ENGINE_OPTIONS': dict(ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS, pool_size=3),
+        })
+        self.app = create_app('sqlite-profile')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.app_context.pop()
+        del config['sqlite-profile']
+        self.directory.cleanup()
+
+    def test_pragmas_applied_on_connect(self):
+        report = database_report()
+        self.assertEqual(report['pragmas']['journal_mode'], 'wal')
+        self.assertEqual(report['pragmas']['synchronous'], 1)  # NORMAL
+        self.assertEqual(report['pragmas']['foreign_keys'], 1)
+        self.assertEqual(report['pragmas']['busy_timeout'], ProductionConfig.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(report['pool'], 'QueuePool')
+        self.assertEqual(report['pool_size'], 3)
+        self.assertTrue(report['pool_pre_ping'])
+
+    def test_readers_not_blocked_by_writer(self):
+        db.session.add(ProjectType(name='Estradas'))
+        db.session.commit()
+        writer = db.engine.connect()
+        writer.exec_driver_sql('BEGIN IMMEDIATE')
+        writer.exec_driver_sql("INSERT INTO project_type (name, name_key) VALUES ('Escolas', 'escolas')")
+        names = []
+
+        def read():
+            with self.app.app_context():
+                with db.engine.connect() as reader:
+                    names.extend(reader.exec_driver_sql('SELECT name FROM project_type').scalars())
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join(timeout=5)
+        writer.rollback()
+        writer.close()
+        # Em WAL o leitor vê o último estado confirmado, sem esperar pelo escritor
+        self.assertEqual(names, ['Estradas'])
+
+    def test_deletes_with_foreign_keys_enforced(self):
+        admin = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        supplier = Supplier(name='Fornecedor')
+        project = Project(name='Ponte', project_type=ProjectType(name='Estradas'), author=admin,
+                          location_province='Gaza', location_district='Bilene', location_admin_post='Macia')
+        contract = Contract(contract_number='C-1', contract_type_info=ContractType(name='Obras'),
+                            supplier_info=supplier, contract_value=100.0, projects=[project])
+        item = ContractItem(name='Cimento', quantity=10, unit='kg', unit_price=5.0)
+        contract.items.append(item)
+        item.allocations.append(Allocation(project=project, quantity=2))
+        db.session.add_all([admin, contract])
+        db.session.commit()
+        contract_id = contract.id
+        client = self.app.test_client(use_cookies=True)
+        with self.app.test_request_context():
+            client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+            # O fornecedor tem contratos: a remoção é recusada em vez de violar a chave estrangeira
+            response = client.post(url_for('main.delete_supplier', supplier_id=supplier.id), follow_redirects=True)
+            self.assertIn('existem contratos associados', response.get_data(as_text=True))
+            response = client.post(url_for('main.delete_contract', contract_id=contract_id), follow_redirects=True)
+            self.assertIn('Contrato apagado com sucesso!', response.get_data(as_text=True))
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(Contract, contract_id))
+        self.assertEqual((ContractItem.query.count(), Allocation.query.count(), Supplier.query.count()), (0, 0, 1))
+
+    def test_report_command(self):
+        result = self.app.test_cli_runner().invoke(args=['db-report'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('journal_mode=wal', result.output)
+
+if __name__ == '__main__':
+    unittest.main()
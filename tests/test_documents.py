@@ -0,0 +1,127 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from flask import url_for
+from werkzeug.datastructures import FileStorage
+from sgpe import create_app, db, documents
+from sgpe.models import User, Contract, ContractType, Supplier
+
+PDF = b'%PDF-1.4 contrato digitalizado'
+
+class DocumentStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config['UPLOAD_FOLDER'] = self.upload_dir
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        self.supplier, self.contract_type = Supplier(name='Fornecedor'), ContractType(name='Obras')
+        db.session.add_all([User(username='admin', email='admin@test.com', password='adminpass', is_admin=True),
+                            self.supplier, self.contract_type])
+        db.session.commit()
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_dir)
+
+    def stored_files(self):
+        return sorted(os.path.relpath(os.path.join(root, name), self.upload_dir)
+                      for root, _, names in os.walk(self.upload_dir) for name in names)
+
+    def add_contract(self, number, content=PDF):
+        response = self.client.post(url_for('main.add_contract'), content_type='multipart/form-data', data={
+            'contract_number': number, 'contract_type': self.contract_type.id, 'supplier': self.supplier.id,
+            'contract_value': '10', 'document': (io.BytesIO(content), 'Contrato.PDF')})
+        self.assertEqual(response.status_code, 302)
+        return Contract.query.filter_by(contract_number=number).one()
+
+    def test_store_streams_and_shards_by_hash(self):
+        content = os.urandom(documents.CHUNK_SIZE * 3 + 10)
+        key = documents.store(FileStorage(io.BytesIO(content), 'scan.pdf'))
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(key, f'{digest[:2]}/{digest[2:4]}/{digest}.pdf')
+        with open(documents.path_for(key), 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+        # O mesmo conteúdo não é gravado duas vezes
+        self.assertEqual(documents.store(FileStorage(io.BytesIO(content), 'copia.pdf')), key)
+        self.assertEqual(self.stored_files(), [key])
+
+    def test_shared_document_deleted_with_last_reference(self):
+        first = self.add_contract('C-1')
+        second = self.add_contract('C-2')
+        self.assertEqual(first.document_filename, second.document_filename)
+        self.assertEqual(self.stored_files(), [first.document_filename])
+        key, second_id = first.document_filename, second.id
+
+        self.client.post(url_for('main.delete_contract', contract_id=first.id))
+        self.assertEqual(self.stored_files(), [key])
+        self.client.post(url_for('main.delete_contract', contract_id=second_id))
+        self.assertEqual(self.stored_files(), [])
+
+    def test_update_releases_old_document(self):
+        contract = self.add_contract('C-1')
+        old_key, contract_id = contract.document_filename, contract.id
+        response = self.client.post(url_for('main.update_contract', contract_id=contract_id),
+                                    content_type='multipart/form-data', data={
+            'contract_number': 'C-1', 'contract_type': self.contract_type.id, 'supplier': self.supplier.id,
+            'contract_value': '10', 'document': (io.BytesIO(b'%PDF nova versao'), 'novo.pdf')})
+        self.assertEqual(response.status_code, 302)
+        new_key = db.session.get(Contract, contract_id).document_filename
+        self.assertNotEqual(new_key, old_key)
+        self.assertEqual(self.stored_files(), [new_key])
+
+        response = self.client.get(url_for('main.download_document', filename=new_key))
+        self.assertEqual(response.data, b'%PDF nova versao')
+        response.close()
+
+    def test_download_etag_and_range(self):
+        key = self.add_contract('C-1').document_filename
+        url = url_for('main.download_document', filename=key)
+        response = self.client.get(url)
+        self.assertEqual(response.get_etag(), (hashlib.sha256(PDF).hexdigest(), False))
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        response.close()
+
+        response = self.client.get(url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, headers={'Range': 'bytes=0-7'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, PDF[:8])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 0-7/{len(PDF)}')
+        response.close()
+
+        self.assertEqual(self.client.get(url_for('main.download_document', filename='../config.py')).status_code, 404)
+
+    def test_download_with_accel_redirect(self):
+        key = self.add_contract('C-1').document_filename
+        self.app.config['DOCUMENT_SENDFILE'] = 'x-accel'
+        url = url_for('main.download_document', filename=key)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'], '/protected-uploads/' + key)
+        self.assertEqual(response.mimetype, 'application/pdf')
+        self.assertEqual(response.data, b'')
+        response = self.client.get(url, headers={'If-None-Match': f'"{hashlib.sha256(PDF).hexdigest()}"'})
+        self.assertEqual(response.status_code, 304)
+
+        self.app.config['DOCUMENT_SENDFILE'] = 'x-sendfile'
+        response = self.client.get(url)
+        self.assertEqual(response.headers['X-Sendfile'], os.path.abspath(documents.path_for(key)))
+
+    def test_max_content_length(self):
+        self.app.config['DOCUMENT_MAX_CONTENT_LENGTH'] = 100
+        response = self.client.post(url_for('main.add_contract'), content_type='multipart/form-data', data={
+            'contract_number': 'C-1', 'document': (io.BytesIO(b'x' * 1000), 'grande.pdf')})
+        self.assertEqual(response.status_code, 413)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier
+
+class ExporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        project_type = ProjectType(name='Estradas')
+        db.session.add_all([user, project_type])
+        db.session.commit()
+        projects = [Project(name=f'Projeto {i}', project_type_id=project_type.id, location_province='Gaza',
+                            location_district='Bilene', location_admin_post='Macia', author=user)
+                    for i in range(3)]
+        contract_type, supplier = ContractType(name='Obras'), Supplier(name='Construtora Norte')
+        db.session.add_all(projects)
+        db.session.add(Contract(contract_number='C-1', contract_type_info=contract_type, supplier_info=supplier,
+                                contract_value=10.5, projects=projects[:2]))
+        db.session.add(Contract(contract_number='C-2', contract_type_info=contract_type,
+                                supplier_info=Supplier(name='Sul Lda'), contract_value=3.0))
+        db.session.commit()
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_contracts_csv(self):
+        response = self.client.get(url_for('main.export_data', kind='contracts'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([row['contract_number'] for row in rows], ['C-1', 'C-2'])
+        self.assertEqual(rows[0]['supplier'], 'Construtora Norte')
+        self.assertEqual(rows[0]['project_names'], 'Projeto 0;Projeto 1')
+
+    def test_contracts_jsonl_with_search(self):
+        response = self.client.get(url_for('main.export_data', kind='contracts', format='jsonl', search='sul'))
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([row['contract_number'] for row in rows], ['C-2'])
+        self.assertEqual(rows[0]['project_ids'], [])
+
+    def test_projects_csv(self):
+        response = self.client.get(url_for('main.export_data', kind='projects', format='csv'))
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['project_type'], 'Estradas')
+
+    def test_unknown_format(self):
+        response = self.client.get(url_for('main.export_data', kind='projects', format='xml'))
+        self.assertEqual(response.status_code, 400)
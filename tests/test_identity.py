@@ -0,0 +1,91 @@
+import unittest
+from flask import g, url_for
+from sgpe import create_app, db
+from sgpe.models import User
+from sgpe.identity import SnapshotCache, UserSnapshot, load_user
+from sgpe.loaders import count_queries
+
+class IdentityTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def user_queries(self, url):
+        # Em produção cada pedido tem o seu próprio g
+        g.pop('_login_user', None)
+        with count_queries() as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in queries if 'FROM user' in q]
+
+    def test_authenticated_requests_skip_user_query(self):
+        url = url_for('main.import_data')  # Só administradores
+        self.user_queries(url)
+        self.assertEqual(self.user_queries(url), [])
+
+    def test_snapshot_invalidated_on_update(self):
+        url = url_for('main.import_data')
+        self.user_queries(url)
+        user = db.session.get(User, self.user_id)
+        user.is_admin = False
+        db.session.commit()
+        g.pop('_login_user', None)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)  # Já não é administrador
+
+    def test_snapshot_evicted_after_commit(self):
+        cache = self.app.extensions['sgpe_identity']
+        stale = load_user(str(self.user_id))
+        user = db.session.get(User, self.user_id)
+        user.username = 'novo'
+        db.session.flush()
+        # Entre o flush e o commit, outro pedido ainda lê (e guarda) a linha antiga
+        cache.put(stale)
+        db.session.commit()
+        self.assertIsNone(cache.get(self.user_id))
+        self.assertEqual(load_user(str(self.user_id)).username, 'novo')
+
+        # Alterações desfeitas não removem o snapshot
+        user.username = 'desfeito'
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(cache.get(self.user_id).username, 'novo')
+
+    def test_snapshot_is_read_only_and_loads_full_user(self):
+        snapshot = load_user(str(self.user_id))
+        self.assertEqual((snapshot.id, snapshot.username, snapshot.is_admin), (self.user_id, 'admin', True))
+        with self.assertRaises(AttributeError):
+            snapshot.is_admin = False
+        self.assertEqual(snapshot.user.email, 'admin@test.com')
+        self.assertIsNone(load_user('999'))
+        self.assertIsNone(load_user('abc'))
+
+    def test_lru_bounds_and_ttl(self):
+        cache = SnapshotCache(max_size=2, ttl=60)
+        for i in (1, 2):
+            cache.put(UserSnapshot(i, f'u{i}', False))
+        cache.get(1)  # 1 passa a ser o mais recente
+        cache.put(UserSnapshot(3, 'u3', False))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1).username, 'u1')
+        self.assertEqual(len(cache), 2)
+
+        expired = SnapshotCache(max_size=2, ttl=-1)
+        expired.put(UserSnapshot(1, 'u1', False))
+        self.assertIsNone(expired.get(1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import io
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, ContractType, Supplier
+from sgpe.importer import import_csv
+from sgpe.search import search
+from sgpe.stats import get_dashboard_stats
+
+class ImporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        db.session.add_all([self.user, ProjectType(name='Estradas'), ContractType(name='Obras')])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_import_projects(self):
+        data = io.StringIO(
+            'name,description,project_type,province,district,admin_post\n'
+            'Estrada Macia,Asfalto,estradas,Gaza,Bilene,Macia\n'
+            'Sem tipo,,Pontes,Gaza,Bilene,Macia\n'
+            'Local errado,,Estradas,Gaza,Beira,Macia\n'
+        )
+        report = import_csv('projects', data, user_id=self.user.id)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line for line, _ in report.errors], [3, 4])
+        self.assertEqual(Project.query.one().author, self.user)
+        # Os índices derivados acompanham a importação em lote
+        self.assertEqual(get_dashboard_stats()['total_projects'], 1)
+        self.assertEqual(len(search('macia')), 1)
+
+    def test_import_suppliers_rejects_duplicates(self):
+        db.session.add(Supplier(name='Existente'))
+        db.session.commit()
+        data = io.StringIO(
+            'name,contact_person,email,phone\n'
+            'Novo,Ana,ana@x.com,1\n'
+            'existente,,,\n'
+            'NOVO,,,\n'
+            'Outro,,ana@x.com,\n'
+        )
+        report = import_csv('suppliers', data)
+        self.assertEqual(report.created, 1)
+        self.assertEqual(report.error_count, 3)
+
+    def test_import_contracts_in_chunks(self):
+        import sgpe.importer as importer
+        db.session.add(Supplier(name='Construtora'))
+        project = Project(name='P', project_type_id=1, location_province='Gaza', location_district='Bilene',
+                          location_admin_post='Macia', author=self.user)
+        db.session.add(project)
+        db.session.commit()
+        lines = ['contract_number,contract_type,supplier,contract_value,start_date,end_date,projects']
+        lines += [f'C-{i},Obras,Construtora,{i}.5,2024-01-0{i % 9 + 1},,{project.id}' for i in range(7)]
+        lines += ['C-1,Obras,Construtora,1,,,', 'C-99,Obras,Construtora,1,,,999']
+        original, importer.CHUNK_SIZE = importer.CHUNK_SIZE, 3
+        try:
+            report = import_csv('contracts', io.StringIO('\n'.join(lines)))
+        finally:
+            importer.CHUNK_SIZE = original
+        self.assertEqual(report.created, 7)
+        self.assertEqual(report.error_count, 2)
+        self.assertEqual(len(db.session.get(Project, project.id).contracts), 7)
+        self.assertEqual(get_dashboard_stats()['total_contracts'], 7)
+
+    def test_contract_value_errors(self):
+        db.session.add(Supplier(name='Fornecedor'))
+        db.session.commit()
+        header = 'contract_number,contract_type,supplier,start_date\n'
+        report = import_csv('contracts', io.StringIO(header + 'C-1,Obras,Fornecedor,2024-01-01\n'))
+        self.assertEqual(report.errors, [(2, "O campo 'contract_value' é obrigatório.")])
+        data = io.StringIO('contract_number,contract_type,supplier,contract_value\n'
+                           'C-1,Obras,Fornecedor,\n'
+                           'C-2,Obras,Fornecedor,muito\n')
+        report = import_csv('contracts', data)
+        self.assertEqual(report.errors, [(2, "O campo 'contract_value' é obrigatório."),
+                                         (3, "Valor inválido: 'muito'.")])
+
+    def test_contract_non_finite_values_and_bad_project_ids(self):
+        db.session.add(Supplier(name='Fornecedor'))
+        db.session.commit()
+        data = io.StringIO('contract_number,contract_type,supplier,contract_value,projects\n'
+                           'C-1,Obras,Fornecedor,nan,\n'
+                           'C-2,Obras,Fornecedor,inf,\n'
+                           'C-3,Obras,Fornecedor,1e400,\n'
+                           'C-4,Obras,Fornecedor,-5,\n'
+                           'C-5,Obras,Fornecedor,10,99999999999999999999999\n'
+                           'C-6,Obras,Fornecedor,10,0\n'
+                           'C-7,Obras,Fornecedor,10,\n')
+        report = import_csv('contracts', data)
+        self.assertEqual([line for line, _ in report.errors], [2, 3, 4, 5, 6, 7])
+        self.assertEqual(report.errors[0], (2, "Valor inválido: 'nan'."))
+        self.assertEqual(report.errors[4], (6, "A coluna 'projects' deve conter ids separados por ';'."))
+        self.assertEqual(report.created, 1)
+        self.assertEqual(get_dashboard_stats()['total_contract_value'], 10)
+
+    def test_upload_view_rejects_unreadable_file(self):
+        client = self.app.test_client(use_cookies=True)
+        client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        # Não é UTF-8; aspas por fechar que engolem o resto do ficheiro (csv.Error)
+        for content in ('name\nFornecedor Único\n'.encode('latin-1'), b'name\n"Fornecedor' + b' ' * 200000):
+            data = {'kind': 'suppliers', 'file': (io.BytesIO(content), 'f.csv')}
+            response = client.post(url_for('main.import_data'), data=data, content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Ficheiro inválido', response.get_data(as_text=True))
+        self.assertEqual(Supplier.query.count(), 0)
+
+    def test_upload_view_has_own_size_limit(self):
+        client = self.app.test_client(use_cookies=True)
+        client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        content = 'name\n' + ''.join(f'Fornecedor {i}\n' for i in range(100))
+        self.app.config.update(MAX_CONTENT_LENGTH=100, DOCUMENT_MAX_CONTENT_LENGTH=100)
+        data = {'kind': 'suppliers', 'file': (io.BytesIO(content.encode('utf-8')), 'f.csv')}
+        response = client.post(url_for('main.import_data'), data=data, content_type='multipart/form-data')
+        self.assertIn('100 registos importados', response.get_data(as_text=True))
+        self.app.config['IMPORT_MAX_CONTENT_LENGTH'] = 100
+        data = {'kind': 'suppliers', 'file': (io.BytesIO(content.encode('utf-8')), 'f.csv')}
+        response = client.post(url_for('main.import_data'), data=data, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 413)
+
+    def test_upload_view(self):
+        client = self.app.test_client(use_cookies=True)
+        client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        data = {'kind': 'suppliers', 'file': (io.BytesIO('name\nFornecedor Único\n'.encode('utf-8')), 'f.csv')}
+        response = client.post(url_for('main.import_data'), data=data, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('1 registos importados', response.get_data(as_text=True))
+        self.assertIsNotNone(Supplier.query.filter_by(name='Fornecedor Único').first())
@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from flask import g, url_for
+from sgpe import create_app, db, jobs
+from sgpe.models import User, Job, Contract, ContractType, Supplier
+
+@jobs.task('test-flaky')
+def flaky_task(context, failures):
+    """Falha nas primeiras ``failures`` tentativas."""
+    job = db.session.get(Job, context.job_id)
+    if job.attempts <= int(failures):
+        raise RuntimeError('falha temporária')
+    context.progress(0.5, 'a meio')
+    return {'attempts': job.attempts}
+
+class JobsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config['JOB_OUTPUT_FOLDER'] = self.output_dir
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        db.session.add_all([user, Contract(contract_number='C-1', contract_value=10.0,
+                                           contract_type_info=ContractType(name='Obras'),
+                                           supplier_info=Supplier(name='Fornecedor'))])
+        db.session.commit()
+        self.user_id = user.id
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.output_dir)
+
+    def run_jobs(self):
+        jobs.run_worker(once=True, inline=True, log=lambda message: None)
+        db.session.expire_all()
+
+    def test_background_export(self):
+        response = self.client.post(url_for('main.export_data_background', kind='contracts', format='jsonl'))
+        self.assertEqual(response.status_code, 202)
+        status_url = response.headers['Location']
+        self.assertEqual(self.client.get(status_url).get_json()['status'], 'queued')
+
+        self.run_jobs()
+        status = self.client.get(status_url).get_json()
+        self.assertEqual((status['status'], status['progress']), ('done', 1.0))
+        self.assertEqual(status['result']['lines'], 1)
+        response = self.client.get(status['download_url'])
+        self.assertIn(b'"contract_number": "C-1"', response.data)
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        response.close()
+
+    def test_retries_with_backoff(self):
+        job = jobs.enqueue('test-flaky', failures=1)
+        self.run_jobs()
+        job = db.session.get(Job, job.id)
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('falha temporária', job.error)
+        self.assertGreater(job.run_after, datetime.utcnow() + timedelta(seconds=20))
+
+        self.run_jobs()  # Ainda em espera
+        self.assertEqual(db.session.get(Job, job.id).attempts, 1)
+        job.run_after = datetime.utcnow()
+        db.session.commit()
+        self.run_jobs()
+        job = db.session.get(Job, job.id)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(jobs.to_dict(job)['result'], {'attempts': 2})
+        self.assertEqual(job.message, 'a meio')
+
+    def test_fails_after_max_attempts(self):
+        job = jobs.enqueue('test-flaky', max_attempts=2, failures=5)
+        for _ in range(2):
+            db.session.execute(db.update(Job).values(run_after=datetime.utcnow()))
+            db.session.commit()
+            self.run_jobs()
+        job = db.session.get(Job, job.id)
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(jobs.to_dict(job)['error'])
+
+    def test_claim_is_exclusive_and_stale_jobs_requeued(self):
+        job = jobs.enqueue('rebuild-stats')
+        self.assertEqual(jobs.claim('a'), job.id)
+        self.assertIsNone(jobs.claim('b'))
+        db.session.execute(db.update(Job).values(started_at=datetime.utcnow() - timedelta(hours=2)))
+        db.session.commit()
+        self.assertEqual(jobs.requeue_stale(), 1)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Job, job.id).status, 'queued')
+
+    def test_unknown_task_and_other_users_jobs(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('nada')
+        other = User(username='outro', email='outro@test.com', password='x')
+        db.session.add(other)
+        db.session.commit()
+        job = jobs.enqueue('rebuild-stats', user_id=other.id)
+        # Administradores veem todas as tarefas; os outros utilizadores só as suas
+        self.assertEqual(self.client.get(url_for('main.job_status', job_id=job.id)).status_code, 200)
+        # O contexto da aplicação (e g) é partilhado pelos dois clientes
+        g.pop('_login_user', None)
+        client = self.app.test_client(use_cookies=True)
+        client.post(url_for('main.login'), data={'email': 'outro@test.com', 'password': 'x'})
+        mine = jobs.enqueue('rebuild-stats', user_id=self.user_id)
+        self.assertEqual(client.get(url_for('main.job_status', job_id=mine.id)).status_code, 404)
+
+    def test_cli_enqueue(self):
+        result = self.app.test_cli_runner().invoke(args=['enqueue-job', 'export', '--arg', 'kind=projects'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(Job.query.one().name, 'export')
+
+if __name__ == '__main__':
+    unittest.main()
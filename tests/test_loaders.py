@@ -0,0 +1,85 @@
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier
+from sgpe.loaders import count_queries
+
+class QueryBudgetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        self.user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        self.project_type = ProjectType(name='Test Type')
+        db.session.add_all([self.user, self.project_type])
+        db.session.commit()
+        self.user_id, self.project_type_id = self.user.id, self.project_type.id
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        self.counter = 0
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def new_project(self, name):
+        return Project(name=name, project_type_id=self.project_type_id, location_province='Gaza',
+                       location_district='Bilene', location_admin_post='Macia', user_id=self.user_id)
+
+    def add_rows(self, n):
+        """Cria n projetos, cada um com um contrato de um fornecedor e tipo próprios."""
+        for _ in range(n):
+            self.counter += 1
+            i = self.counter
+            supplier = Supplier(name=f'Fornecedor {i}')
+            contract_type = ContractType(name=f'Tipo {i}')
+            project = self.new_project(f'Projeto {i}')
+            contract = Contract(contract_number=f'C-{i}', contract_type_info=contract_type,
+                                supplier_info=supplier, contract_value=1.0, projects=[project])
+            db.session.add(contract)
+        db.session.commit()
+        db.session.expire_all()
+
+    def queries_for(self, url):
+        db.session.expire_all()
+        with count_queries() as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_budget(self, url):
+        self.add_rows(2)
+        self.queries_for(url)  # Aquece os snapshots construídos na primeira leitura
+        small = self.queries_for(url)
+        self.add_rows(6)
+        self.assertEqual(self.queries_for(url), small)
+
+    def test_home_budget(self):
+        self.assert_constant_budget(url_for('main.home'))
+
+    def test_contracts_budget(self):
+        self.assert_constant_budget(url_for('main.contracts'))
+
+    def test_project_detail_budget(self):
+        project = self.new_project('Detalhe')
+        db.session.add(project)
+        db.session.commit()
+        project_id = project.id
+        url = url_for('main.project', project_id=project_id)
+
+        def add_contracts(prefix, n):
+            project = db.session.get(Project, project_id)
+            for i in range(n):
+                db.session.add(Contract(contract_number=f'{prefix}-{i}', contract_type_info=ContractType(name=f'{prefix}{i}'),
+                                        supplier_info=Supplier(name=f'S-{prefix}{i}'), contract_value=1.0,
+                                        projects=[project]))
+            db.session.commit()
+            db.session.expire_all()
+
+        add_contracts('A', 1)
+        self.queries_for(url)
+        small = self.queries_for(url)
+        add_contracts('B', 6)
+        self.assertEqual(self.queries_for(url), small)
@@ -0,0 +1,43 @@
+import unittest
+from sgpe.locations import LOCATIONS, LOCATION_INDEX, LocationIndex
+
+class LocationIndexTestCase(unittest.TestCase):
+    def test_choices_match_locations(self):
+        self.assertEqual(LOCATION_INDEX.province_choices[0], ('', 'Selecione a Província'))
+        self.assertEqual([p for p, _ in LOCATION_INDEX.province_choices[1:]], list(LOCATIONS))
+        self.assertEqual([d for d, _ in LOCATION_INDEX.district_choices('Gaza')[1:]], list(LOCATIONS['Gaza']))
+        self.assertEqual([p for p, _ in LOCATION_INDEX.admin_post_choices('Gaza', 'Bilene')[1:]],
+                         LOCATIONS['Gaza']['Bilene'])
+        # Localização desconhecida: apenas o placeholder
+        self.assertEqual(LOCATION_INDEX.district_choices('Atlântida'), (('', 'Selecione o Distrito'),))
+        self.assertEqual(LOCATION_INDEX.admin_post_choices(None, None), (('', 'Selecione o Posto Administrativo'),))
+
+    def test_is_valid(self):
+        self.assertTrue(LOCATION_INDEX.is_valid('Gaza'))
+        self.assertTrue(LOCATION_INDEX.is_valid('Gaza', 'Bilene'))
+        self.assertTrue(LOCATION_INDEX.is_valid('Gaza', 'Bilene', 'Macia'))
+        self.assertFalse(LOCATION_INDEX.is_valid('Atlântida'))
+        self.assertFalse(LOCATION_INDEX.is_valid('Maputo', 'Bilene'))
+        self.assertFalse(LOCATION_INDEX.is_valid('Gaza', 'Bilene', 'Save'))
+
+    def test_codes_and_reverse_lookup(self):
+        code = LOCATION_INDEX.admin_post_code('Gaza', 'Bilene', 'Macia')
+        self.assertIsNotNone(code)
+        self.assertEqual(LOCATION_INDEX.admin_post_path(code), ('Gaza', 'Bilene', 'Macia'))
+        district_code = LOCATION_INDEX.district_code('Gaza', 'Bilene')
+        self.assertEqual(LOCATION_INDEX.district_path(district_code), ('Gaza', 'Bilene'))
+        self.assertEqual(LOCATION_INDEX.provinces[LOCATION_INDEX.province_code('Gaza')], 'Gaza')
+        self.assertIsNone(LOCATION_INDEX.province_code('Atlântida'))
+
+    def test_reverse_lookup_with_repeated_names(self):
+        self.assertEqual(sorted(LOCATION_INDEX.find_admin_post('Save')),
+                         [('Inhambane', 'Govuro', 'Save'), ('Manica', 'Machaze', 'Save')])
+        self.assertEqual(LOCATION_INDEX.find_admin_post('Inexistente'), [])
+
+    def test_names_are_interned(self):
+        index = LocationIndex({''.join(['Pro', 'v']): {''.join(['Di', 's']): [''.join(['Po', 's'])]}})
+        self.assertIs(index.provinces[0], 'Prov')
+        self.assertIs(index.admin_posts[0][0], 'Pos')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from flask import g, url_for
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier
+from sgpe.locations import LOCATIONS
+from sgpe.location_stats import get_location_stats, find_node
+from sgpe.loaders import count_queries
+
+class LocationStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        self.user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        self.project_type = ProjectType(name='Estradas')
+        self.contract_type = ContractType(name='Obras')
+        self.supplier = Supplier(name='Fornecedor')
+        db.session.add_all([self.user, self.project_type, self.contract_type, self.supplier])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def new_request(self):
+        # Os pedidos de teste partilham o contexto da aplicação
+        g.pop('_refdata_versions', None)
+        g.pop('_login_user', None)
+
+    def add_project(self, name, district, admin_post, province='Gaza'):
+        project = Project(name=name, project_type=self.project_type, author=self.user,
+                          location_province=province, location_district=district,
+                          location_admin_post=admin_post)
+        db.session.add(project)
+        db.session.commit()
+        return project
+
+    def add_contract(self, number, value, projects):
+        contract = Contract(contract_number=number, contract_type_id=self.contract_type.id,
+                            supplier_id=self.supplier.id, contract_value=value, projects=projects)
+        db.session.add(contract)
+        db.session.commit()
+        return contract
+
+    def test_all_levels_with_zero_rows(self):
+        macia = self.add_project('P1', 'Bilene', 'Macia')
+        praia = self.add_project('P2', 'Bilene', 'Praia do Bilene')
+        chokwe = self.add_project('P3', 'Chókwè', 'Chókwè')
+        # Contrato ligado a dois projetos do mesmo distrito: conta uma vez no distrito
+        self.add_contract('C1', 100.0, [macia, praia])
+        self.add_contract('C2', 30.0, [chokwe])
+
+        _, tree = get_location_stats()
+        self.assertEqual((tree.projects, tree.contracts, tree.contract_value), (3, 2, 130.0))
+        gaza = find_node(tree, 'Gaza')
+        self.assertEqual((gaza.projects, gaza.contracts, gaza.contract_value), (3, 2, 130.0))
+        bilene = find_node(tree, 'Gaza', 'Bilene')
+        self.assertEqual((bilene.projects, bilene.contracts, bilene.contract_value), (2, 1, 100.0))
+        self.assertEqual(find_node(tree, 'Gaza', 'Bilene', 'Macia').contract_value, 100.0)
+        # Todas as localizações do gazetteer aparecem, com zero se não tiverem projetos
+        self.assertEqual(list(tree.children), list(LOCATIONS))
+        self.assertEqual(list(gaza.children), list(LOCATIONS['Gaza']))
+        self.assertEqual(find_node(tree, 'Niassa').projects, 0)
+
+    def test_cached_per_data_version(self):
+        self.add_project('P1', 'Bilene', 'Macia')
+        version, tree = get_location_stats()
+        self.new_request()
+        with count_queries() as queries:
+            self.assertIs(get_location_stats()[1], tree)
+        self.assertEqual(len(queries), 1)  # só a leitura das versões
+
+        project = self.add_project('P2', 'Bilene', 'Macia')
+        self.new_request()
+        new_version, tree = get_location_stats()
+        self.assertNotEqual(new_version, version)
+        self.assertEqual(find_node(tree, 'Gaza', 'Bilene', 'Macia').projects, 2)
+
+        # Alterar só as ligações de um contrato também invalida a cache
+        contract = self.add_contract('C1', 50.0, [])
+        self.new_request()
+        self.assertEqual(get_location_stats()[1].contract_value, 0)
+        contract.projects = [project]
+        db.session.commit()
+        self.new_request()
+        self.assertEqual(get_location_stats()[1].contract_value, 50.0)
+
+    def test_drill_down_endpoint(self):
+        self.add_project('P1', 'Bilene', 'Macia')
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        response = self.client.get(url_for('main.location_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['projects'], 1)
+        self.assertEqual(len(response.json['children']), len(LOCATIONS))
+        self.assertNotIn('children', response.json['children'][0])
+
+        response = self.client.get(url_for('main.location_stats', province='Gaza', district='Bilene'))
+        self.assertEqual(response.json['path'], ['Gaza', 'Bilene'])
+        macia = next(child for child in response.json['children'] if child['name'] == 'Macia')
+        self.assertEqual(macia['projects'], 1)
+
+        etag = response.headers['ETag']
+        response = self.client.get(url_for('main.location_stats', province='Gaza', district='Bilene'),
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url_for('main.location_stats', province='Atlântida'))
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
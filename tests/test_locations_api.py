@@ -0,0 +1,43 @@
+import json
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.locations import LOCATIONS, LOCATIONS_VERSION
+
+class LocationsApiTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_districts_cached_with_etag(self):
+        response = self.client.get(url_for('main.get_districts', province='Gaza'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), list(LOCATIONS['Gaza']))
+        self.assertIsNotNone(response.get_etag()[0])
+        self.assertFalse(response.get_etag()[1])  # ETag forte
+        self.assertIn('max-age', response.headers['Cache-Control'])
+
+        again = self.client.get(url_for('main.get_districts', province='Gaza'),
+                                headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b'')
+
+    def test_unknown_location_is_empty_list(self):
+        response = self.client.get(url_for('main.get_admin_posts', province='Gaza', district='Beira'))
+        self.assertEqual(response.get_json(), [])
+
+    def test_versioned_tree(self):
+        response = self.client.get(url_for('main.get_locations_tree', version=LOCATIONS_VERSION))
+        self.assertEqual(json.loads(response.data), LOCATIONS)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        old = self.client.get(url_for('main.get_locations_tree', version='antiga'))
+        self.assertEqual(old.status_code, 302)
+        self.assertTrue(old.location.endswith(LOCATIONS_VERSION))
@@ -0,0 +1,108 @@
+import io
+import unittest
+from flask import url_for
+from sqlalchemy import inspect
+from sgpe import create_app, db
+from sgpe.models import User, Supplier, ProjectType, name_key, email_key
+from sgpe.importer import import_csv
+from sgpe.schema import upgrade_schema, SchemaUpgradeError
+from sgpe.loaders import count_queries
+
+class NameKeyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        db.session.add(User(username='admin', email='Admin@Test.com', password='adminpass', is_admin=True))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def login_admin(self, email='admin@test.com'):
+        return self.client.post(url_for('main.login'), data={'email': email, 'password': 'adminpass'},
+                                follow_redirects=True)
+
+    def test_normalization(self):
+        self.assertEqual(name_key('  Água  e\tSaneamento '), 'agua e saneamento')
+        self.assertEqual(name_key('CHÓKWÈ'), name_key('chokwe'))
+        self.assertEqual(email_key(' Ana@Example.COM '), 'ana@example.com')
+
+    def test_key_maintained_on_write(self):
+        project_type = ProjectType(name='Água')
+        db.session.add(project_type)
+        db.session.commit()
+        self.assertEqual(project_type.name_key, 'agua')
+        project_type.name = 'Saneamento Básico'
+        db.session.commit()
+        self.assertEqual(db.session.scalar(db.select(ProjectType.name_key)), 'saneamento basico')
+        # INSERTs do Core (importações em lote) também calculam a chave
+        db.session.execute(Supplier.__table__.insert().values(name='Construções Zé'))
+        self.assertEqual(db.session.scalar(db.select(Supplier.name_key)), 'construcoes ze')
+
+    def test_validator_uses_index(self):
+        db.session.add(Supplier(name='Construções Maputo'))
+        db.session.commit()
+        self.login_admin()
+        with count_queries() as queries:
+            response = self.client.post(url_for('main.add_supplier'), data={'name': ' construcoes  MAPUTO'},
+                                        follow_redirects=True)
+        self.assertIn('Este nome de fornecedor já existe', response.get_data(as_text=True))
+        self.assertEqual(Supplier.query.count(), 1)
+        lookups = [q for q in queries if 'supplier.name_key = ' in q]
+        self.assertTrue(lookups)
+        self.assertNotIn('lower(', ' '.join(queries))
+        plan = db.session.execute(db.text(
+            'EXPLAIN QUERY PLAN SELECT id FROM supplier WHERE name_key = :key'), {'key': 'x'}).all()
+        self.assertIn('ix_supplier_name_key (name_key=?)', plan[0][-1])
+
+    def test_email_is_case_insensitive(self):
+        response = self.client.post(url_for('main.register'), data={
+            'username': 'outro', 'email': 'ADMIN@test.com', 'password': 'x', 'confirm_password': 'x'
+        }, follow_redirects=True)
+        self.assertIn('Esse email já existe', response.get_data(as_text=True))
+        response = self.login_admin(email='ADMIN@TEST.COM')
+        self.assertIn(b'<h1>Dashboard</h1>', response.data)
+
+    def test_import_detects_normalized_duplicates(self):
+        db.session.add(Supplier(name='Águas do Norte'))
+        db.session.commit()
+        data = io.StringIO('name,contact_person,email,phone\n'
+                           'aguas do  norte,,,\n'
+                           'Novo Fornecedor,,,\n'
+                           'NOVO fornecedor,,,\n')
+        report = import_csv('suppliers', data)
+        self.assertEqual(report.created, 1)
+        self.assertEqual([line for line, _ in report.errors], [2, 4])
+
+    def test_upgrade_fills_keys_on_existing_database(self):
+        db.session.add_all([ProjectType(name='Água'), ProjectType(name='Estradas')])
+        db.session.commit()
+        # Base de dados anterior às chaves normalizadas
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_project_type_name_key')
+            connection.exec_driver_sql('ALTER TABLE project_type DROP COLUMN name_key')
+        changes = upgrade_schema()
+        self.assertIn('coluna name_key em project_type', changes)
+        self.assertIn('índice ix_project_type_name_key em project_type', changes)
+        self.assertEqual(set(db.session.execute(db.select(ProjectType.name_key)).scalars()),
+                         {'agua', 'estradas'})
+        indexes = {index['name']: index for index in inspect(db.engine).get_indexes('project_type')}
+        self.assertTrue(indexes['ix_project_type_name_key']['unique'])
+        self.assertEqual(upgrade_schema(), [])
+
+    def test_upgrade_reports_conflicting_names(self):
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_project_type_name_key')
+            connection.exec_driver_sql('ALTER TABLE project_type DROP COLUMN name_key')
+            connection.exec_driver_sql("INSERT INTO project_type (name) VALUES ('Água'), ('agua')")
+        with self.assertRaises(SchemaUpgradeError) as error:
+            upgrade_schema()
+        self.assertIn("'agua'", str(error.exception))
+
+if __name__ == '__main__':
+    unittest.main()
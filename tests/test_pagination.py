@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime
+from sgpe import create_app, db
+from sgpe.models import Contract, ContractType, Supplier
+from sgpe.pagination import KeysetPagination, encode_cursor, decode_cursor
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        supplier = Supplier(name='Fornecedor')
+        contract_type = ContractType(name='Obras')
+        db.session.add_all([supplier, contract_type])
+        db.session.commit()
+        # Datas repetidas e nulas para exercitar o desempate pelo id
+        dates = [datetime(2024, 1, 1), datetime(2024, 1, 1), None, datetime(2023, 5, 1), None, datetime(2025, 2, 1), datetime(2024, 1, 1)]
+        for i, start_date in enumerate(dates):
+            db.session.add(Contract(contract_number=f'C{i}', contract_type_id=contract_type.id,
+                                    supplier_id=supplier.id, contract_value=1.0, start_date=start_date))
+        db.session.commit()
+        self.keys = [(Contract.start_date, True), (Contract.id, True)]
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def expected_order(self):
+        query = Contract.query.order_by(Contract.start_date.desc().nulls_last(), Contract.id.desc())
+        return [c.contract_number for c in query]
+
+    def test_cursor_round_trip(self):
+        token = encode_cursor([datetime(2024, 1, 1, 12, 30), 7], 'next')
+        self.assertEqual(decode_cursor(token, 2), ([datetime(2024, 1, 1, 12, 30), 7], 'next'))
+        self.assertIsNone(decode_cursor('lixo', 2))
+
+    def test_walk_forward_and_back(self):
+        pages = []
+        page = KeysetPagination(Contract.query, self.keys, per_page=3)
+        self.assertFalse(page.has_prev)
+        pages.append(page)
+        while page.has_next:
+            page = KeysetPagination(Contract.query, self.keys, cursor=page.next_cursor, per_page=3)
+            pages.append(page)
+        seen = [c.contract_number for p in pages for c in p.items]
+        self.assertEqual(seen, self.expected_order())
+
+        # Recua a partir da última página até à primeira
+        back = KeysetPagination(Contract.query, self.keys, cursor=pages[-1].prev_cursor, per_page=3)
+        self.assertEqual(back.items, pages[-2].items)
+        back = KeysetPagination(Contract.query, self.keys, cursor=back.prev_cursor, per_page=3)
+        self.assertEqual(back.items, pages[0].items)
+        self.assertFalse(back.has_prev)
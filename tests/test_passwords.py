@@ -0,0 +1,68 @@
+import threading
+import unittest
+from flask import url_for
+from sgpe import create_app, db, bcrypt
+from sgpe.models import User
+from sgpe.passwords import PasswordHasher, PasswordPoolBusy, hash_cost, authenticate
+
+class PasswordsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_user(self, rounds):
+        user = User(username='admin', email='admin@test.com', is_admin=True,
+                    password_hash=bcrypt.generate_password_hash('adminpass', rounds).decode('utf-8'))
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def test_hash_cost(self):
+        self.assertEqual(hash_cost(bcrypt.generate_password_hash('x', 5).decode('utf-8')), 5)
+        self.assertIsNone(hash_cost('não é bcrypt'))
+        self.assertIsNone(hash_cost(None))
+
+    def test_login_rehashes_with_target_cost(self):
+        user = self.add_user(5)
+        response = self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        self.assertEqual(hash_cost(db.session.get(User, user.id).password_hash), 4)
+        self.assertTrue(db.session.get(User, user.id).verify_password('adminpass'))
+
+    def test_wrong_password_keeps_hash(self):
+        user = self.add_user(5)
+        old_hash = user.password_hash
+        self.assertFalse(authenticate(user, 'errada'))
+        self.assertEqual(user.password_hash, old_hash)
+        self.assertFalse(authenticate(None, 'adminpass'))
+
+    def test_pool_rejects_when_saturated(self):
+        hasher = PasswordHasher(workers=1, queue=0, timeout=0.05)
+        release = threading.Event()
+        blocker = threading.Thread(target=hasher._run, args=(release.wait,))
+        blocker.start()
+        try:
+            with self.assertRaises(PasswordPoolBusy):
+                hasher.check(bcrypt.generate_password_hash('x', 4), 'x')
+        finally:
+            release.set()
+            blocker.join()
+        self.assertTrue(hasher.check(bcrypt.generate_password_hash('x', 4), 'x'))
+        hasher.shutdown()
+
+    def test_benchmark_command(self):
+        result = self.app.test_cli_runner().invoke(args=['bench-passwords', '--costs', '4', '--seconds', '0.1'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertRegex(result.output, r'\n\s+4\s+\d+\.\d')
+
+if __name__ == '__main__':
+    unittest.main()
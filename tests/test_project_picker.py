@@ -0,0 +1,101 @@
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier
+from sgpe.loaders import count_queries
+
+class ProjectPickerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        project_type = ProjectType(name='Estradas')
+        self.supplier = Supplier(name='Fornecedor A')
+        self.contract_type = ContractType(name='Obras')
+        db.session.add_all([user, project_type, self.supplier, self.contract_type])
+        db.session.commit()
+        self.user_id, self.project_type_id = user.id, project_type.id
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_projects(self, *names):
+        projects = [Project(name=name, project_type_id=self.project_type_id, location_province='Gaza',
+                            location_district='Bilene', location_admin_post='Macia', user_id=self.user_id)
+                    for name in names]
+        db.session.add_all(projects)
+        db.session.commit()
+        return [project.id for project in projects]
+
+    def contract_data(self, project_ids):
+        return {'contract_number': 'C-1', 'contract_type': self.contract_type.id,
+                'supplier': self.supplier.id, 'contract_value': '100', 'projects': project_ids}
+
+    def test_prefix_search_paginates(self):
+        self.add_projects('Estrada Norte', 'estrada Sul', 'Escola Central', 'Ponte 50%')
+        response = self.client.get(url_for('main.project_lookup', q='estr', limit=1))
+        data = response.get_json()
+        self.assertEqual([r['name'] for r in data['results']], ['Estrada Norte'])
+        self.assertIsNotNone(data['next_cursor'])
+        data = self.client.get(url_for('main.project_lookup', q='estr', limit=1, cursor=data['next_cursor'])).get_json()
+        self.assertEqual([r['name'] for r in data['results']], ['estrada Sul'])
+        self.assertIsNone(data['next_cursor'])
+        # Os caracteres especiais do LIKE são tratados literalmente
+        data = self.client.get(url_for('main.project_lookup', q='Ponte 50%')).get_json()
+        self.assertEqual([r['name'] for r in data['results']], ['Ponte 50%'])
+        self.assertEqual(self.client.get(url_for('main.project_lookup', q='Ponte 5%')).get_json()['results'], [])
+        self.assertEqual(self.client.get(url_for('main.project_lookup', q='%')).get_json()['results'], [])
+
+    def test_prefix_search_uses_index(self):
+        self.add_projects('Estrada Norte', 'Escola Central')
+        with count_queries() as queries:
+            self.client.get(url_for('main.project_lookup', q='ESTR'))
+        statement = next(q for q in queries if 'FROM project' in q and ' LIKE ' in q)
+        self.assertNotIn('lower(', statement)
+        plan = [row[-1] for row in db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT id FROM project WHERE name LIKE 'estr%' ESCAPE '\\' ORDER BY name, id"))]
+        self.assertIn('ix_project_name_nocase_id (name>? AND name<?)', plan[0])
+
+    def test_add_contract_with_selected_projects(self):
+        ids = self.add_projects('P1', 'P2', 'P3')
+        response = self.client.post(url_for('main.add_contract'), data=self.contract_data([ids[0], ids[2]]))
+        self.assertEqual(response.status_code, 302)
+        contract = Contract.query.filter_by(contract_number='C-1').one()
+        self.assertEqual(sorted(p.id for p in contract.projects), [ids[0], ids[2]])
+
+    def test_unknown_project_id_rejected(self):
+        ids = self.add_projects('P1')
+        response = self.client.post(url_for('main.add_contract'), data=self.contract_data([ids[0], 999]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('não existem'.encode('utf-8'), response.data)
+        self.assertEqual(Contract.query.count(), 0)
+
+    def test_form_does_not_load_every_project(self):
+        ids = self.add_projects(*[f'Projeto {i}' for i in range(30)])
+        response = self.client.get(url_for('main.add_contract'))
+        self.assertNotIn(b'Projeto 1', response.data)
+
+        self.client.post(url_for('main.add_contract'), data=self.contract_data([ids[0]]))
+        contract_id = Contract.query.one().id
+        db.session.expire_all()
+        response = self.client.get(url_for('main.update_contract', contract_id=contract_id))
+        self.assertIn(f'<option selected value="{ids[0]}">Projeto 0</option>'.encode(), response.data)
+        self.assertNotIn(b'Projeto 29', response.data)
+
+        # A validação faz uma única query para os projetos submetidos
+        with count_queries() as queries:
+            self.client.post(url_for('main.update_contract', contract_id=contract_id),
+                             data=dict(self.contract_data(ids[:10]), contract_number='C-1'))
+        project_selects = [q for q in queries if q.lstrip().startswith('SELECT') and 'FROM project' in q
+                           and 'project.id IN' in q]
+        self.assertEqual(len(project_selects), 1)
+        self.assertEqual(len(db.session.get(Contract, contract_id).projects), 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.ratelimit import MemoryBackend, SQLiteBackend, parse_rate
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/minute'), (10, 60))
+        with self.assertRaises(ValueError):
+            parse_rate('10 per minute')
+
+    def check_bucket(self, backend):
+        # 2 pedidos seguidos, 1 ficha por segundo
+        self.assertEqual(backend.take('k', 2, 1.0, now=100.0), 0)
+        self.assertEqual(backend.take('k', 2, 1.0, now=100.0), 0)
+        self.assertAlmostEqual(backend.take('k', 2, 1.0, now=100.0), 1.0)
+        self.assertAlmostEqual(backend.take('k', 2, 1.0, now=100.5), 0.5)
+        self.assertEqual(backend.take('k', 2, 1.0, now=101.0), 0)
+        self.assertEqual(backend.take('outra', 2, 1.0, now=101.0), 0)
+
+    def test_memory_backend(self):
+        self.check_bucket(MemoryBackend(max_buckets=100))
+
+    def test_memory_backend_is_bounded(self):
+        backend = MemoryBackend(max_buckets=2)
+        for key in ('a', 'b', 'c'):
+            backend.take(key, 1, 1.0, now=0.0)
+        self.assertEqual(len(backend), 2)
+        # 'a' foi descartado: volta a ter o balde cheio
+        self.assertEqual(backend.take('a', 1, 1.0, now=0.0), 0)
+        self.assertGreater(backend.take('c', 1, 1.0, now=0.0), 0)
+
+    def test_sqlite_backend_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ratelimit.db')
+            self.check_bucket(SQLiteBackend(path))
+            # Outro processo (outra ligação) vê o mesmo balde
+            first, second = SQLiteBackend(path), SQLiteBackend(path)
+            self.assertEqual(first.take('x', 1, 1.0, now=0.0), 0)
+            self.assertGreater(second.take('x', 1, 1.0, now=0.0), 0)
+
+
+class RateLimitedViewsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['RATELIMIT_ENABLED'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_login_attempts_limited(self):
+        data = {'email': 'ninguem@test.com', 'password': 'x'}
+        for _ in range(10):
+            self.assertEqual(self.client.post(url_for('main.login'), data=data).status_code, 200)
+        response = self.client.post(url_for('main.login'), data=data)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        # GET não gasta fichas
+        self.assertEqual(self.client.get(url_for('main.login')).status_code, 200)
+
+    def test_json_endpoint_limit_per_ip(self):
+        url = url_for('main.get_districts', province='Gaza')
+        for _ in range(60):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('retry_after', response.get_json())
+        # Outro cliente tem o seu próprio balde
+        other = self.client.get(url, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        self.assertEqual(other.status_code, 200)
+
+    def test_proxy_clients_have_own_buckets(self):
+        app = create_app('testing', RATELIMIT_ENABLED=True, PROXY_FIX_X_FOR=1)
+        client = app.test_client()
+        with app.test_request_context():
+            url = url_for('main.get_districts', province='Gaza')
+        # Todos os pedidos chegam do proxy; o cliente vem em X-Forwarded-For
+        proxy = {'REMOTE_ADDR': '127.0.0.1'}
+        for _ in range(60):
+            response = client.get(url, environ_base=proxy, headers={'X-Forwarded-For': '203.0.113.1'})
+            self.assertEqual(response.status_code, 200)
+        response = client.get(url, environ_base=proxy, headers={'X-Forwarded-For': '203.0.113.1'})
+        self.assertEqual(response.status_code, 429)
+        other = client.get(url, environ_base=proxy, headers={'X-Forwarded-For': '203.0.113.2'})
+        self.assertEqual(other.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from flask import g, url_for
+from sgpe import create_app, db, refdata
+from sgpe.models import User, Supplier, ContractType, Contract, RefDataVersion
+from sgpe.loaders import count_queries
+
+class RefDataCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add_all([Supplier(name='Beta'), Supplier(name='Alfa'), ContractType(name='Obras')])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def new_request(self):
+        # Em produção cada pedido tem o seu próprio contexto (e g)
+        g.pop('_refdata_versions', None)
+
+    def supplier_queries(self):
+        with count_queries() as queries:
+            names = [item.name for item in refdata.get_items('supplier')]
+        return names, [q for q in queries if 'FROM supplier' in q]
+
+    def test_items_are_cached(self):
+        names, queries = self.supplier_queries()
+        self.assertEqual(names, ['Alfa', 'Beta'])
+        self.assertEqual(len(queries), 1)
+        self.new_request()
+        self.assertEqual(self.supplier_queries(), (['Alfa', 'Beta'], []))
+        alfa = refdata.get_items('supplier')[0]
+        self.assertEqual(refdata.get_item('supplier', alfa.id), alfa)
+        self.assertIsNone(refdata.get_item('supplier', 999))
+
+    def test_orm_writes_invalidate(self):
+        refdata.get_items('supplier')
+        version = db.session.get(RefDataVersion, 'supplier').version
+        supplier = Supplier.query.filter_by(name='Beta').one()
+        supplier.name = 'Gama'
+        db.session.commit()
+        self.assertEqual([item.name for item in refdata.get_items('supplier')], ['Alfa', 'Gama'])
+        db.session.delete(supplier)
+        db.session.commit()
+        self.assertEqual([item.name for item in refdata.get_items('supplier')], ['Alfa'])
+        db.session.expire_all()
+        self.assertEqual(db.session.get(RefDataVersion, 'supplier').version, version + 2)
+
+    def test_version_bump_from_another_process(self):
+        refdata.get_items('supplier')
+        # Escrita sem eventos do ORM: o cache só a vê depois de a versão mudar
+        db.session.execute(Supplier.__table__.insert().values(name='Zeta'))
+        db.session.commit()
+        self.new_request()
+        self.assertEqual(self.supplier_queries()[0], ['Alfa', 'Beta'])
+        # Outro processo incrementa a versão; este processo não tem a entrada invalidada localmente
+        db.session.execute(RefDataVersion.__table__.update().values(version=RefDataVersion.version + 1))
+        db.session.commit()
+        self.new_request()
+        self.assertEqual(self.supplier_queries()[0], ['Alfa', 'Beta', 'Zeta'])
+
+    def test_ttl_fallback(self):
+        self.app.config['REFDATA_CACHE_TTL'] = -1
+        refdata.get_items('supplier')
+        self.new_request()
+        self.assertEqual(len(self.supplier_queries()[1]), 1)
+
+    def test_contract_form_uses_cache(self):
+        db.session.add(User(username='admin', email='admin@test.com', password='adminpass', is_admin=True))
+        db.session.commit()
+        client = self.app.test_client(use_cookies=True)
+        client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        client.get(url_for('main.add_contract'))
+        supplier = refdata.get_items('supplier')[0]
+        contract_type = refdata.get_items('contract_type')[0]
+
+        self.new_request()
+        with count_queries() as queries:
+            response = client.get(url_for('main.add_contract'))
+        self.assertIn(f'<option value="{supplier.id}">Alfa</option>'.encode(), response.data)
+        self.assertFalse([q for q in queries if 'FROM supplier' in q or 'FROM contract_type' in q])
+
+        self.new_request()
+        response = client.post(url_for('main.add_contract'), data={
+            'contract_number': 'C-1', 'contract_type': contract_type.id,
+            'supplier': supplier.id, 'contract_value': '10'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Contract.query.one().supplier_id, supplier.id)
+
+        response = client.post(url_for('main.add_contract'), data={
+            'contract_number': 'C-2', 'contract_type': contract_type.id,
+            'supplier': 999, 'contract_value': '10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Contract.query.count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
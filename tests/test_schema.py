@@ -0,0 +1,80 @@
+import unittest
+from sqlalchemy import inspect
+from sgpe import create_app, db
+from sgpe.schema import upgrade_schema
+
+class SchemaUpgradeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def _indexes(self, table):
+        return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+    def test_creates_missing_indexes_and_tables(self):
+        # Base de dados criada antes dos índices e da tabela de tarefas
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_project_date_posted_id')
+            connection.exec_driver_sql('DROP INDEX ix_contract_projects_project_id')
+            connection.exec_driver_sql('DROP TABLE job')
+        changes = upgrade_schema()
+        self.assertIn('índice ix_project_date_posted_id em project', changes)
+        self.assertIn('índice ix_contract_projects_project_id em contract_projects', changes)
+        self.assertIn('tabela job', changes)
+        self.assertIn('ix_project_date_posted_id', self._indexes('project'))
+        self.assertIn('ix_job_status_run_after', self._indexes('job'))
+        # Idempotente
+        self.assertEqual(upgrade_schema(), [])
+
+    def test_upgrade_command(self):
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_contract_start_date_id')
+        result = self.app.test_cli_runner().invoke(args=['upgrade-db'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('ix_contract_start_date_id', result.output)
+        self.assertIn('ix_contract_start_date_id', self._indexes('contract'))
+
+    def test_routes_use_indexes(self):
+        result = self.app.test_cli_runner().invoke(args=['audit-queries'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('0 leituras completas', result.output)
+
+    def test_audit_reports_full_scans(self):
+        from sgpe.audit import audit_queries
+        # Sem índice na data, a ordenação do dashboard lê a tabela inteira
+        index = next(index for index in db.metadata.tables['project'].indexes
+                     if index.name == 'ix_project_date_posted_id')
+        db.metadata.tables['project'].indexes.discard(index)
+        try:
+            visited, findings = audit_queries()
+        finally:
+            db.metadata.tables['project'].indexes.add(index)
+        self.assertGreater(visited, 0)
+        self.assertIn('project', {finding.table for finding in findings})
+        self.assertIn('main.home', set().union(*(finding.endpoints for finding in findings)))
+
+    def test_audit_reports_filtered_ordered_scans(self):
+        from sgpe.audit import audit_queries, FILTERED_ORDERED_SCAN
+        # Sem o índice NOCASE, a pesquisa por prefixo percorre ix_project_name_id
+        # pela ordem do nome e filtra cada projeto até encher a página
+        table = db.metadata.tables['project']
+        index = next(index for index in table.indexes if index.name == 'ix_project_name_nocase_id')
+        table.indexes.discard(index)
+        try:
+            _, findings = audit_queries()
+        finally:
+            table.indexes.add(index)
+        finding = next(finding for finding in findings if finding.table == 'project')
+        self.assertEqual(finding.reason, FILTERED_ORDERED_SCAN)
+        self.assertIn('ix_project_name_id', finding.detail)
+        self.assertEqual(finding.endpoints, {'main.project_lookup'})
+
+if __name__ == '__main__':
+    unittest.main()
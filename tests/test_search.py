@@ -0,0 +1,116 @@
+import unittest
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier
+from sgpe.search import search, search_filter, rebuild_search_index, FTS5_AVAILABLE
+
+class SearchTestMixin:
+    backend = None
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['SEARCH_BACKEND'] = self.backend
+        from sgpe.search import init_search
+        init_search(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        self.project_type = ProjectType(name='Estradas')
+        self.contract_type = ContractType(name='Empreitada')
+        self.supplier = Supplier(name='Construtora Chókwè', contact_person='Maria Tembe')
+        db.session.add_all([self.user, self.project_type, self.contract_type, self.supplier])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_project(self, name, description=None):
+        project = Project(name=name, description=description, project_type_id=self.project_type.id,
+                          location_province='Gaza', location_district='Chókwè', location_admin_post='Lionde',
+                          author=self.user)
+        db.session.add(project)
+        db.session.commit()
+        return project
+
+    def test_ranked_search_across_kinds(self):
+        self.add_project('Reabilitação da estrada', 'Ponte sobre o rio')
+        self.add_project('Escola primária', 'Inclui estrada de acesso')
+        contract = Contract(contract_number='CT-2024-01', contract_type_id=self.contract_type.id,
+                            supplier_id=self.supplier.id, contract_value=10.0)
+        db.session.add(contract)
+        db.session.commit()
+
+        hits = search('estrada')
+        self.assertEqual([kind for kind, _, _ in hits], ['project', 'project'])
+        # O nome pesa mais do que a descrição
+        self.assertEqual(db.session.get(Project, hits[0][1]).name, 'Reabilitação da estrada')
+
+        # Acentos e maiúsculas são ignorados; o contrato inclui o fornecedor e o tipo
+        kinds = {kind for kind, _, _ in search('chokwe')}
+        self.assertEqual(kinds, {'project', 'contract', 'supplier'})
+        self.assertEqual([(kind, ref_id) for kind, ref_id, _ in search('empreit', kinds=['contract'])],
+                         [('contract', contract.id)])
+
+    def test_index_follows_model_changes(self):
+        project = self.add_project('Hospital distrital')
+        self.assertEqual(len(search('hospital')), 1)
+        project.name = 'Centro de saúde'
+        db.session.commit()
+        self.assertEqual(search('hospital'), [])
+        self.assertEqual(len(search('saude')), 1)
+        db.session.delete(project)
+        db.session.commit()
+        self.assertEqual(search('saude'), [])
+
+    def test_supplier_rename_reindexes_contracts(self):
+        contract = Contract(contract_number='CT-1', contract_type_id=self.contract_type.id,
+                            supplier_id=self.supplier.id, contract_value=10.0)
+        db.session.add(contract)
+        db.session.commit()
+        self.supplier.name = 'Engenharia Limpopo'
+        db.session.commit()
+        query = Contract.query.filter(search_filter('contract', Contract.id, 'limpopo'))
+        self.assertEqual(query.all(), [contract])
+
+    def test_rolled_back_changes_not_indexed(self):
+        self.add_project('Mercado municipal')
+        self.assertEqual(len(search('mercado')), 1)
+        project = Project(name='Matadouro', project_type_id=self.project_type.id, location_province='Gaza',
+                          location_district='Chókwè', location_admin_post='Lionde', author=self.user)
+        db.session.add(project)
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(search('matadouro'), [])
+
+    def test_first_read_does_not_commit_session(self):
+        db.session.remove()
+        db.drop_all()  # Base de dados sem índice de pesquisa
+        db.create_all()
+        # Pendente na sessão quando a primeira pesquisa constrói o índice
+        db.session.add(Supplier(name='Fornecedor pendente'))
+        self.assertEqual(search('pendente'), [])
+        db.session.rollback()
+        self.assertEqual(Supplier.query.filter_by(name='Fornecedor pendente').count(), 0)
+
+    def test_rebuild(self):
+        self.add_project('Mercado municipal')
+        rebuild_search_index()
+        self.assertEqual(len(search('mercado')), 1)
+
+    def test_search_view(self):
+        self.add_project('Furo de água')
+        response = self.app.test_client().get(url_for('main.search', q='agua'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Furo de água', response.get_data(as_text=True))
+
+
+@unittest.skipUnless(FTS5_AVAILABLE, 'SQLite sem FTS5')
+class FTS5SearchTestCase(SearchTestMixin, unittest.TestCase):
+    backend = 'fts5'
+
+
+class InvertedIndexSearchTestCase(SearchTestMixin, unittest.TestCase):
+    backend = 'memory'
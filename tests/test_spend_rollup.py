@@ -0,0 +1,101 @@
+import unittest
+from datetime import date
+from flask import url_for
+from sgpe import create_app, db
+from sgpe.models import User, Contract, ContractType, Supplier, SpendRollup
+from sgpe.stats import get_spend_rollup, rebuild_dashboard_stats, UNDATED_YEAR
+from sgpe.loaders import count_queries
+
+class SpendRollupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        self.obras, self.servicos = ContractType(name='Obras'), ContractType(name='Serviços')
+        self.alfa, self.beta = Supplier(name='Alfa'), Supplier(name='Beta')
+        db.session.add_all([User(username='admin', email='admin@test.com', password='adminpass', is_admin=True),
+                            self.obras, self.servicos, self.alfa, self.beta])
+        db.session.commit()
+        rebuild_dashboard_stats()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_contract(self, number, supplier, contract_type, value, start_date=None):
+        contract = Contract(contract_number=number, supplier_id=supplier.id, contract_type_id=contract_type.id,
+                            contract_value=value, start_date=start_date)
+        db.session.add(contract)
+        db.session.commit()
+        return contract
+
+    def cube(self):
+        return {(row.supplier_id, row.contract_type_id, row.year): (row.count, row.total)
+                for row in db.session.execute(db.select(SpendRollup)).scalars()}
+
+    def test_incremental_maintenance(self):
+        c1 = self.add_contract('C1', self.alfa, self.obras, 100.0, date(2023, 5, 1))
+        self.add_contract('C2', self.alfa, self.obras, 50.0, date(2023, 9, 1))
+        self.add_contract('C3', self.beta, self.servicos, 10.0)
+        self.assertEqual(self.cube(), {
+            (self.alfa.id, self.obras.id, 2023): (2, 150.0),
+            (self.beta.id, self.servicos.id, UNDATED_YEAR): (1, 10.0),
+        })
+
+        # Mudança de fornecedor e de ano: o valor passa para outra célula
+        c1.supplier_id = self.beta.id
+        c1.start_date = date(2024, 1, 1)
+        c1.contract_value = 120.0
+        db.session.commit()
+        self.assertEqual(self.cube(), {
+            (self.alfa.id, self.obras.id, 2023): (1, 50.0),
+            (self.beta.id, self.obras.id, 2024): (1, 120.0),
+            (self.beta.id, self.servicos.id, UNDATED_YEAR): (1, 10.0),
+        })
+
+        # Células vazias são removidas
+        db.session.delete(c1)
+        db.session.commit()
+        self.assertNotIn((self.beta.id, self.obras.id, 2024), self.cube())
+
+        expected = self.cube()
+        rebuild_dashboard_stats()
+        self.assertEqual(self.cube(), expected)
+
+    def test_slice_and_drill(self):
+        self.add_contract('C1', self.alfa, self.obras, 100.0, date(2023, 5, 1))
+        self.add_contract('C2', self.alfa, self.servicos, 50.0, date(2024, 1, 1))
+        self.add_contract('C3', self.beta, self.obras, 10.0, date(2024, 2, 1))
+        self.assertEqual(get_spend_rollup(['supplier']), [
+            {'supplier': self.alfa.id, 'count': 2, 'total': 150.0},
+            {'supplier': self.beta.id, 'count': 1, 'total': 10.0},
+        ])
+        self.assertEqual(get_spend_rollup(['year'], contract_type_id=self.obras.id), [
+            {'year': 2023, 'count': 1, 'total': 100.0},
+            {'year': 2024, 'count': 1, 'total': 10.0},
+        ])
+        self.assertEqual(get_spend_rollup([], year=2024), [{'count': 2, 'total': 60.0}])
+
+    def test_report_endpoint_does_not_read_contracts(self):
+        self.add_contract('C1', self.alfa, self.obras, 100.0, date(2023, 5, 1))
+        self.add_contract('C2', self.beta, self.obras, 10.0)
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        with count_queries() as queries:
+            response = self.client.get(url_for('main.spend_report', group_by='supplier,year',
+                                               contract_type_id=self.obras.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['rows'], [
+            {'supplier': {'id': self.alfa.id, 'name': 'Alfa'}, 'year': 2023, 'count': 1, 'total': 100.0},
+            {'supplier': {'id': self.beta.id, 'name': 'Beta'}, 'year': None, 'count': 1, 'total': 10.0},
+        ])
+        self.assertEqual(response.json['total'], {'count': 2, 'total': 110.0})
+        self.assertFalse([q for q in queries if 'FROM contract ' in q or q.rstrip().endswith('FROM contract')])
+
+        response = self.client.get(url_for('main.spend_report', group_by='region'))
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
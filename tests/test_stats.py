@@ -0,0 +1,78 @@
+import unittest
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier
+from sgpe.stats import get_dashboard_stats, rebuild_dashboard_stats
+
+class DashboardStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        self.project_type = ProjectType(name='Test Type')
+        self.contract_type = ContractType(name='Obras')
+        self.supplier = Supplier(name='Fornecedor')
+        db.session.add_all([self.user, self.project_type, self.contract_type, self.supplier])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_project(self, name, province):
+        project = Project(name=name, project_type_id=self.project_type.id, location_province=province,
+                          location_district='D', location_admin_post='P', author=self.user)
+        db.session.add(project)
+        db.session.commit()
+        return project
+
+    def add_contract(self, number, value):
+        contract = Contract(contract_number=number, contract_type_id=self.contract_type.id,
+                            supplier_id=self.supplier.id, contract_value=value)
+        db.session.add(contract)
+        db.session.commit()
+        return contract
+
+    def test_snapshot_built_on_first_read(self):
+        self.add_project('P1', 'Gaza')
+        self.add_contract('C1', 100.0)
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['total_projects'], 1)
+        self.assertEqual(stats['total_contracts'], 1)
+        self.assertEqual(stats['total_contract_value'], 100.0)
+        self.assertEqual(stats['province_labels'], ['Gaza'])
+
+    def test_incremental_updates(self):
+        get_dashboard_stats()
+        project = self.add_project('P1', 'Gaza')
+        self.add_project('P2', 'Gaza')
+        contract = self.add_contract('C1', 100.0)
+        self.add_contract('C2', 50.0)
+
+        project.location_province = 'Sofala'
+        contract.contract_value = 200.0
+        db.session.commit()
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['province_labels'], ['Gaza', 'Sofala'])
+        self.assertEqual(stats['province_data'], [1, 1])
+        self.assertEqual(stats['total_contract_value'], 250.0)
+
+        db.session.delete(project)
+        db.session.delete(contract)
+        db.session.commit()
+        stats = get_dashboard_stats()
+        self.assertEqual(stats['total_projects'], 1)
+        self.assertEqual(stats['province_labels'], ['Gaza'])
+        self.assertEqual(stats['total_contracts'], 1)
+        self.assertEqual(stats['total_contract_value'], 50.0)
+
+    def test_rebuild_matches_incremental(self):
+        get_dashboard_stats()
+        self.add_project('P1', 'Gaza')
+        self.add_project('P2', 'Niassa')
+        self.add_contract('C1', 10.0)
+        incremental = get_dashboard_stats()
+        rebuild_dashboard_stats()
+        self.assertEqual(get_dashboard_stats(), incremental)
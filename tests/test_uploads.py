@@ -0,0 +1,141 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from flask import url_for
+from sgpe import create_app, db, documents, uploads
+from sgpe.models import User, Contract, ContractType, Supplier, UploadSession
+
+class ResumableUploadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        self.app = create_app('testing')
+        self.app.config.update(UPLOAD_FOLDER=self.upload_dir, UPLOAD_CHUNK_SIZE=1000)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        self.supplier, self.contract_type = Supplier(name='Fornecedor'), ContractType(name='Obras')
+        db.session.add_all([User(username='admin', email='admin@test.com', password='adminpass', is_admin=True),
+                            self.supplier, self.contract_type])
+        db.session.commit()
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        self.content = os.urandom(2500)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.upload_dir)
+
+    def start(self, filename='scan.pdf', size=None):
+        return self.client.post(url_for('main.create_upload'),
+                                json={'filename': filename, 'size': size or len(self.content)})
+
+    def put(self, upload_id, index, data=None):
+        data = self.content[index * 1000:(index + 1) * 1000] if data is None else data
+        return self.client.put(url_for('main.upload_chunk', upload_id=upload_id, index=index), data=data)
+
+    def test_resume_and_attach_to_contract(self):
+        upload = self.start().get_json()
+        self.assertEqual((upload['received'], upload['chunk_size']), (0, 1000))
+        upload_id = upload['id']
+        self.assertEqual(self.put(upload_id, 0).status_code, 200)
+        # Parte fora de ordem: o cliente pergunta o estado e retoma
+        self.assertEqual(self.put(upload_id, 2).status_code, 409)
+        status = self.client.get(url_for('main.upload_status', upload_id=upload_id)).get_json()
+        self.assertEqual((status['received'], status['next_chunk']), (1000, 1))
+        # Parte com tamanho errado (ligação cortada) é recusada
+        self.assertEqual(self.put(upload_id, 1, b'x' * 10).status_code, 400)
+        # Finalizar antes de receber tudo não é permitido
+        self.assertEqual(self.client.post(url_for('main.finalize_upload', upload_id=upload_id)).status_code, 409)
+        self.put(upload_id, 1)
+        self.put(upload_id, 1)  # Reenviar uma parte já recebida é inofensivo
+        self.assertEqual(self.put(upload_id, 2).get_json()['received'], 2500)
+        status = self.client.post(url_for('main.finalize_upload', upload_id=upload_id)).get_json()
+        self.assertTrue(status['complete'])
+
+        response = self.client.post(url_for('main.add_contract'), data={
+            'contract_number': 'C-1', 'contract_type': self.contract_type.id, 'supplier': self.supplier.id,
+            'contract_value': '10', 'upload_id': upload_id})
+        self.assertEqual(response.status_code, 302)
+        key = Contract.query.one().document_filename
+        self.assertEqual(documents.content_hash(key), hashlib.sha256(self.content).hexdigest())
+        with open(documents.path_for(key), 'rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertIsNone(db.session.get(UploadSession, upload_id))
+
+    def finished_upload(self):
+        upload_id = self.start().get_json()['id']
+        for index in range(3):
+            self.put(upload_id, index)
+        self.client.post(url_for('main.finalize_upload', upload_id=upload_id))
+        return upload_id
+
+    def add_contract(self, number, upload_id):
+        return self.client.post(url_for('main.add_contract'), data={
+            'contract_number': number, 'contract_type': self.contract_type.id, 'supplier': self.supplier.id,
+            'contract_value': '10', 'upload_id': upload_id})
+
+    def test_pending_upload_counts_as_reference(self):
+        self.add_contract('C-1', self.finished_upload())
+        contract = Contract.query.one()
+        key = contract.document_filename
+        # Mesmo conteúdo, finalizado mas ainda não associado a um contrato
+        pending = self.finished_upload()
+        self.client.post(url_for('main.delete_contract', contract_id=contract.id))
+        self.assertTrue(os.path.exists(documents.path_for(key)))
+        self.add_contract('C-2', pending)
+        self.assertEqual(Contract.query.one().document_filename, key)
+        self.assertTrue(os.path.exists(documents.path_for(key)))
+
+    def test_claimed_upload_keeps_current_document(self):
+        self.add_contract('C-1', self.finished_upload())
+        contract = Contract.query.one()
+        key = contract.document_filename
+        upload_id = self.finished_upload()
+        original, uploads.is_ready = uploads.is_ready, lambda upload_id, user_id: True
+        try:
+            # Segunda submissão: o formulário é válido mas o upload já foi associado
+            db.session.delete(db.session.get(UploadSession, upload_id))
+            db.session.commit()
+            response = self.client.post(url_for('main.update_contract', contract_id=contract.id), data={
+                'contract_number': 'C-1', 'contract_type': self.contract_type.id, 'supplier': self.supplier.id,
+                'contract_value': '10', 'upload_id': upload_id})
+        finally:
+            uploads.is_ready = original
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('já não está disponível', response.get_data(as_text=True))
+        db.session.expire_all()
+        self.assertEqual(Contract.query.one().document_filename, key)
+        self.assertTrue(os.path.exists(documents.path_for(key)))
+
+    def test_unfinished_upload_rejected_by_form(self):
+        upload_id = self.start().get_json()['id']
+        response = self.client.post(url_for('main.add_contract'), data={
+            'contract_number': 'C-1', 'contract_type': self.contract_type.id, 'supplier': self.supplier.id,
+            'contract_value': '10', 'upload_id': upload_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Contract.query.count(), 0)
+
+    def test_validation(self):
+        self.assertEqual(self.start(filename='virus.exe').status_code, 400)
+        self.assertEqual(self.start(size=self.app.config['UPLOAD_MAX_SIZE'] + 1).status_code, 413)
+        self.assertEqual(self.client.get(url_for('main.upload_status', upload_id='nada')).status_code, 404)
+        for body in ([], 'scan.pdf', 3):
+            response = self.client.post(url_for('main.create_upload'), json=body)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.get_json())
+
+    def test_expired_sessions_removed(self):
+        upload_id = self.start().get_json()['id']
+        db.session.get(UploadSession, upload_id).created_at = datetime.utcnow() - timedelta(days=2)
+        db.session.commit()
+        self.start()
+        self.assertIsNone(db.session.get(UploadSession, upload_id))
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, '.partial', upload_id)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import re
+import unittest
+from datetime import date, timedelta
+from html import unescape as html_unescape
+from flask import url_for
+from sqlalchemy import event
+from sgpe import create_app, db
+from sgpe.models import User, Project, ProjectType, Contract, ContractType, Supplier
+from sgpe import validity
+
+class ContractValidityTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client(use_cookies=True)
+        self.user = User(username='admin', email='admin@test.com', password='adminpass', is_admin=True)
+        self.contract_type = ContractType(name='Obras')
+        self.supplier = Supplier(name='Fornecedor')
+        self.project = Project(name='Ponte', project_type=ProjectType(name='Estradas'), author=self.user,
+                               location_province='Gaza', location_district='Bilene', location_admin_post='Macia')
+        db.session.add_all([self.user, self.contract_type, self.supplier, self.project])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_contract(self, number, start_date, end_date, projects=()):
+        contract = Contract(contract_number=number, contract_type_id=self.contract_type.id,
+                            supplier_id=self.supplier.id, contract_value=100.0,
+                            start_date=start_date, end_date=end_date, projects=list(projects))
+        db.session.add(contract)
+        db.session.commit()
+        return contract
+
+    def numbers(self, condition):
+        return sorted(c.contract_number for c in Contract.query.filter(condition))
+
+    def test_active_and_overlapping(self):
+        self.add_contract('2023', date(2023, 1, 1), date(2023, 12, 31))
+        self.add_contract('2024', date(2024, 1, 1), date(2024, 6, 30))
+        self.add_contract('ABERTO', date(2023, 6, 1), None)
+        self.add_contract('SEM-INICIO', None, date(2024, 1, 15))
+        # Datas de início e fim são inclusivas
+        self.assertEqual(self.numbers(validity.active_on(date(2023, 12, 31))), ['2023', 'ABERTO', 'SEM-INICIO'])
+        self.assertEqual(self.numbers(validity.active_on(date(2024, 1, 1))), ['2024', 'ABERTO', 'SEM-INICIO'])
+        self.assertEqual(self.numbers(validity.active_on(date(2025, 1, 1))), ['ABERTO'])
+        self.assertEqual(self.numbers(validity.overlapping(date(2024, 2, 1), date(2024, 3, 1))), ['2024', 'ABERTO'])
+
+    def test_last_representable_date(self):
+        self.add_contract('ABERTO', date(2023, 6, 1), None)
+        self.assertEqual(self.numbers(validity.active_on(date.max)), ['ABERTO'])
+        self.assertEqual(self.numbers(validity.overlapping(date(2024, 1, 1), date.max)), ['ABERTO'])
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        for params in ({'view': 'active', 'date': '9999-12-31'},
+                       {'view': 'overlaps', 'start': '2024-01-01', 'end': '9999-12-31'}):
+            response = self.client.get(url_for('main.contract_validity', **params))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('ABERTO', response.get_data(as_text=True))
+
+    def test_expiring_within(self):
+        today = date(2024, 5, 1)
+        self.add_contract('HOJE', date(2024, 1, 1), today)
+        self.add_contract('30-DIAS', date(2024, 1, 1), today + timedelta(days=30))
+        self.add_contract('31-DIAS', date(2024, 1, 1), today + timedelta(days=31))
+        self.add_contract('TERMINADO', date(2024, 1, 1), today - timedelta(days=1))
+        self.add_contract('SEM-TERMO', date(2024, 1, 1), None)
+        self.assertEqual(self.numbers(validity.expiring_within(30, today=today)), ['30-DIAS', 'HOJE'])
+
+    def test_queries_use_interval_index(self):
+        condition = validity.active_on(date(2024, 1, 1))
+        query = db.select(Contract.id).where(condition)
+        sql = str(query.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        plan = [row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+        self.assertTrue(any('ix_contract_end_date_start_date (end_date>?)' in detail for detail in plan), plan)
+        self.assertFalse(any(detail.startswith('SCAN contract') for detail in plan), plan)
+
+    def test_listing_view_plans_use_interval_index(self):
+        for number in range(12):
+            self.add_contract(f'C-{number}', date(2024, 1, 1), date(2024, 2, number + 1))
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('SELECT') and 'LIMIT' in statement and 'FROM contract' in statement:
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            for params in ({'view': 'active', 'date': '2024-01-15'},
+                           {'view': 'overlaps', 'start': '2024-01-01', 'end': '2024-01-31'}):
+                html = self.client.get(url_for('main.contract_validity', **params)).get_data(as_text=True)
+                # Segunda página, pelo cursor da ligação "Próxima"
+                next_url = html_unescape(re.search(r'href="([^"]*)">Próxima<', html).group(1))
+                self.assertIn('cursor=', next_url)
+                self.client.get(next_url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+        self.assertEqual(len(statements), 4)
+        for statement, parameters in statements:
+            # O plano real da vista: procura o intervalo de end_date no índice, sem
+            # percorrer a tabela (ou o índice da ordenação) filtrando linha a linha
+            plan = [row[-1] for row in db.session.connection().exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + statement, parameters)]
+            self.assertTrue(any('ix_contract_end_date_start_date (end_date>?)' in detail for detail in plan), plan)
+            self.assertFalse(any(detail.startswith('SCAN contract') for detail in plan), plan)
+
+    def test_project_overlaps(self):
+        self.add_contract('A', date(2024, 1, 1), date(2024, 3, 31), [self.project])
+        self.add_contract('B', date(2024, 3, 1), date(2024, 4, 30), [self.project])
+        self.add_contract('C', date(2024, 5, 1), date(2024, 5, 31), [self.project])
+        self.add_contract('D', date(2023, 1, 1), None, [self.project])
+        self.add_contract('OUTRO', date(2024, 1, 1), None)
+        pairs = {(first.contract_number, second.contract_number)
+                 for first, second in validity.project_overlaps(self.project.id)}
+        self.assertEqual(pairs, {('D', 'A'), ('D', 'B'), ('A', 'B'), ('D', 'C')})
+
+    def test_listing_view(self):
+        today = date.today()
+        self.add_contract('ATIVO', today - timedelta(days=10), today + timedelta(days=5), [self.project])
+        self.add_contract('ANTIGO', date(2020, 1, 1), date(2020, 12, 31), [self.project])
+        self.client.post(url_for('main.login'), data={'email': 'admin@test.com', 'password': 'adminpass'})
+
+        response = self.client.get(url_for('main.contract_validity'))
+        self.assertEqual(response.status_code, 200)
+        html = response.get_data(as_text=True)
+        self.assertIn('ATIVO', html)
+        self.assertNotIn('ANTIGO', html)
+
+        html = self.client.get(url_for('main.contract_validity', view='active', date='2020-06-01')).get_data(as_text=True)
+        self.assertIn('ANTIGO', html)
+        self.assertNotIn('ATIVO', html)
+
+        html = self.client.get(url_for('main.contract_validity', view='expiring', days=7)).get_data(as_text=True)
+        self.assertIn('ATIVO', html)
+
+        html = self.client.get(url_for('main.contract_validity', view='overlaps',
+                                       project_id=self.project.id)).get_data(as_text=True)
+        self.assertIn('Nenhum contrato deste projeto tem vigência sobreposta', html)
+
+if __name__ == '__main__':
+    unittest.main()